@@ -15,3 +15,9 @@ colors = {
 def get_cstring(string, color):
     ''' окрашивает строку в заданный цвет '''
     return '%s%s%s' % (colors[color], string, colors['ENDC'])
+
+
+def percentile(sorted_values, fraction):
+    ''' значение отсортированного списка с долей fraction меньших '''
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
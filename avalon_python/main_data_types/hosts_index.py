@@ -0,0 +1,507 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Индекс файла hosts в памяти.
+
+Записи разбираются один раз и остаются загруженными, перед чтением
+индекс сверяет inode, размер и время изменения файла. Если файл был
+только дописан, читаются одни новые байты, иначе файл перечитывается
+целиком. Вместе с записями обновляются вторичные индексы: триграммный
+индекс имен для поиска подстроки (find), дерево меток для поиска
+по зоне (match_domains) и отсортированные адреса для поиска по сети
+и диапазону (in_network, in_range).
+
+После watch() файл не проверяется при каждом обращении: индекс
+помечается устаревшим по событиям inotify (нужен pyinotify).
+
+Файл ведется как журнал: записи только дописываются, удаление ip
+дописывает строку-надгробие "-<TAB>ip". Когда удаленных и замененных
+строк становится больше, чем живых записей, compact() переписывает
+файл одними живыми записями через временный файл, fsync и rename,
+так что при сбое остается либо старый, либо новый файл целиком.
+Дописывающие и compact() берут flock на файл (где есть fcntl).
+'''
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from itertools import islice
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from substring_index import TrigramIndex
+from label_trie import LabelTrie
+from ip_index import IPIndex, ip_to_int
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+# столько байт перед концом прочитанного сверяется при дочитывании,
+# так замечается перезапись файла без смены inode
+CHECK_BYTES = 64
+
+TOMBSTONE = '-'
+# compact() нужен, когда мертвых строк больше этого и больше живых
+COMPACT_MIN = 1024
+# строк в группе add_many: одна запись и один fsync на группу
+BATCH_SIZE = 4096
+
+
+def parse_record(line):
+    '''
+    (ip, имя) из строки файла, (ip, None) для надгробия,
+    None для пустых строк и комментариев
+    '''
+    fields = line.split()
+    if len(fields) < 2 or fields[0].startswith('#'):
+        return None
+    if fields[0] == TOMBSTONE:
+        return fields[1], None
+    return fields[0], fields[1]
+
+
+def format_record(ip, name):
+    return '%s\t%s\n' % (ip, name)
+
+
+def format_tombstone(ip):
+    return format_record(TOMBSTONE, ip)
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ReadPosition(object):
+    '''
+    Докуда прочитан файл: inode, конец последней полной строки и
+    CHECK_BYTES байт перед ним. По ним видно, что файл с тех пор только
+    дописывался и новые строки можно дочитать
+    '''
+
+    def __init__(self, ino=None, offset=0, check=''):
+        self.ino = ino
+        self.offset = offset
+        self.check = check
+        # недописанная последняя строка (без \n) прошлого read_lines
+        self.partial = ''
+
+    def appended(self, f, st):
+        ''' файл f (st - его stat) только дописывался с прошлого чтения '''
+        if self.ino is None or st.st_ino != self.ino or \
+                st.st_size < self.offset:
+            return False
+        f.seek(self.offset - len(self.check))
+        return f.read(len(self.check)) == self.check
+
+    def read_lines(self, f):
+        '''
+        (смещение, строка) полных строк после прочитанного, недописанная
+        последняя строка попадает в partial и будет прочитана снова
+        '''
+        self.partial = ''
+        offset = self.offset
+        f.seek(offset)
+        for line in f:
+            if not line.endswith('\n'):
+                self.partial = line
+                break
+            yield offset, line
+            offset += len(line)
+        start = max(0, offset - CHECK_BYTES)
+        f.seek(start)
+        self.check = f.read(offset - start)
+        self.offset = offset
+        self.ino = os.fstat(f.fileno()).st_ino
+
+
+def atomic_write(filename, chunks):
+    '''
+    Заменяет файл строками chunks через временный файл в том же
+    каталоге, fsync и rename: после сбоя файл либо старый, либо новый.
+    Возвращает os.fstat нового файла до rename: после rename в файл
+    уже могут дописать
+    '''
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_name = tempfile.mkstemp(prefix='.hosts-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        if os.path.exists(filename):
+            os.chmod(tmp_name, os.stat(filename).st_mode & 0o7777)
+        os.rename(tmp_name, filename)
+    except:
+        os.remove(tmp_name)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # сам rename тоже должен пережить сбой
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return st
+
+
+def append_lines(filename, data, sync=False):
+    '''
+    Дописывает строки в файл под блокировкой,
+    sync - дождаться записи на диск
+    '''
+    while True:
+        f = open(filename, 'ab')
+        try:
+            _lock(f)
+            # пока ждали блокировку, compact() мог заменить файл
+            try:
+                replaced = os.fstat(f.fileno()).st_ino != \
+                    os.stat(filename).st_ino
+            except OSError:
+                replaced = True
+            if not replaced:
+                f.write(data)
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+                return
+        finally:
+            f.close()
+
+
+class HostsIndex(object):
+    '''
+    Упорядоченный словарь ip -> имя, повторяющий файл hosts
+    (как и parse_hosts_file: ip остается на месте первой записи,
+    имя берется из последней)
+    '''
+
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+        # полные перечитывания и дочитывания файла
+        self.reloads = 0
+        self.updates = 0
+        self._lock = threading.RLock()
+        self._notifier = None
+        self._dirty = True
+        self._compactor = None
+        self.substrings = TrigramIndex()
+        self.domains = LabelTrie()
+        self.addresses = IPIndex()
+        # вторичные индексы записей: add(ip, имя), remove(ip), clear()
+        self._secondary = [self.substrings, self.domains, self.addresses]
+        self._reset()
+
+    def _reset(self):
+        self.records = OrderedDict()
+        for secondary in self._secondary:
+            secondary.clear()
+        self._position = ReadPosition()
+        # прочитано строк записей и надгробий
+        self.lines = 0
+        self._stamp = None
+        # недописанная последняя строка уже в records:
+        # (ip, прежнее имя или None)
+        self._pending = None
+
+    def _set(self, ip, name):
+        self.records[ip] = name
+        for secondary in self._secondary:
+            secondary.add(ip, name)
+
+    def _del(self, ip):
+        if ip not in self.records:
+            return
+        del self.records[ip]
+        for secondary in self._secondary:
+            secondary.remove(ip)
+
+    def invalidate(self):
+        ''' Сверить индекс с файлом при следующем обращении '''
+        self._dirty = True
+
+    def refresh(self):
+        ''' Приводит индекс в соответствие с файлом '''
+        with self._lock:
+            # события после этой строки снова пометят индекс
+            self._dirty = False
+            try:
+                st = os.stat(self.filename)
+            except OSError:
+                self._reset()
+                return
+            stamp = (st.st_ino, st.st_size, st.st_mtime)
+            if stamp == self._stamp:
+                return
+
+            with open(self.filename, 'rb') as f:
+                if self._position.appended(f, st):
+                    self._undo_pending()
+                    self.updates += 1
+                else:
+                    self._reset()
+                    self.reloads += 1
+                self._read(f)
+            self._stamp = stamp
+
+    def _undo_pending(self):
+        ''' убирает запись недописанной строки, она будет прочитана снова '''
+        if self._pending is not None:
+            ip, name = self._pending
+            if name is None:
+                self._del(ip)
+            else:
+                self._set(ip, name)
+            self._pending = None
+
+    def _read(self, f):
+        ''' читает записи после прочитанного '''
+        for _, line in self._position.read_lines(f):
+            record = parse_record(line)
+            if record is None:
+                continue
+            self.lines += 1
+            if record[1] is None:
+                self._del(record[0])
+            else:
+                self._set(*record)
+
+        record = parse_record(self._position.partial)
+        if record is not None and record[1] is not None:
+            self._pending = record[0], self.records.get(record[0])
+            self._set(*record)
+
+    def _fresh(self):
+        if self._notifier is None or self._dirty:
+            self.refresh()
+        return self.records
+
+    def items(self):
+        ''' Список пар (ip, имя) в порядке файла '''
+        return self._fresh().items()
+
+    def head(self, n):
+        ''' Первые n пар (ip, имя) в порядке items() '''
+        records = self._fresh()
+        return [(ip, records[ip]) for ip in islice(records, max(n, 0))]
+
+    def tail(self, n):
+        ''' Последние n пар (ip, имя) в порядке items(), обходит только их '''
+        records = self._fresh()
+        ips = list(islice(reversed(records), max(n, 0)))
+        ips.reverse()
+        return [(ip, records[ip]) for ip in ips]
+
+    def get(self, ip, default=None):
+        return self._fresh().get(ip, default)
+
+    def __len__(self):
+        return len(self._fresh())
+
+    def find(self, phrase):
+        ''' Пары (ip, имя), имя которых содержит phrase, по мере нахождения '''
+        self._fresh()
+        return self.substrings.search(phrase)
+
+    def match_domains(self, pattern):
+        '''
+        Пары (ip, имя) по шаблону LabelTrie.query:
+        "*.zone", "prefix*.zone" или точное имя
+        '''
+        self._fresh()
+        return self.domains.query(pattern)
+
+    def _named(self, ips):
+        records = self.records
+        return [(ip, records[ip]) for ip in ips]
+
+    def in_range(self, first, last):
+        ''' Пары (ip, имя) с адресами от first до last по порядку адресов '''
+        bounds = ip_to_int(first), ip_to_int(last)
+        if None in bounds:
+            raise ValueError('bad range %s - %s' % (first, last))
+        self._fresh()
+        return self._named(self.addresses.between(*bounds))
+
+    def in_network(self, network):
+        ''' Пары (ip, имя) сети a.b.c.d/len по порядку адресов '''
+        self._fresh()
+        return self._named(self.addresses.network(network))
+
+    def items_by_ip(self):
+        ''' Пары (ip, имя) по порядку адресов, не ipv4 адреса в конце '''
+        records = self._fresh()
+        ordered = self._named(self.addresses.ordered())
+        if len(ordered) < len(records):
+            ordered.extend(
+                (ip, name) for ip, name in records.iteritems()
+                if self.addresses.value(ip) is None
+            )
+        return ordered
+
+    def add_many(self, records, replace=False, batch_size=BATCH_SIZE,
+                 sync=True):
+        '''
+        Дописывает пары (ip, имя), которых еще нет в файле, группами по
+        batch_size строк: одна запись, flush и fsync (sync) на группу.
+        Пара с ip, у которого уже другое имя, пропускается, с replace
+        дописывается и заменяет имя. Возвращает dict счетчиков added,
+        duplicates и conflicts
+        '''
+        counts = {'added': 0, 'duplicates': 0, 'conflicts': 0}
+        current = self._fresh()
+        # записи группы: индекс прочитает их после записи
+        batch = OrderedDict()
+        for ip, name in records:
+            known = batch.get(ip) or current.get(ip)
+            if known == name:
+                counts['duplicates'] += 1
+                continue
+            if known is not None and not replace:
+                counts['conflicts'] += 1
+                continue
+            batch[ip] = name
+            if len(batch) >= batch_size:
+                counts['added'] += self._commit(batch, sync)
+                current = self._fresh()
+        counts['added'] += self._commit(batch, sync)
+        return counts
+
+    def _commit(self, batch, sync):
+        ''' дописывает группу разом, возвращает число записей '''
+        if not batch:
+            return 0
+        append_lines(self.filename, ''.join(
+            format_record(ip, name) for ip, name in batch.iteritems()
+        ), sync)
+        count = len(batch)
+        batch.clear()
+        self.invalidate()
+        return count
+
+    def import_lines(self, lines, replace=False, batch_size=BATCH_SIZE):
+        '''
+        add_many для строк в формате файла hosts, счетчик bad - строки,
+        которые не являются записью с ipv4 адресом
+        '''
+        bad = [0]
+
+        def records():
+            for line in lines:
+                record = parse_record(line)
+                if record is None:
+                    if line.strip() and not line.lstrip().startswith('#'):
+                        bad[0] += 1
+                elif record[1] is None or ip_to_int(record[0]) is None:
+                    bad[0] += 1
+                else:
+                    yield record
+
+        counts = self.add_many(records(), replace, batch_size)
+        counts['bad'] = bad[0]
+        return counts
+
+    def garbage(self):
+        ''' Число строк файла, замененных или удаленных позже '''
+        return self.lines - len(self._fresh())
+
+    def needs_compaction(self):
+        garbage = self.garbage()
+        return garbage > COMPACT_MIN and garbage > len(self.records)
+
+    def compact(self):
+        '''
+        Переписывает файл одними живыми записями,
+        чтение индекса на это время не блокируется
+        '''
+        with open(self.filename, 'rb') as f:
+            # дописывающие ждут, файл не меняется до rename
+            _lock(f)
+            try:
+                with self._lock:
+                    self.refresh()
+                    stamp = self._stamp
+                    records = self.records.items()
+                st = atomic_write(self.filename, (
+                    format_record(ip, name) for ip, name in records
+                ))
+                # хвост нового файла, строка записи не короче байта
+                check = ''.join(
+                    format_record(ip, name)
+                    for ip, name in records[-CHECK_BYTES:]
+                )[-CHECK_BYTES:]
+                with self._lock:
+                    # записи те же, сверяться дальше с новым файлом
+                    if self._stamp == stamp:
+                        self._stamp = (st.st_ino, st.st_size, st.st_mtime)
+                        self._position = ReadPosition(
+                            st.st_ino, st.st_size, check
+                        )
+                        self._pending = None
+                        self.lines = len(self.records)
+            finally:
+                _unlock(f)
+
+    def maybe_compact(self):
+        '''
+        Запускает compact() в фоновом потоке, если мертвых строк
+        стало много, возвращает поток или None
+        '''
+        if self._compactor is not None and self._compactor.is_alive():
+            return None
+        if not self.needs_compaction():
+            return None
+        self._compactor = threading.Thread(target=self.compact)
+        self._compactor.daemon = True
+        self._compactor.start()
+        return self._compactor
+
+    def watch(self):
+        '''
+        Включает слежение за файлом через inotify,
+        возвращает False если pyinotify не установлен
+        '''
+        if pyinotify is None:
+            return False
+        if self._notifier is not None:
+            return True
+
+        index = self
+
+        class Handler(pyinotify.ProcessEvent):
+            def process_default(self, event):
+                if event.pathname == index.filename:
+                    index.invalidate()
+
+        # следим за каталогом: файл могут заменить переименованием
+        manager = pyinotify.WatchManager()
+        mask = (pyinotify.IN_MODIFY | pyinotify.IN_CLOSE_WRITE |
+                pyinotify.IN_CREATE | pyinotify.IN_DELETE |
+                pyinotify.IN_MOVED_TO | pyinotify.IN_MOVED_FROM)
+        notifier = pyinotify.ThreadedNotifier(manager, Handler())
+        notifier.daemon = True
+        notifier.start()
+        manager.add_watch(os.path.dirname(self.filename), mask)
+        self._notifier = notifier
+        self.invalidate()
+        return True
+
+    def unwatch(self):
+        ''' Выключает слежение, индекс снова сверяется при каждом обращении '''
+        if self._notifier is not None:
+            self._notifier.stop()
+            self._notifier = None
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Чтение строк из середины файла hosts без чтения всего файла.
+
+LineIndex хранит смещение каждой step-й строки и переходит к строке
+с номером seek'ом к ближайшей отметке. Первые и последние записи
+в порядке индекса отдают HostsIndex.head и HostsIndex.tail.
+'''
+import os
+from array import array
+
+from hosts_index import parse_record, ReadPosition
+
+LINE_STEP = 1024
+
+
+class LineIndex(object):
+    '''
+    Смещения строк файла с номерами, кратными step (с нуля), индекс
+    дочитывает дописанный файл и строится заново, если файл заменен
+    '''
+
+    def __init__(self, filename, step=LINE_STEP):
+        self.filename = filename
+        self.step = step
+        self._reset()
+
+    def _reset(self):
+        self.offsets = array('L')
+        # прочитано полных строк
+        self.lines = 0
+        self._position = ReadPosition()
+
+    def update(self):
+        ''' Дочитывает новые строки файла '''
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            self._reset()
+            return
+        with open(self.filename, 'rb') as f:
+            if not self._position.appended(f, st):
+                self._reset()
+            elif st.st_size == self._position.offset:
+                return
+            for offset, _ in self._position.read_lines(f):
+                if self.lines % self.step == 0:
+                    self.offsets.append(offset)
+                self.lines += 1
+
+    def read_lines(self, start, count):
+        ''' Строки файла с номерами [start, start + count) '''
+        self.update()
+        if start < 0 or start >= self.lines or count <= 0:
+            return []
+        count = min(count, self.lines - start)
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offsets[start // self.step])
+            for _ in xrange(start % self.step):
+                f.readline()
+            return [f.readline() for _ in xrange(count)]
+
+    def read_records(self, start, count, is_live=None):
+        '''
+        Записи (ip, имя) среди строк [start, start + count),
+        is_live(ip, имя) отбрасывает удаленные и замененные записи
+        '''
+        records = []
+        for line in self.read_lines(start, count):
+            record = parse_record(line)
+            if record is None or record[1] is None:
+                continue
+            if is_live is None or is_live(*record):
+                records.append(record)
+        return records
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Сетевой сервис имен поверх файла hosts: прямые (имя -> ip) и обратные
+(ip -> имя) запросы по UDP и TCP на одном порту. Ответы берутся из
+индекса на диске (hosts_sidecar), так что сервис стартует сразу и
+видит изменения файла. Каждое TCP соединение обслуживается в своем
+потоке, UDP запросы - в одном потоке, ответ занимает микросекунды.
+
+Протокол, строки ascii:
+    запрос: имя или ip адрес, по TCP строка с \\n, можно слать подряд
+    ответ: "OK <запрос> <ответ>" или "NX <запрос>", по TCP строка с \\n
+
+Usage:
+    python -m avalon_python.main_data_types.hosts_service serve \\
+        --hosts hosts --port 5353
+    python -m avalon_python.main_data_types.hosts_service bench \\
+        --hosts hosts --port 5353 --clients 16 --queries 100000
+'''
+import argparse
+import json
+import random
+import socket
+import sys
+import threading
+import SocketServer
+from timeit import default_timer
+
+from avalon_python.common.misc import percentile
+from hosts_index import HostsIndex
+from hosts_sidecar import SidecarResolver
+
+DEFAULT_PORT = 5353
+# длиннее имен и адресов не бывает
+MAX_QUERY = 255
+
+
+def answer(resolver, query):
+    ''' строка ответа на запрос '''
+    result = resolver.resolve(query)
+    if result is None:
+        return 'NX %s' % query
+    return 'OK %s %s' % (query, result)
+
+
+def parse_answer(line):
+    ''' (запрос, ответ или None) из строки ответа '''
+    fields = line.split()
+    if len(fields) == 3 and fields[0] == 'OK':
+        return fields[1], fields[2]
+    if len(fields) == 2 and fields[0] == 'NX':
+        return fields[1], None
+    raise ValueError('bad answer %r' % line)
+
+
+class UDPHandler(SocketServer.BaseRequestHandler):
+    ''' один запрос в датаграмме '''
+    def handle(self):
+        data, sock = self.request
+        query = data.strip()
+        if query and len(query) <= MAX_QUERY and len(query.split()) == 1:
+            sock.sendto(answer(self.server.resolver, query),
+                        self.client_address)
+
+
+class TCPHandler(SocketServer.StreamRequestHandler):
+    ''' запросы соединения построчно, пока клиент его не закроет '''
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_QUERY + 2)
+            if not line.endswith('\n'):
+                # соединение закрыто или строка слишком длинная
+                return
+            query = line.strip()
+            if not query:
+                continue
+            if len(query.split()) != 1:
+                return
+            self.wfile.write(answer(self.server.resolver, query) + '\n')
+
+
+class HostsUDPServer(SocketServer.UDPServer):
+    allow_reuse_address = True
+    max_packet_size = MAX_QUERY + 2
+
+    def __init__(self, address, resolver):
+        SocketServer.UDPServer.__init__(self, address, UDPHandler)
+        self.resolver = resolver
+
+
+class HostsTCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, resolver):
+        SocketServer.TCPServer.__init__(self, address, TCPHandler)
+        self.resolver = resolver
+
+
+class HostsService(object):
+    ''' UDP и TCP серверы файла hosts, port=0 - любой свободный '''
+
+    def __init__(self, filename, host='127.0.0.1', port=DEFAULT_PORT):
+        self.resolver = SidecarResolver(filename)
+        self.tcp = HostsTCPServer((host, port), self.resolver)
+        # с port=0 UDP занимает порт, выбранный для TCP
+        self.address = self.tcp.server_address
+        self.udp = HostsUDPServer(self.address, self.resolver)
+        self._threads = []
+
+    def start(self):
+        ''' Обслуживает запросы в фоновых потоках '''
+        for server in (self.udp, self.tcp):
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def serve_forever(self):
+        ''' UDP в фоновом потоке, TCP в текущем '''
+        thread = threading.Thread(target=self.udp.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+        self.tcp.serve_forever()
+
+    def shutdown(self):
+        for server in (self.udp, self.tcp):
+            if self._threads:
+                server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.resolver.close()
+
+
+class HostsClient(object):
+    ''' Клиент HostsService, proto - 'udp' или 'tcp' '''
+
+    def __init__(self, address, proto='udp', timeout=1.0):
+        self.address = address
+        self.proto = proto
+        if proto == 'udp':
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        elif proto == 'tcp':
+            self.sock = socket.create_connection(address)
+            self.rfile = self.sock.makefile('rb')
+        else:
+            raise ValueError('unknown protocol %r' % proto)
+        self.sock.settimeout(timeout)
+
+    def close(self):
+        if self.proto == 'tcp':
+            self.rfile.close()
+        self.sock.close()
+
+    def resolve(self, query):
+        '''
+        Имя для ip адреса, ip для имени, None если записи нет,
+        socket.timeout если UDP ответ потерян
+        '''
+        if self.proto == 'tcp':
+            return self.resolve_many([query])[0]
+        self.sock.sendto(query, self.address)
+        while True:
+            # ответы на прошлые запросы, пришедшие после их таймаута
+            reply, result = parse_answer(self.sock.recv(1024))
+            if reply == query:
+                return result
+
+    def resolve_many(self, queries):
+        ''' Ответы на запросы, по TCP запросы отправляются разом '''
+        if self.proto == 'udp':
+            return [self.resolve(query) for query in queries]
+        self.sock.sendall(''.join(query + '\n' for query in queries))
+        results = []
+        for _ in queries:
+            line = self.rfile.readline()
+            if not line:
+                raise EOFError('connection closed')
+            results.append(parse_answer(line)[1])
+        return results
+
+
+def measure_load(address, queries, clients=8, proto='udp', timeout=1.0):
+    '''
+    Отправляет запросы из clients потоков, у каждого свое соединение,
+    запросы делятся между потоками поровну, результат - dict
+    '''
+    latencies = [[] for _ in xrange(clients)]
+    counters = [{'found': 0, 'missing': 0, 'timeouts': 0}
+                for _ in xrange(clients)]
+
+    def run(number):
+        client = HostsClient(address, proto, timeout)
+        timer = default_timer
+        timings = latencies[number]
+        counts = counters[number]
+        try:
+            for query in queries[number::clients]:
+                begin = timer()
+                try:
+                    result = client.resolve(query)
+                except socket.timeout:
+                    counts['timeouts'] += 1
+                    continue
+                timings.append(timer() - begin)
+                counts['found' if result is not None else 'missing'] += 1
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=run, args=(number,))
+               for number in xrange(clients)]
+    started = default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = default_timer() - started
+
+    timings = sorted(sum(latencies, []))
+    result = {
+        'proto': proto,
+        'clients': clients,
+        'queries': len(queries),
+        'seconds': elapsed,
+        'queries_per_sec': len(timings) / elapsed,
+        'latency_us': None,
+    }
+    for name in ('found', 'missing', 'timeouts'):
+        result[name] = sum(counts[name] for counts in counters)
+    if timings:
+        result['latency_us'] = dict(
+            (name, percentile(timings, fraction) * 1e6)
+            for name, fraction in (
+                ('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999),
+                ('max', 1.0)
+            )
+        )
+    return result
+
+
+def make_queries(filename, count, seed=0):
+    ''' Случайные имена и адреса файла hosts, четверть - обратные запросы '''
+    records = HostsIndex(filename).items()
+    if not records:
+        raise ValueError('no records in %s' % filename)
+    rnd = random.Random(seed)
+    queries = []
+    for _ in xrange(count):
+        ip, name = rnd.choice(records)
+        queries.append(ip if rnd.random() < 0.25 else name)
+    return queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Hosts name service')
+    parser.add_argument('command', choices=['serve', 'bench'])
+    parser.add_argument('--hosts', required=True, help='hosts file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--proto', choices=['udp', 'tcp'], default='udp',
+                        help='bench protocol')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=100000)
+    parser.add_argument('--timeout', type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        service = HostsService(args.hosts, args.host, args.port)
+        print 'serving %s on %s:%s' % ((args.hosts,) + service.address)
+        sys.stdout.flush()
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    queries = make_queries(args.hosts, args.queries)
+    result = measure_load(
+        (args.host, args.port), queries, args.clients, args.proto,
+        args.timeout
+    )
+    print json.dumps(result, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
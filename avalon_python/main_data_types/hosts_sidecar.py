@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Двоичный индекс файла hosts на диске (файл <hosts>.idx).
+
+В индексе два отсортированных массива: пары (ip как uint32, смещение
+строки) по ip и смещения строк по имени, сами имена берутся из файла
+hosts. Оба файла открываются через mmap, поиск - бисекция, так что
+открытие не зависит от размера файла и записи не загружаются в память.
+
+Индекс строится по прочитанной части файла hosts и хранит ее inode,
+размер и последние байты. Строки, дописанные позже (в том числе
+надгробия), читаются в память и учитываются поверх индекса. Если файл
+заменен или дописанного стало много, индекс нужно перестроить:
+open_sidecar делает это сам.
+
+Формат (little endian):
+    заголовок: HEADER
+    ip_count записей IP_ENTRY: ip, смещение строки
+    name_count записей NAME_ENTRY: смещение строки
+'''
+import mmap
+import os
+import struct
+import threading
+
+from hosts_index import (
+    parse_record, atomic_write, ReadPosition, CHECK_BYTES
+)
+from ip_index import ip_to_int
+
+MAGIC = 'HIDX'
+FILE_VERSION = 1
+# magic, версия, inode, размер, ip_count, name_count,
+# длина и байты конца файла hosts
+HEADER = struct.Struct('<4sIQQQQB%ds' % CHECK_BYTES)
+IP_ENTRY = struct.Struct('<IQ')
+NAME_ENTRY = struct.Struct('<Q')
+
+# нет значения в HostsSidecar._tail
+_MISSING = object()
+
+# после стольких дописанных байт (и четверти размера) индекс перестраивается
+REBUILD_TAIL = 1 << 20
+
+
+class StaleSidecar(Exception):
+    ''' Индекс отсутствует или не соответствует файлу hosts '''
+
+
+def sidecar_name(filename):
+    return filename + '.idx'
+
+
+def build_sidecar(filename):
+    ''' Строит индекс по полным строкам файла hosts '''
+    # ip -> (смещение последней строки, имя)
+    live = {}
+    position = ReadPosition()
+    with open(filename, 'rb') as f:
+        for offset, line in position.read_lines(f):
+            record = parse_record(line)
+            if record is not None:
+                ip, name = record
+                if name is None:
+                    live.pop(ip, None)
+                else:
+                    live[ip] = offset, name
+
+    ips = sorted(
+        (ip_to_int(ip), line_offset)
+        for ip, (line_offset, name) in live.iteritems()
+        if ip_to_int(ip) is not None
+    )
+    names = sorted(
+        (name, line_offset) for line_offset, name in live.itervalues()
+    )
+
+    def chunks():
+        yield HEADER.pack(
+            MAGIC, FILE_VERSION, position.ino, position.offset, len(ips),
+            len(names), len(position.check), position.check
+        )
+        for entry in ips:
+            yield IP_ENTRY.pack(*entry)
+        for name, line_offset in names:
+            yield NAME_ENTRY.pack(line_offset)
+
+    atomic_write(sidecar_name(filename), chunks())
+
+
+def _map(f, size):
+    return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) \
+        if size else ''
+
+
+class HostsSidecar(object):
+    '''
+    Открытый индекс файла hosts, StaleSidecar при открытии и поиске
+    означает, что индекс надо перестроить
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        try:
+            index_file = open(sidecar_name(filename), 'rb')
+        except IOError:
+            raise StaleSidecar('no index of %s' % filename)
+        with index_file:
+            index_size = os.fstat(index_file.fileno()).st_size
+            if index_size < HEADER.size:
+                raise StaleSidecar('truncated index of %s' % filename)
+            self._index = _map(index_file, index_size)
+        self._hosts = ''
+        try:
+            self._open(filename, index_size)
+        except:
+            self.close()
+            raise
+
+    def _open(self, filename, index_size):
+        (magic, version, ino, size, self.ip_count, self.name_count,
+         check_len, check) = HEADER.unpack_from(self._index)
+        if magic != MAGIC or version != FILE_VERSION or index_size != \
+                HEADER.size + IP_ENTRY.size * self.ip_count + \
+                NAME_ENTRY.size * self.name_count:
+            raise StaleSidecar('bad index of %s' % filename)
+        self._ips_at = HEADER.size
+        self._names_at = self._ips_at + IP_ENTRY.size * self.ip_count
+
+        with open(filename, 'rb') as f:
+            st = os.fstat(f.fileno())
+            f.seek(max(0, size - check_len))
+            if st.st_ino != ino or st.st_size < size or \
+                    f.read(check_len) != check[:check_len]:
+                raise StaleSidecar('%s changed' % filename)
+            self._hosts = _map(f, size)
+        self._size = size
+        self._position = ReadPosition(ino, size, check[:check_len])
+        # строки дописанные после построения индекса: ip -> имя или None
+        self._tail = {}
+        # недописанная последняя строка уже в _tail: (ip, прежнее значение)
+        self._partial = None
+        self._seen_size = size
+
+    def close(self):
+        for mapped in (self._index, self._hosts):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+    def update(self):
+        ''' Читает строки, дописанные в файл hosts '''
+        position = self._position
+        st = os.stat(self.filename)
+        if st.st_ino != position.ino or st.st_size < position.offset:
+            raise StaleSidecar('%s changed' % self.filename)
+        if st.st_size == self._seen_size:
+            return
+        if st.st_size - self._size > max(REBUILD_TAIL, self._size // 4):
+            raise StaleSidecar('%s has grown' % self.filename)
+        with open(self.filename, 'rb') as f:
+            # перезапись файла с тем же inode
+            if not position.appended(f, st):
+                raise StaleSidecar('%s changed' % self.filename)
+            self._undo_partial()
+            for _, line in position.read_lines(f):
+                record = parse_record(line)
+                if record is not None:
+                    self._tail[record[0]] = record[1]
+            # как и HostsIndex, запись без \n видна до дописывания строки
+            record = parse_record(position.partial)
+            if record is not None and record[1] is not None:
+                ip = record[0]
+                self._partial = ip, self._tail.get(ip, _MISSING)
+                self._tail[ip] = record[1]
+        self._seen_size = st.st_size
+
+    def _undo_partial(self):
+        ''' убирает запись недописанной строки, она будет прочитана снова '''
+        if self._partial is not None:
+            ip, value = self._partial
+            if value is _MISSING:
+                del self._tail[ip]
+            else:
+                self._tail[ip] = value
+            self._partial = None
+
+    def _record(self, offset):
+        ''' (ip, имя) строки файла hosts по смещению '''
+        return parse_record(
+            self._hosts[offset:self._hosts.find('\n', offset)]
+        )
+
+    def _ip_entry(self, i):
+        return IP_ENTRY.unpack_from(
+            self._index, self._ips_at + IP_ENTRY.size * i
+        )
+
+    def _name_at(self, i):
+        offset, = NAME_ENTRY.unpack_from(
+            self._index, self._names_at + NAME_ENTRY.size * i
+        )
+        return self._record(offset)
+
+    def resolve_ip(self, ip):
+        ''' Имя ip или None '''
+        self.update()
+        if ip in self._tail:
+            return self._tail[ip]
+        value = ip_to_int(ip)
+        if value is None:
+            return None
+        lo, hi = 0, self.ip_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ip_entry(mid)[0] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.ip_count:
+            entry_ip, offset = self._ip_entry(lo)
+            if entry_ip == value:
+                return self._record(offset)[1]
+        return None
+
+    def resolve_name(self, name):
+        ''' ip с именем name или None '''
+        self.update()
+        lo, hi = 0, self.name_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name_at(mid)[1] < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        # у одного имени может быть несколько ip, часть из них
+        # заменена или удалена дописанными строками
+        for i in xrange(lo, self.name_count):
+            ip, record_name = self._name_at(i)
+            if record_name != name:
+                break
+            if ip not in self._tail:
+                return ip
+        for ip, record_name in self._tail.iteritems():
+            if record_name == name:
+                return ip
+        return None
+
+    def resolve(self, request):
+        ''' Имя для ip адреса, ip для имени, None если записи нет '''
+        if ip_to_int(request) is not None:
+            return self.resolve_ip(request)
+        return self.resolve_name(request)
+
+
+def open_sidecar(filename):
+    ''' Открывает индекс файла hosts, перестраивая его при необходимости '''
+    try:
+        sidecar = HostsSidecar(filename)
+    except StaleSidecar:
+        pass
+    else:
+        try:
+            sidecar.update()
+            return sidecar
+        except StaleSidecar:
+            sidecar.close()
+    build_sidecar(filename)
+    return HostsSidecar(filename)
+
+
+class SidecarResolver(object):
+    '''
+    resolve по индексу файла hosts, устаревший индекс перестраивается,
+    можно вызывать из нескольких потоков
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._sidecar = None
+        self._lock = threading.Lock()
+
+    def resolve(self, request):
+        ''' Имя для ip адреса, ip для имени, None если записи нет '''
+        with self._lock:
+            if not os.path.exists(self.filename):
+                return None
+            if self._sidecar is not None:
+                try:
+                    return self._sidecar.resolve(request)
+                except StaleSidecar:
+                    self._sidecar.close()
+                    self._sidecar = None
+            self._sidecar = open_sidecar(self.filename)
+            return self._sidecar.resolve(request)
+
+    def close(self):
+        with self._lock:
+            if self._sidecar is not None:
+                self._sidecar.close()
+                self._sidecar = None
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Отсортированный индекс ipv4 адресов записей для запросов по диапазону
+и сети (CIDR): адреса хранятся числами uint32 в отсортированном
+array('I'), границы ищутся бисекцией, запрос стоит O(log n + k).
+
+Добавленные адреса копятся и сливаются с массивом при следующем
+запросе: несколько адресов вставляются на место, пачка побольше
+сортируется и сливается с массивом за один проход.
+'''
+from array import array
+from bisect import bisect_left, bisect_right
+
+ADDR_MAX = 0xFFFFFFFF
+# каждая вставка сдвигает массив, больше адресов сливаются проходом
+INSERT_MAX = 32
+
+
+def ip_to_int(ip):
+    ''' ip вида a.b.c.d в число, None если это не ipv4 адрес '''
+    octets = ip.split('.')
+    if len(octets) != 4:
+        return None
+    value = 0
+    for octet in octets:
+        # только каноническая запись: 10.0.0.1, но не 10.0.0.01
+        if not octet.isdigit() or octet != str(int(octet)) or \
+                int(octet) > 255:
+            return None
+        value = (value << 8) | int(octet)
+    return value
+
+
+def int_to_ip(value):
+    return '%d.%d.%d.%d' % (
+        value >> 24, (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+    )
+
+
+def padded_ip(value):
+    ''' ip с октетами из трех цифр, для ровных колонок '''
+    return '%03d.%03d.%03d.%03d' % (
+        value >> 24, (value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF
+    )
+
+
+def parse_network(network):
+    '''
+    Первый и последний адрес сети a.b.c.d/len числами,
+    ValueError для неверной записи
+    '''
+    addr, _, prefix_len = network.partition('/')
+    value = ip_to_int(addr)
+    if value is None or not prefix_len.isdigit() or int(prefix_len) > 32:
+        raise ValueError('bad network %r' % network)
+    host_mask = ADDR_MAX >> int(prefix_len)
+    first = value & ~host_mask & ADDR_MAX
+    return first, first | host_mask
+
+
+class IPIndex(object):
+    ''' Ключи - ip адреса записей, отсортированные по числовому значению '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._sorted = array('I')
+        # добавленные, но еще не слитые с _sorted
+        self._pending = set()
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def value(self, ip):
+        ''' ip числом, None если его нет в индексе '''
+        return self._values.get(ip)
+
+    def add(self, ip, name=None):
+        ''' Добавляет ip, не ipv4 адреса пропускаются '''
+        if ip in self._values:
+            return
+        value = ip_to_int(ip)
+        if value is None:
+            return
+        self._values[ip] = value
+        self._pending.add(value)
+
+    def remove(self, ip):
+        value = self._values.pop(ip, None)
+        if value is None:
+            return
+        if value in self._pending:
+            self._pending.discard(value)
+        else:
+            del self._sorted[bisect_left(self._sorted, value)]
+
+    def _merge(self):
+        pending = self._pending
+        if not pending:
+            return
+        if len(pending) <= INSERT_MAX:
+            for value in pending:
+                self._sorted.insert(bisect_left(self._sorted, value), value)
+        else:
+            # два отсортированных куска timsort сливает за линейное время
+            merged = array('I', self._sorted)
+            merged.extend(sorted(pending))
+            self._sorted = array('I', sorted(merged))
+        pending.clear()
+
+    def between(self, first, last):
+        ''' ip адреса от first до last включительно (числа) по порядку '''
+        self._merge()
+        values = self._sorted
+        lo = bisect_left(values, first)
+        hi = bisect_right(values, last)
+        return [int_to_ip(value) for value in values[lo:hi]]
+
+    def network(self, network):
+        ''' ip адреса сети a.b.c.d/len по порядку '''
+        return self.between(*parse_network(network))
+
+    def ordered(self):
+        ''' Все ip адреса по порядку '''
+        return self.between(0, ADDR_MAX)
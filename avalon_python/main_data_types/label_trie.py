@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Дерево меток доменных имен, метки идут от последней к первой:
+db1.prod.example хранится по пути example -> prod -> db1. Все имена
+зоны лежат в одном поддереве, поэтому запросы "*.zone" (все имена
+внутри зоны) и "db*.zone" (имена зоны, первая метка которых начинается
+с db) обходят только ответ, а не все записи. Регистр меток не важен.
+'''
+from bisect import bisect_left
+
+
+def split_labels(name):
+    ''' метки имени от последней к первой '''
+    return name.lower().rstrip('.').split('.')[::-1]
+
+
+class _Node(object):
+    __slots__ = ('children', 'keys', 'labels')
+
+    def __init__(self):
+        self.children = {}
+        # ключи записей, имя которых заканчивается на этом узле
+        self.keys = set()
+        # отсортированные метки детей, строятся при поиске по префиксу
+        self.labels = None
+
+
+class LabelTrie(object):
+    ''' Ключи (ip) с именами и поиск имен по зоне '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._root = _Node()
+        self._names = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, key, name):
+        ''' Добавляет имя ключа, прежнее имя ключа заменяется '''
+        if key in self._names:
+            self.remove(key)
+        self._names[key] = name
+        node = self._root
+        for label in split_labels(name):
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = _Node()
+                node.labels = None
+            node = child
+        node.keys.add(key)
+
+    def remove(self, key):
+        ''' Удаляет ключ, если он есть, и опустевшие узлы '''
+        name = self._names.pop(key, None)
+        if name is None:
+            return
+        path = []
+        node = self._root
+        for label in split_labels(name):
+            path.append((node, label))
+            node = node.children[label]
+        node.keys.discard(key)
+        while path and not node.keys and not node.children:
+            parent, label = path.pop()
+            del parent.children[label]
+            parent.labels = None
+            node = parent
+
+    def _find(self, zone):
+        ''' узел зоны или None, пустая зона - корень '''
+        node = self._root
+        if not zone:
+            return node
+        for label in split_labels(zone):
+            node = node.children.get(label)
+            if node is None:
+                return None
+        return node
+
+    def _records(self, node):
+        names = self._names
+        for key in list(node.keys):
+            yield key, names[key]
+
+    def _subtree(self, node):
+        ''' (ключ, имя) всех имен поддерева '''
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for record in self._records(node):
+                yield record
+            stack.extend(node.children.values())
+
+    def subdomains(self, zone):
+        ''' (ключ, имя) имен внутри зоны zone, без самой зоны ("*.zone") '''
+        node = self._find(zone)
+        if node is None:
+            return
+        for child in node.children.values():
+            for record in self._subtree(child):
+                yield record
+
+    def label_prefix(self, prefix, zone=''):
+        '''
+        (ключ, имя) имен на один уровень ниже зоны,
+        первая метка которых начинается с prefix ("prefix*.zone")
+        '''
+        node = self._find(zone)
+        if node is None:
+            return
+        if node.labels is None:
+            node.labels = sorted(node.children)
+        prefix = prefix.lower()
+        labels = node.labels
+        for i in xrange(bisect_left(labels, prefix), len(labels)):
+            if not labels[i].startswith(prefix):
+                break
+            child = node.children.get(labels[i])
+            if child is not None:
+                for record in self._records(child):
+                    yield record
+
+    def query(self, pattern):
+        '''
+        (ключ, имя) по шаблону: "*.zone" - имена внутри зоны,
+        "ab*.zone" - по префиксу первой метки, иначе точное имя
+        '''
+        first, _, zone = pattern.partition('.')
+        if first == '*':
+            return self.subdomains(zone)
+        if first.endswith('*'):
+            return self.label_prefix(first[:-1], zone)
+        node = self._find(pattern)
+        return self._records(node) if node is not None else iter(())
@@ -5,6 +5,12 @@ import sys
 import os
 sys.path.append(os.getcwd())
 from simple_cli import SimpleCLI
+from hosts_index import (
+    HostsIndex, parse_record, append_lines, format_tombstone
+)
+from hosts_sidecar import SidecarResolver
+from hosts_lines import LineIndex
+from ip_index import ip_to_int, padded_ip
 from avalon_python.common.misc import get_cstring
 from collections import OrderedDict
 import re
@@ -30,39 +36,88 @@ import re
 CUR_DIR = os.path.dirname(__file__)
 FILE_NAME = os.path.join(CUR_DIR, r'hosts')
 
+# загруженные индексы файлов, см. get_index
+_indexes = {}
+# открытые индексы на диске, см. resolv_request
+_sidecars = {}
+
 
 def parse_hosts_file(filename=FILE_NAME):
     '''
     парсит входной файл на выходе отдает словарь с сохранением порядка
     дубликаты ip адресов будут устранены(будет браться первый ip адрес)
+    надгробия удаляют ip из словаря
     '''
     if os.path.exists(filename):
+        records = OrderedDict()
         with open(filename, 'r') as f:
-            return OrderedDict([record.strip().split()
-                               for record in f.readlines()])
+            for line in f:
+                record = parse_record(line)
+                if record is None:
+                    continue
+                ip, name = record
+                if name is not None:
+                    records[ip] = name
+                elif ip in records:
+                    del records[ip]
+        return records
     return None
 
 
+def get_index(filename=FILE_NAME):
+    ''' Индекс файла в памяти, один на файл '''
+    index = _indexes.get(filename)
+    if index is None:
+        index = _indexes[filename] = HostsIndex(filename)
+    return index
+
+
+def resolv_request(request, filename=FILE_NAME):
+    '''
+    Имя для ip адреса или ip для имени по индексу на диске,
+    None если записи нет
+    '''
+    sidecar = _sidecars.get(filename)
+    if sidecar is None:
+        sidecar = _sidecars[filename] = SidecarResolver(filename)
+    return sidecar.resolve(request)
+
+
+def is_live_record(ip, name, filename=FILE_NAME):
+    ''' Запись не удалена и не заменена более поздней строкой '''
+    return resolv_request(ip, filename) == name
+
+
 def add_resolv_record(ip, name, filename=FILE_NAME):
-    ''' Добавляет физическую запись '''
-    # TODO: проверки на наличие такого хоста не производится
-    with open(filename, 'a') as f:
-        f.write('%s\t%s\n' % (ip, name))
+    '''
+    Добавляет физическую запись, если ip еще нет в файле,
+    возвращает счетчики HostsIndex.add_many
+    '''
+    return get_index(filename).add_many([(ip, name)], sync=False)
 
 
-def remove_resolv_record(ip, filename=FILE_NAME):
-    # Здесь можно пойти по пути оптимизации
-    # и копировать файл во временный, а дальше перезаписать
-    # построчно целевой исключая строку с искомым ip
-    lines = None
-    with open(filename, 'r+') as f:
-        lines = f.readlines()
-        f.truncate()
+def import_records(source, filename=FILE_NAME, replace=False):
+    '''
+    Добавляет записи из файла source ('-' - stdin) группами,
+    возвращает счетчики HostsIndex.import_lines
+    '''
+    if source == '-':
+        return get_index(filename).import_lines(sys.stdin, replace)
+    with open(source, 'r') as f:
+        return get_index(filename).import_lines(f, replace)
 
-    with open(filename, 'w') as f:
-        for line in lines:
-            if line.split()[0] != ip:
-                f.write(line)
+
+def remove_resolv_record(ip, filename=FILE_NAME):
+    '''
+    Дописывает надгробие ip, файл переписывается
+    в фоне когда надгробий становится много
+    '''
+    index = get_index(filename)
+    if index.get(ip) is None:
+        return
+    append_lines(filename, format_tombstone(ip))
+    index.invalidate()
+    index.maybe_compact()
 
 
 def display_error(cmd):
@@ -83,6 +138,10 @@ clear = lambda: os.system(['clear', 'cls'][os.name == 'nt'])
 # MAIN
 #######
 def main():
+    index = get_index()
+    # без pyinotify индекс сверяется с файлом при каждом обращении
+    index.watch()
+    line_index = LineIndex(FILE_NAME)
 
     def help():
         ''' Выводит справку '''
@@ -95,50 +154,93 @@ def main():
 
     def get_records():
         ''' Возвращает список записей из файла '''
-        return parse_hosts_file().items()
+        return index.items()
 
     def display_records(records):
         ''' Выполняет отображение записей '''
+        addresses = index.addresses
         for ip, hostname in records:
-            ip_string = '%03.d.%03.d.%03.d.%03.d' % tuple(map(int, ip.split('.')))
+            # числа адресов уже есть в индексе
+            value = addresses.value(ip)
+            if value is None:
+                value = ip_to_int(ip)
+            ip_string = padded_ip(value) if value is not None else ip
             print '%s  %s' % (get_cstring(ip_string, 'WARNING'), hostname)
 
     def show_all_records():
-        ''' Выводит все записи '''
+        ''' Выводит все записи по порядку адресов '''
         print get_cstring('All records:', 'HEADER')
-        display_records(get_records())
+        display_records(index.items_by_ip())
+
+    def show_network(network):
+        ''' Выводит записи сети a.b.c.d/len '''
+        try:
+            display_records(index.in_network(network))
+        except ValueError as e:
+            print get_cstring(str(e), 'FAIL')
+
+    def show_between(first, last):
+        ''' Выводит записи с адресами от first до last '''
+        try:
+            display_records(index.in_range(first, last))
+        except ValueError as e:
+            print get_cstring(str(e), 'FAIL')
 
     def tail(n=5):
-        ''' Выводит n последних записей '''
+        ''' Выводит n последних записей в порядке файла '''
         print get_cstring('Last %s records:' % n, 'HEADER')
-        display_records(get_records()[-int(n):])
+        display_records(index.tail(int(n)))
 
     def head(n=5):
-        ''' Выводит n первых записей '''
+        ''' Выводит n первых записей в порядке файла '''
         print get_cstring('First %s records:' % n, 'HEADER')
-        display_records(get_records()[:int(n)])
+        display_records(index.head(int(n)))
+
+    def show_range(start, count=20):
+        ''' Выводит записи строк файла [start, start + count) '''
+        print get_cstring('Lines %s-%s:' % (start, int(start) + int(count)),
+                          'HEADER')
+        display_records(line_index.read_records(
+            int(start), int(count), is_live_record
+        ))
 
     def find(phraze):
         ''' Ищет хосты содержащие строку phraze '''
-        # Найдем записи, которые содержат искомую фразу
-        records = [record for record in get_records() if phraze in record[1]]
+        # Найдем записи, которые содержат искомую фразу,
+        # они выводятся по мере нахождения
+        records = index.find(phraze)
 
         # подсветим фразу в имени хоста
         highlight = lambda s: get_cstring(s, 'STRONG')
         inject = lambda fn, sep, string: fn(sep).join(string.split(sep))
-        records = [[i, inject(highlight, phraze, h)] for i, h in records]
+        records = ((i, inject(highlight, phraze, h)) for i, h in records)
 
         # отобразим записи
         display_records(records)
 
+    def zone(pattern):
+        ''' Выводит хосты зоны: *.zone или prefix*.zone '''
+        display_records(index.match_domains(pattern))
+
+    def add(ip, name):
+        ''' Добавляет запись, сообщает если ip уже занят '''
+        counts = add_resolv_record(ip, name)
+        if counts['conflicts']:
+            print '%s already has name %s' % (ip, index.get(ip))
+
+    def import_file(source):
+        ''' Добавляет записи из файла или stdin группами '''
+        counts = import_records(source)
+        print ', '.join(
+            '%s: %s' % (key, counts[key])
+            for key in ('added', 'duplicates', 'conflicts', 'bad')
+        )
+
     def resolv(request):
         ''' Разрешает ip адрес или имя хоста '''
-        check = re.compile(ip_address_re).match(request)
-        ix = 0 if check else 1
-
-        record = [rec for rec in get_records() if request == rec[ix]][0]
-        if len(record):
-            print record[not ix]
+        answer = resolv_request(request)
+        if answer is not None:
+            print answer
 
     cli = SimpleCLI()
 
@@ -146,9 +248,13 @@ def main():
 
     cli.reg_cmd((re.compile(r'add\s+(%s)\s+(\S+)' % ip_address_re),),
                 'create record in file',
-                add_resolv_record,
+                add,
                 'add <ip_addr> <name>')
 
+    import_re = (re.compile(r'import\s+(\S+)'), )
+    cli.reg_cmd(import_re, 'add records from file or stdin (-)', import_file,
+                'import <file>|-')
+
     print r'remove\s+(%s)' % ip_address_re
 
     remove_re = (re.compile(r'remove\s+(%s)' % ip_address_re), )
@@ -162,9 +268,27 @@ def main():
     head_re = (re.compile(r'head\s+(\d+)'), re.compile(r'head'))
     cli.reg_cmd(head_re, 'show first n records', head, 'head [n]')
 
+    range_re = (re.compile(r'range\s+(\d+)\s+(\d+)'),
+                re.compile(r'range\s+(\d+)'))
+    cli.reg_cmd(range_re, 'show records of file lines from start', show_range,
+                'range <start> [count]')
+
     find_re = (re.compile(r'find\s+(\S+)'), )
     cli.reg_cmd(find_re, 'find hostnames containing substring', find, 'find <substring>')
 
+    net_re = (re.compile(r'net\s+(%s/\d+)' % ip_address_re), )
+    cli.reg_cmd(net_re, 'show records of network', show_network,
+                'net <ip_addr>/<len>')
+
+    between_re = (re.compile(r'between\s+(%s)\s+(%s)' % (
+        ip_address_re, ip_address_re)), )
+    cli.reg_cmd(between_re, 'show records of address range', show_between,
+                'between <ip_addr> <ip_addr>')
+
+    zone_re = (re.compile(r'zone\s+(\S+)'), )
+    cli.reg_cmd(zone_re, 'find hostnames by zone or label prefix', zone,
+                'zone *.<zone>|<prefix>*.<zone>')
+
     resolv_re = (re.compile(r'resolv\s+(\S+)'), )
     cli.reg_cmd(resolv_re, 'resolv hostname or ip address', resolv, 'resolv <ip_addr>|<host_name>')
 
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+Триграммный индекс для поиска подстроки в именах хостов.
+
+Для каждой триграммы (трех подряд идущих символов) хранится множество
+ключей, в тексте которых она встречается. Кандидаты на совпадение с
+фразой - пересечение множеств ее триграмм, проверяется только оно,
+а не все записи. Фразы короче трех символов проверяются перебором.
+'''
+
+GRAM = 3
+
+
+def trigrams(text):
+    ''' множество триграмм строки, пустое для строк короче GRAM '''
+    return set(text[i:i + GRAM] for i in xrange(len(text) - GRAM + 1))
+
+
+class TrigramIndex(object):
+    ''' Ключи (ip) с текстами (именами) и поиск по подстроке текста '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._texts = {}
+        # триграмма -> множество ключей
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, key, text):
+        ''' Добавляет текст ключа, прежний текст ключа заменяется '''
+        if key in self._texts:
+            self.remove(key)
+        self._texts[key] = text
+        for gram in trigrams(text):
+            keys = self._postings.get(gram)
+            if keys is None:
+                keys = self._postings[gram] = set()
+            keys.add(key)
+
+    def remove(self, key):
+        ''' Удаляет ключ, если он есть '''
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def candidates(self, phrase):
+        '''
+        Ключи, тексты которых могут содержать phrase:
+        содержат все ее триграммы
+        '''
+        grams = trigrams(phrase)
+        if not grams:
+            # копия: индекс может меняться, пока идет перебор
+            for key in list(self._texts):
+                yield key
+            return
+        postings = []
+        for gram in grams:
+            keys = self._postings.get(gram)
+            if keys is None:
+                return
+            postings.append(keys)
+        postings.sort(key=len)
+        rarest, rest = postings[0], postings[1:]
+        for key in list(rarest):
+            if all(key in keys for keys in rest):
+                yield key
+
+    def search(self, phrase):
+        ''' (ключ, текст) с подстрокой phrase по мере нахождения '''
+        texts = self._texts
+        for key in self.candidates(phrase):
+            text = texts.get(key)
+            if text is not None and phrase in text:
+                yield key, text
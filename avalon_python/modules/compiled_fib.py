@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Array form of routing table for batch lookups.
+Routes are grouped by prefix length into sorted numpy arrays, so a whole
+batch of destinations is matched with one searchsorted per prefix length.
+
+Compiled table may be saved to file and attached by other processes
+with mmap: arrays are used in place, without per-process copy.
+File layout (little endian, every block is 4-byte aligned):
+    header: magic, version, next hop count, interface count, level count
+    next hops: uint32[next hop count]
+    next hop interfaces: int32[next hop count + 1]
+    multipath groups: uint32 count, int32[count * ecmp.BUCKETS]
+    interface names: uint32 length, names joined by newline, padding
+    levels: uint32 mask, uint32 count, uint32[count], int32[count]
+Level entry is next hop index, or next hop count + multipath group index
+for equal-cost routes, see index_routes.
+'''
+import mmap
+import os
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from avalon_python.modules.prefix_trie import (
+    mask_to_prefix_len, prefix_len_to_mask
+)
+from avalon_python.modules.ipv4_parser import parse_many
+from avalon_python.modules.ipv4_address import IPv4Address
+from avalon_python.modules.ecmp import (
+    BUCKETS, BUCKET_MASK, buckets, flow_hash_many
+)
+
+FILE_MAGIC = 'AFIB'
+FILE_VERSION = 2
+FILE_HEADER = struct.Struct('<4sIIII')
+
+
+def addresses_to_array(addresses):
+    '''
+        convert uint32 array, buffer with dotted address per line
+        or sequence of dotted strings or integers to uint32 array
+    '''
+    if isinstance(addresses, numpy.ndarray):
+        return addresses.astype(numpy.uint32, copy=False)
+    if isinstance(addresses, (str, bytearray, buffer, mmap.mmap)):
+        return parse_many(addresses, strict=True)[0]
+    addresses = list(addresses)
+    if addresses and isinstance(addresses[0], basestring):
+        return parse_many(addresses, strict=True)[0]
+    return numpy.array(addresses, dtype=numpy.uint32)
+
+
+def index_routes(routes):
+    '''
+        deduplicate routes given as (prefix, prefix_len, next hop) integers,
+        routes with equal prefix are equal-cost paths, returns list
+        of next hops, list of multipath groups (next hop indices
+        of ecmp.buckets) and dict (prefix, prefix_len) -> entry:
+        next hop index for single path or next hop count + group index
+    '''
+    next_hops = []
+    next_hop_index = {}
+    paths = {}
+    for prefix, prefix_len, next_hop_decimal in routes:
+        key = (prefix & prefix_len_to_mask(prefix_len), prefix_len)
+        if next_hop_decimal not in next_hop_index:
+            next_hop_index[next_hop_decimal] = len(next_hops)
+            next_hops.append(IPv4Address.intern(next_hop_decimal))
+        key_paths = paths.setdefault(key, [])
+        if next_hop_index[next_hop_decimal] not in key_paths:
+            key_paths.append(next_hop_index[next_hop_decimal])
+
+    groups = []
+    group_index = {}
+    prefixes = {}
+    for key, key_paths in paths.iteritems():
+        if len(key_paths) == 1:
+            prefixes[key] = key_paths[0]
+            continue
+        slots = buckets(key_paths)
+        if slots not in group_index:
+            group_index[slots] = len(next_hops) + len(groups)
+            groups.append(slots)
+        prefixes[key] = group_index[slots]
+    return next_hops, groups, prefixes
+
+
+def resolve_groups(entries, addrs, next_hop_count, groups):
+    '''
+        replace multipath group entries by next hop index chosen
+        by destination hash in place, groups is int32 array (count, BUCKETS)
+    '''
+    multipath = entries >= next_hop_count
+    if multipath.any():
+        slots = flow_hash_many(addrs[multipath]) & numpy.uint32(BUCKET_MASK)
+        entries[multipath] = groups[entries[multipath] - next_hop_count, slots]
+    return entries
+
+
+def groups_array(groups):
+    ''' int32 array (count, BUCKETS) of multipath groups '''
+    return numpy.array(groups, dtype=numpy.int32).reshape(-1, BUCKETS)
+
+
+def next_hop_ifaces(next_hops, interfaces, iface_of):
+    '''
+        interface index for every next hop (-1 if unresolved),
+        trailing -1 maps "no route" next hop index -1 to "no interface"
+    '''
+    iface_index = dict((iface, index) for index, iface in enumerate(interfaces))
+    return [iface_index.get(iface_of(addr), -1) for addr in next_hops] + [-1]
+
+
+def pack_names(names):
+    ''' newline joined names with uint32 length, padded to 4 bytes '''
+    packed = '\n'.join(names)
+    return struct.pack('<I', len(packed)) + packed + '\0' * (-len(packed) % 4)
+
+
+def unpack_names(buf, offset, count):
+    ''' reverse of pack_names, returns names and offset of next block '''
+    length, = struct.unpack_from('<I', buf, offset)
+    offset += 4
+    names = buf[offset:offset + length].split('\n') if count else []
+    return names, offset + length + (-length % 4)
+
+
+class CompiledFib(object):
+    '''
+        Immutable snapshot of routing table given as (prefix, prefix_len,
+        next hop) integers, next_hops and interfaces are tables for indices
+        returned by lookup_many, iface_of resolves next hop to interface
+    '''
+    def __init__(self, routes, interfaces, iface_of):
+        if numpy is None:
+            raise ImportError('numpy is required for batch lookups')
+
+        self.next_hops, groups, prefixes = index_routes(routes)
+        self.groups = groups_array(groups)
+
+        by_len = {}
+        for (prefix, prefix_len), index in prefixes.iteritems():
+            by_len.setdefault(prefix_len, []).append((prefix, index))
+
+        # longest prefixes first
+        self.levels = []
+        for prefix_len in sorted(by_len, reverse=True):
+            pairs = sorted(by_len[prefix_len])
+            self.levels.append((
+                numpy.uint32(prefix_len_to_mask(prefix_len)),
+                numpy.array([pair[0] for pair in pairs], dtype=numpy.uint32),
+                numpy.array([pair[1] for pair in pairs], dtype=numpy.int32),
+            ))
+
+        self.interfaces = list(interfaces)
+        self.next_hop_iface = numpy.array(
+            next_hop_ifaces(self.next_hops, self.interfaces, iface_of),
+            dtype=numpy.int32
+        )
+
+    def lookup_many(self, addresses):
+        '''
+            longest prefix match for batch of addresses,
+            returns arrays of next hop and interface indices (-1 if no route)
+        '''
+        next_hop_idx, _ = self.match_many(addresses)
+        return next_hop_idx, self.next_hop_iface[next_hop_idx]
+
+    def match_many(self, addresses):
+        '''
+            same as lookup_many, but returns arrays of next hop indices
+            and lengths of matched prefixes (-1 if no route)
+        '''
+        addrs = addresses_to_array(addresses)
+        entries = numpy.full(addrs.shape, -1, dtype=numpy.int32)
+        prefix_len = numpy.full(addrs.shape, -1, dtype=numpy.int8)
+
+        pending = numpy.arange(addrs.size)
+        for mask, prefixes, indices in self.levels:
+            if not pending.size:
+                break
+            masked = addrs[pending] & mask
+            pos = numpy.searchsorted(prefixes, masked)
+            pos[pos == prefixes.size] = 0
+            hit = prefixes[pos] == masked
+            entries[pending[hit]] = indices[pos[hit]]
+            prefix_len[pending[hit]] = mask_to_prefix_len(int(mask))
+            pending = pending[~hit]
+
+        next_hop_idx = resolve_groups(
+            entries, addrs, len(self.next_hops), self.groups
+        )
+        return next_hop_idx, prefix_len
+
+    def save(self, path):
+        ''' write table to path atomically, readers see old or new file '''
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(FILE_HEADER.pack(
+                FILE_MAGIC,
+                FILE_VERSION,
+                len(self.next_hops),
+                len(self.interfaces),
+                len(self.levels)
+            ))
+            addrs = [addr.decimal() for addr in self.next_hops]
+            f.write(numpy.array(addrs, dtype='<u4').tostring())
+            f.write(self.next_hop_iface.astype('<i4').tostring())
+            f.write(struct.pack('<I', len(self.groups)))
+            f.write(self.groups.astype('<i4').tostring())
+            f.write(pack_names(self.interfaces))
+            for mask, prefixes, indices in self.levels:
+                f.write(struct.pack('<II', mask, prefixes.size))
+                f.write(prefixes.astype('<u4').tostring())
+                f.write(indices.astype('<i4').tostring())
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def attach(cls, path):
+        ''' map saved table read-only, arrays are views of the mapping '''
+        if numpy is None:
+            raise ImportError('numpy is required for batch lookups')
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, next_hop_count, iface_count, level_count = \
+            FILE_HEADER.unpack_from(buf, 0)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            buf.close()
+            raise ValueError('%s is not compiled FIB of version %s' % (
+                path, FILE_VERSION
+            ))
+
+        offset = FILE_HEADER.size
+
+        def view(dtype, count):
+            arr = numpy.frombuffer(buf, dtype=dtype, count=count, offset=offset)
+            return arr, offset + 4 * count
+
+        fib = cls.__new__(cls)
+        fib._buf = buf
+
+        addrs, offset = view('<u4', next_hop_count)
+        fib.next_hops = [IPv4Address.intern(int(addr)) for addr in addrs]
+        fib.next_hop_iface, offset = view('<i4', next_hop_count + 1)
+        group_count, = struct.unpack_from('<I', buf, offset)
+        offset += 4
+        groups, offset = view('<i4', group_count * BUCKETS)
+        fib.groups = groups.reshape(-1, BUCKETS)
+
+        fib.interfaces, offset = unpack_names(buf, offset, iface_count)
+
+        fib.levels = []
+        for _ in xrange(level_count):
+            mask, count = struct.unpack_from('<II', buf, offset)
+            offset += 8
+            prefixes, offset = view('<u4', count)
+            indices, offset = view('<i4', count)
+            fib.levels.append((numpy.uint32(mask), prefixes, indices))
+        return fib
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+DIR-24-8 form of routing table: lookup costs one or two array reads.
+tbl24 is indexed by 24 leading bits of address, its entry is either
+route entry + 1 (0 - no route) or, with TBL8_FLAG, number of
+256-entry group in tbl8 indexed by last octet. Route entry is next hop
+index or multipath group, see compiled_fib.index_routes.
+
+Snapshot file (little endian, every block is 4-byte aligned):
+    header: magic, version, next hop count, interface count, tbl8 groups
+    next hops: uint32[next hop count]
+    next hop interfaces: int32[next hop count + 1]
+    multipath groups: uint32 count, int32[count * ecmp.BUCKETS]
+    interface names: see compiled_fib.pack_names
+    tbl24: uint32[1 << 24]
+    tbl8: uint32[256 * tbl8 groups]
+Loaded snapshot is mmap-ed, tables are read in place.
+'''
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from avalon_python.modules.compiled_fib import (
+    addresses_to_array, groups_array, index_routes, next_hop_ifaces,
+    pack_names, resolve_groups, unpack_names
+)
+from avalon_python.modules.ecmp import BUCKETS, select
+from avalon_python.modules.ipv4_address import IPv4Address
+
+FILE_MAGIC = 'D248'
+FILE_VERSION = 2
+FILE_HEADER = struct.Struct('<4sIIII')
+
+TBL24_SIZE = 1 << 24
+TBL8_GROUP = 256
+TBL8_FLAG = 0x80000000
+ENTRY_MASK = 0x7FFFFFFF
+
+
+def little_endian(arr):
+    ''' array in file byte order '''
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr
+
+
+def as_numpy(arr):
+    ''' uint32 numpy view of array.array or of mapped table '''
+    if isinstance(arr, numpy.ndarray):
+        return arr
+    return numpy.frombuffer(arr, dtype=numpy.uint32)
+
+
+class MappedArray(object):
+    ''' read-only uint32 array on top of buffer, used without numpy '''
+    def __init__(self, buf, offset, count):
+        self.buf = buf
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return struct.unpack_from('<I', self.buf, self.offset + 4 * index)[0]
+
+
+class Dir24Fib(object):
+    '''
+        Immutable DIR-24-8 table of (prefix, prefix_len, next hop) integers,
+        next_hops and interfaces are tables for indices returned by lookup
+    '''
+    def __init__(self, routes, interfaces, iface_of):
+        assert array('I').itemsize == 4
+        self.next_hops, self.groups, prefixes = index_routes(routes)
+        self.interfaces = list(interfaces)
+        self.next_hop_iface = next_hop_ifaces(
+            self.next_hops, self.interfaces, iface_of
+        )
+
+        self.tbl24 = array('I', [0]) * TBL24_SIZE
+        self.tbl8 = array('I')
+        # shorter prefixes first, longer ones overwrite them
+        for (prefix, prefix_len), index in sorted(
+                prefixes.iteritems(), key=lambda item: item[0][1]):
+            self._add(prefix, prefix_len, index + 1)
+
+    @classmethod
+    def from_router(cls, router):
+        ''' compile current routing table of router '''
+        return cls(
+            router.iter_prefixes(),
+            sorted(router.iface_table),
+            lambda addr: router.next_hops[addr.decimal()].iface
+        )
+
+    def _add(self, prefix, prefix_len, entry):
+        if prefix_len <= 24:
+            start = prefix >> 8
+            count = 1 << (24 - prefix_len)
+            self.tbl24[start:start + count] = array('I', [entry]) * count
+            return
+
+        index = prefix >> 8
+        group_entry = self.tbl24[index]
+        if not group_entry & TBL8_FLAG:
+            group = len(self.tbl8) // TBL8_GROUP
+            self.tbl8.extend(array('I', [group_entry]) * TBL8_GROUP)
+            group_entry = self.tbl24[index] = TBL8_FLAG | group
+
+        start = (group_entry & ENTRY_MASK) * TBL8_GROUP + (prefix & 0xFF)
+        count = 1 << (32 - prefix_len)
+        self.tbl8[start:start + count] = array('I', [entry]) * count
+
+    def lookup(self, addr_decimal):
+        ''' index of next hop for address, -1 if there is no route '''
+        entry = self.tbl24[addr_decimal >> 8]
+        if entry & TBL8_FLAG:
+            entry = self.tbl8[
+                (entry & ENTRY_MASK) * TBL8_GROUP + (addr_decimal & 0xFF)
+            ]
+        index = int(entry) - 1
+        if index >= len(self.next_hops):
+            index = select(
+                self.groups[index - len(self.next_hops)], addr_decimal
+            )
+        return index
+
+    def route(self, addr_decimal):
+        ''' same result as Router.route: interface and next hop '''
+        index = self.lookup(addr_decimal)
+        if index < 0:
+            raise ValueError('no route to host %s' % addr_decimal)
+        iface_index = self.next_hop_iface[index]
+        iface = self.interfaces[iface_index] if iface_index >= 0 else None
+        return iface, self.next_hops[index]
+
+    def lookup_many(self, addrs):
+        '''
+            batch lookup of addresses accepted by Router.route_many,
+            needs numpy, returns arrays of next hop and interface indices
+        '''
+        addrs = addresses_to_array(addrs)
+        entries = as_numpy(self.tbl24)[addrs >> 8]
+        in_tbl8 = (entries & TBL8_FLAG) != 0
+        if in_tbl8.any():
+            entries[in_tbl8] = as_numpy(self.tbl8)[
+                (entries[in_tbl8] & ENTRY_MASK) * TBL8_GROUP +
+                (addrs[in_tbl8] & 0xFF)
+            ]
+        next_hop_idx = resolve_groups(
+            entries.astype(numpy.int32) - 1, addrs,
+            len(self.next_hops), groups_array(self.groups)
+        )
+        next_hop_iface = numpy.asarray(self.next_hop_iface, dtype=numpy.int32)
+        return next_hop_idx, next_hop_iface[next_hop_idx]
+
+    def save(self, path):
+        ''' write snapshot to path atomically '''
+        tmp_path = '%s.%s.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(FILE_HEADER.pack(
+                FILE_MAGIC,
+                FILE_VERSION,
+                len(self.next_hops),
+                len(self.interfaces),
+                len(self.tbl8) // TBL8_GROUP
+            ))
+            addrs = [addr.decimal() for addr in self.next_hops]
+            f.write(struct.pack('<%dI' % len(addrs), *addrs))
+            f.write(struct.pack(
+                '<%di' % len(self.next_hop_iface), *self.next_hop_iface
+            ))
+            f.write(struct.pack('<I', len(self.groups)))
+            for group in self.groups:
+                f.write(struct.pack('<%di' % BUCKETS, *group))
+            f.write(pack_names(self.interfaces))
+            little_endian(self.tbl24).tofile(f)
+            little_endian(self.tbl8).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+            map snapshot read-only, tables are used in place:
+            numpy views if numpy is installed, MappedArray otherwise
+        '''
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, next_hop_count, iface_count, tbl8_groups = \
+            FILE_HEADER.unpack_from(buf, 0)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            buf.close()
+            raise ValueError('%s is not DIR-24-8 snapshot of version %s' % (
+                path, FILE_VERSION
+            ))
+
+        fib = cls.__new__(cls)
+        fib._buf = buf
+        offset = FILE_HEADER.size
+
+        addrs = struct.unpack_from('<%dI' % next_hop_count, buf, offset)
+        fib.next_hops = [IPv4Address.intern(addr) for addr in addrs]
+        offset += 4 * next_hop_count
+        fib.next_hop_iface = list(struct.unpack_from(
+            '<%di' % (next_hop_count + 1), buf, offset
+        ))
+        offset += 4 * (next_hop_count + 1)
+        group_count, = struct.unpack_from('<I', buf, offset)
+        offset += 4
+        fib.groups = [
+            struct.unpack_from('<%di' % BUCKETS, buf, offset + 4 * BUCKETS * i)
+            for i in xrange(group_count)
+        ]
+        offset += 4 * BUCKETS * group_count
+        fib.interfaces, offset = unpack_names(buf, offset, iface_count)
+
+        tbl8_size = tbl8_groups * TBL8_GROUP
+        if numpy is not None:
+            fib.tbl24 = numpy.frombuffer(
+                buf, dtype='<u4', count=TBL24_SIZE, offset=offset
+            )
+            fib.tbl8 = numpy.frombuffer(
+                buf, dtype='<u4', count=tbl8_size,
+                offset=offset + 4 * TBL24_SIZE
+            )
+        else:
+            fib.tbl24 = MappedArray(buf, offset, TBL24_SIZE)
+            fib.tbl8 = MappedArray(buf, offset + 4 * TBL24_SIZE, tbl8_size)
+        return fib
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Equal-cost multipath: flows to one prefix are spread over its next hops.
+Selection is precomputed: multipath route keeps BUCKETS slots filled with
+its next hops in turn and lookup takes slot of flow hash, so it costs
+the same for any number of next hops. Hash is deterministic, packets of
+one flow always leave through the same next hop.
+'''
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BUCKETS = 64
+BUCKET_MASK = BUCKETS - 1
+HASH_MULT = 0x9E3779B1
+HASH_MAX = 0xFFFFFFFF
+
+
+def buckets(paths):
+    ''' slots of route with given next hops, single path needs one slot '''
+    if len(paths) == 1:
+        return tuple(paths)
+    return tuple(paths[slot % len(paths)] for slot in xrange(BUCKETS))
+
+
+def flow_hash(dst, src=0, proto=0, src_port=0, dst_port=0):
+    ''' 32-bit hash of flow 5-tuple, of destination only by default '''
+    h = ((dst ^ src) * HASH_MULT) & HASH_MAX
+    h = ((h ^ (src_port << 16) ^ dst_port) * HASH_MULT) & HASH_MAX
+    h = ((h ^ proto) * HASH_MULT) & HASH_MAX
+    return h ^ (h >> 16)
+
+
+def flow_hash_many(dst, src=0, proto=0, src_port=0, dst_port=0):
+    ''' flow_hash of arrays (or scalars) of flow fields, needs numpy '''
+    mult = numpy.uint32(HASH_MULT)
+    u32 = lambda value: numpy.asarray(value, dtype=numpy.uint32)
+    h = (u32(dst) ^ u32(src)) * mult
+    h = (h ^ (u32(src_port) << numpy.uint32(16)) ^ u32(dst_port)) * mult
+    h = (h ^ u32(proto)) * mult
+    return h ^ (h >> numpy.uint32(16))
+
+
+def select(slots, dst, src=0, proto=0, src_port=0, dst_port=0):
+    ''' next hop of slots for flow, hash is computed only for multipath '''
+    if len(slots) == 1:
+        return slots[0]
+    return slots[flow_hash(dst, src, proto, src_port, dst_port) & BUCKET_MASK]
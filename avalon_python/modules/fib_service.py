@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Route lookup service for multi-process workers.
+One process compiles routing table into file on shared memory (tmpfs),
+workers attach it read-only with CompiledFib.attach and do lookups
+in place. Clients which can not attach use batch queries over unix socket.
+
+Protocol, all integers are big endian:
+    request: 1 byte command, 'Q' - query, 'T' - tables
+    'Q': uint32 count, uint32[count] addresses;
+        response: int32[count] next hop indices, int32[count] interface
+        indices, -1 if there is no route
+    'T': response: uint32 length, json {"next_hops": [...], "interfaces": [...]}
+
+Usage:
+    python -m avalon_python.modules.fib_service --routes routes.txt \\
+        --fib /dev/shm/avalon.fib --socket /tmp/avalon-fib.sock
+'''
+import argparse
+import json
+import os
+import socket
+import struct
+import SocketServer
+
+from avalon_python.modules.compiled_fib import CompiledFib, numpy
+from avalon_python.modules.router import Router
+
+DEFAULT_FIB_PATH = '/dev/shm/avalon.fib'
+MAX_BATCH = 1 << 20
+
+
+def publish(router, path=DEFAULT_FIB_PATH):
+    ''' compile routing table of router and replace shared FIB file '''
+    router.compiled_fib().save(path)
+    return path
+
+
+def recv_exactly(sock, size):
+    ''' read size bytes or raise EOFError '''
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 16))
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+class FibRequestHandler(SocketServer.BaseRequestHandler):
+    ''' serves requests of one connection until client closes it '''
+    def handle(self):
+        while True:
+            try:
+                command = recv_exactly(self.request, 1)
+                if command == 'Q':
+                    self.handle_query()
+                elif command == 'T':
+                    self.handle_tables()
+                else:
+                    return
+            except EOFError:
+                return
+
+    def handle_query(self):
+        count, = struct.unpack('>I', recv_exactly(self.request, 4))
+        if count > MAX_BATCH:
+            raise EOFError('batch is too large')
+        addrs = numpy.frombuffer(
+            recv_exactly(self.request, 4 * count), dtype='>u4'
+        )
+        next_hop_idx, iface_idx = self.server.fib.lookup_many(addrs)
+        self.request.sendall(
+            next_hop_idx.astype('>i4').tostring() +
+            iface_idx.astype('>i4').tostring()
+        )
+
+    def handle_tables(self):
+        fib = self.server.fib
+        tables = json.dumps({
+            'next_hops': [addr.dotted() for addr in fib.next_hops],
+            'interfaces': fib.interfaces,
+        })
+        self.request.sendall(struct.pack('>I', len(tables)) + tables)
+
+
+class FibServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    ''' unix socket front end for compiled FIB '''
+    daemon_threads = True
+
+    def __init__(self, socket_path, fib):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        SocketServer.UnixStreamServer.__init__(
+            self, socket_path, FibRequestHandler
+        )
+        self.fib = fib
+
+
+class FibClient(object):
+    ''' batch queries to FibServer, works without numpy '''
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+
+    def close(self):
+        self.sock.close()
+
+    def route_many(self, addresses):
+        '''
+            same as Router.route_many for integer or dotted addresses,
+            returns lists of indices into tables()
+        '''
+        packed = ''.join(
+            socket.inet_aton(addr) if isinstance(addr, basestring)
+            else struct.pack('>I', addr)
+            for addr in addresses
+        )
+        count = len(packed) // 4
+        self.sock.sendall('Q' + struct.pack('>I', count) + packed)
+        values = struct.unpack(
+            '>%di' % (2 * count), recv_exactly(self.sock, 8 * count)
+        )
+        return list(values[:count]), list(values[count:])
+
+    def tables(self):
+        ''' next hops in dotted notation and interface names '''
+        self.sock.sendall('T')
+        length, = struct.unpack('>I', recv_exactly(self.sock, 4))
+        tables = json.loads(recv_exactly(self.sock, length))
+        return tables['next_hops'], tables['interfaces']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Route lookup service')
+    parser.add_argument('--routes', required=True,
+                        help='route dump, see Router.load_routes')
+    parser.add_argument('--interfaces', default=None,
+                        help='file with "name address mask" lines')
+    parser.add_argument('--fib', default=DEFAULT_FIB_PATH)
+    parser.add_argument('--socket', default=None)
+    args = parser.parse_args(argv)
+
+    router = Router()
+    if args.interfaces:
+        router.load_interfaces(args.interfaces)
+    router.load_routes(args.routes)
+    publish(router, args.fib)
+    print 'FIB published to %s' % args.fib
+
+    if args.socket:
+        server = FibServer(args.socket, CompiledFib.attach(args.fib))
+        print 'serving on %s' % args.socket
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Bounded destination cache in front of router FIB.
+Replacement uses CLOCK algorithm: a hit only sets reference bit,
+so cache hits cost one dict lookup and no reordering.
+'''
+from avalon_python.modules.prefix_trie import prefix_len_to_mask
+
+
+class FlowCache(object):
+    ''' destination -> lookup result cache with hit/miss/eviction counters '''
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError('cache capacity must be positive')
+        self.capacity = capacity
+        self._slots = {}
+        self._keys = []
+        self._values = []
+        self._referenced = bytearray()
+        self._free = []
+        self._hand = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def get(self, key):
+        ''' return cached value or None '''
+        slot = self._slots.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._referenced[slot] = 1
+        return self._values[slot]
+
+    def put(self, key, value):
+        ''' store value, evicts one entry if cache is full '''
+        slot = self._slots.get(key)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            elif len(self._keys) < self.capacity:
+                slot = len(self._keys)
+                self._keys.append(None)
+                self._values.append(None)
+                self._referenced.append(0)
+            else:
+                slot = self._evict()
+            self._keys[slot] = key
+            self._slots[key] = slot
+        self._values[slot] = value
+        self._referenced[slot] = 0
+
+    def _evict(self):
+        ''' sweep clock hand to first not referenced slot and free it '''
+        referenced = self._referenced
+        hand = self._hand
+        while referenced[hand]:
+            referenced[hand] = 0
+            hand = (hand + 1) % self.capacity
+        self._hand = (hand + 1) % self.capacity
+
+        del self._slots[self._keys[hand]]
+        self.evictions += 1
+        return hand
+
+    def _remove(self, slot):
+        del self._slots[self._keys[slot]]
+        self._keys[slot] = None
+        self._values[slot] = None
+        self._referenced[slot] = 0
+        self._free.append(slot)
+        self.invalidations += 1
+
+    def invalidate_if(self, predicate):
+        ''' drop every entry for which predicate(key, value) is true '''
+        for key, slot in self._slots.items():
+            if predicate(key, self._values[slot]):
+                self._remove(slot)
+
+    def invalidate_prefix(self, prefix, prefix_len):
+        ''' drop entries for destinations covered by prefix '''
+        self.invalidate_prefixes([(prefix, prefix_len)])
+
+    def invalidate_prefixes(self, prefixes):
+        '''
+            drop entries for destinations covered by any of
+            (prefix, prefix_len), cache is scanned once
+        '''
+        by_len = {}
+        for prefix, prefix_len in prefixes:
+            by_len.setdefault(prefix_len, set()).add(prefix)
+        if not by_len or not self._slots:
+            return
+        tests = [
+            (prefix_len_to_mask(prefix_len), by_len[prefix_len])
+            for prefix_len in sorted(by_len)
+        ]
+        self.invalidate_if(lambda key, value: any(
+            key & mask in covering for mask, covering in tests
+        ))
+
+    def clear(self):
+        ''' drop all entries, counters are kept '''
+        self.invalidate_if(lambda key, value: True)
+
+    def stats(self):
+        ''' snapshot of cache counters '''
+        return {
+            'capacity': self.capacity,
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
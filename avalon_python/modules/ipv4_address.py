@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+IPv4 address with netmask, stored as integers.
+Kept apart from router, so FIB modules imported by router can use it.
+'''
+import struct
+import socket
+
+from avalon_python.modules.ipv4_parser import parse_many
+
+
+class IPv4Address(object):
+    '''
+        This class designated to easy manipulate ipv4 addresses and masks
+    '''
+    default_subnet_masks = (
+        # network A class
+        (
+            0b10000000000000000000000000000000,  # check_value
+            0b00000000000000000000000000000000,  # leading_bit
+            0b11111111000000000000000000000000,  # mask
+            '255.0.0.0'  # mask_dotted
+        ),
+        # network B class
+        (
+            0b11000000000000000000000000000000,
+            0b10000000000000000000000000000000,
+            0b11111111111111110000000000000000,
+            '255.255.0.0'
+        ),
+        # network C class
+        (
+            0b11000000000000000000000000000000,
+            0b11000000000000000000000000000000,
+            0b11111111111111111111111100000000,
+            '255.255.255.0'
+        ),
+    )
+
+    __slots__ = ('addr_decimal', 'mask_decimal')
+
+    # flyweight pool for repeated addresses such as netmasks and next hops
+    _pool = {}
+
+    def __init__(self, raw_addr, raw_mask=None):
+        self.addr_decimal = IPv4Address.parse_to_decimal(raw_addr)
+
+        if raw_mask:
+            self.mask_decimal = IPv4Address.parse_to_decimal(raw_mask)
+        else:
+            self.mask_decimal, _ = IPv4Address.determine_mask_by_ip(
+                self.addr_decimal
+            )
+
+    @classmethod
+    def intern(cls, raw_addr, raw_mask=None):
+        '''
+            return shared instance for address and mask,
+            use it for low-cardinality values only: the pool is never purged
+        '''
+        addr_decimal = cls.parse_to_decimal(raw_addr)
+        if raw_mask:
+            mask_decimal = cls.parse_to_decimal(raw_mask)
+        else:
+            mask_decimal, _ = cls.determine_mask_by_ip(addr_decimal)
+
+        key = (addr_decimal, mask_decimal)
+        addr = cls._pool.get(key)
+        if addr is None:
+            addr = cls._pool[key] = cls.__new__(cls)
+            addr.addr_decimal, addr.mask_decimal = key
+        return addr
+
+    @staticmethod
+    def determine_mask_by_ip(raw_addr):
+        ''' determine class of network '''
+        for default_subnet in IPv4Address.default_subnet_masks:
+            (
+                check_value,
+                leading_bit,
+                mask_decimal,
+                mask_dotted
+            ) = default_subnet
+            # determine class of ip network
+            if raw_addr & check_value == leading_bit:
+                return (mask_decimal, mask_dotted)
+        return (None, None)
+
+    @staticmethod
+    def parse(raw_addr):
+        ''' try to parse raw_addr format '''
+        if type(raw_addr) == str:
+            return IPv4Address.parse_dotted(raw_addr)
+        elif type(raw_addr) == int:
+            return IPv4Address.parse_decimal(raw_addr)
+        elif type(raw_addr) == IPv4Address:
+            return raw_addr.decimal(), raw_addr.dotted()
+        else:
+            raise ValueError('Can not parse ip address')
+
+    @staticmethod
+    def parse_to_decimal(raw_addr):
+        ''' parse raw_addr without building its dotted notation '''
+        raw_type = type(raw_addr)
+        if raw_type == str:
+            return IPv4Address.parse_dotted(raw_addr)[0]
+        elif raw_type == int or raw_type == long:
+            if not 0 <= raw_addr <= 0xFFFFFFFF:
+                raise Exception('Illegal IP address value passed to method')
+            return raw_addr
+        elif raw_type == IPv4Address:
+            return raw_addr.addr_decimal
+        else:
+            raise ValueError('Can not parse ip address')
+
+    @staticmethod
+    def parse_dotted(addr_dotted):
+        ''' try to parse ip address in dotted notation '''
+        try:
+            addr_decimal, = struct.unpack(
+                '>I',
+                socket.inet_aton(addr_dotted)
+            )
+            return (addr_decimal, addr_dotted)
+        except (socket.error, TypeError):
+            raise Exception('illegal IP address string passed as argument')
+
+    @staticmethod
+    def parse_many(raw_addrs, strict=False):
+        '''
+            bulk parse of buffer with address per line or sequence
+            of dotted strings, returns uint32 array and bad row indices
+        '''
+        return parse_many(raw_addrs, strict)
+
+    @classmethod
+    def many(cls, raw_addrs):
+        ''' list of addresses from bulk parser, bad row raises ValueError '''
+        addrs, _ = parse_many(raw_addrs, strict=True)
+        return [cls(int(addr)) for addr in addrs]
+
+    @staticmethod
+    def parse_decimal(addr_decimal):
+        ''' try to parse ip address in decimal '''
+        try:
+            addr_dotted = socket.inet_ntoa(struct.pack('>I', addr_decimal))
+            return (addr_decimal, addr_dotted)
+        except:
+            raise Exception('Illegal IP address value passed to method')
+
+    @property
+    def addr_dotted(self):
+        return socket.inet_ntoa(struct.pack('>I', self.addr_decimal))
+
+    @property
+    def mask_dotted(self):
+        if self.mask_decimal is not None:
+            return socket.inet_ntoa(struct.pack('>I', self.mask_decimal))
+
+    def dotted(self):
+        ''' return ipv4 address in dotted notation '''
+        return self.addr_dotted
+
+    def binary(self):
+        ''' return binary repesentation of ipv4 address '''
+        bits = format(self.addr_decimal, '032b')
+        return '.'.join(bits[shift:shift + 8] for shift in (0, 8, 16, 24))
+
+    def decimal(self):
+        ''' return ipv4 as decimal value '''
+        return self.addr_decimal
+
+    @staticmethod
+    def parse_netmask(mask):
+        ''' try parse netmask '''
+        return IPv4Address.parse(mask)
+
+    def netmask_dotted(self):
+        ''' return netmask in dotted represenation '''
+        return self.mask_dotted
+
+    def netmask_decimal(self):
+        ''' return netmask as decimal value '''
+        return self.mask_decimal
+
+    def netmask(self):
+        ''' return netmask in two represenation decimal and dotted '''
+        return self.netmask_decimal(), self.netmask_dotted()
+
+    def subnet(self):
+        ''' calculate subnet from ipv4 address and mask '''
+        if self.netmask_decimal():
+            return self.__class__(
+                self.netmask_decimal() & self.decimal(),
+                self.netmask_decimal()
+            )
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.decimal() == other.decimal()
+        else:
+            raise NotImplementedError
+
+    def __hash__(self):
+        return hash(self.addr_decimal)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __and__(self, other):
+        if isinstance(other, self.__class__):
+            return self.__class__(self.decimal() & other.decimal())
+        else:
+            return NotImplemented
+
+    def __str__(self):
+        return self.dotted()
+
+    def __repr__(self):
+        dotted = ', '.join(
+            filter(bool, [self.dotted(), self.netmask_dotted()])
+        )
+        return "IPv4Address(%s)" % dotted
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Bulk parser of dotted ipv4 addresses, one address per row.
+With numpy whole buffer is parsed by array operations: every dot or
+newline ends an octet, octets are built from up to three digits before
+separators and every row is validated at once.
+Without numpy rows are parsed one by one into array('I').
+Only strict dotted-quad decimal notation is accepted, carriage return
+of CRLF line endings is ignored.
+'''
+import mmap
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NL, CR, TAB, SPACE, DOT, ZERO, NINE = [ord(char) for char in '\n\r\t .09']
+
+
+def parse_many(data, strict=False):
+    '''
+        parse buffer (str, bytearray, mmap) with address per line
+        or sequence of dotted strings,
+        returns uint32 array (0 for bad rows) and indices of bad rows,
+        with strict=True the first bad row raises ValueError
+    '''
+    if not isinstance(data, (str, bytearray, buffer, mmap.mmap)):
+        # every row ends with newline, so empty last row is kept
+        data = ''.join(row + '\n' for row in data)
+
+    if numpy is None:
+        addrs, bad_rows = _parse_rows(data)
+    else:
+        addrs, bad_rows = _parse_vectorized(data)
+
+    if strict and len(bad_rows):
+        row = int(bad_rows[0])
+        raise ValueError('row %s: illegal IP address %r' % (
+            row, str(data[:]).split('\n')[row]
+        ))
+    return addrs, bad_rows
+
+
+def _parse_rows(data):
+    ''' row by row parser used without numpy '''
+    addrs = array('I')
+    bad_rows = []
+    rows = str(data[:]).split('\n')
+    if rows[-1] == '':
+        rows.pop()
+    for row, line in enumerate(rows):
+        octets = line.rstrip('\r').split('.')
+        if len(octets) == 4 and all(
+                octet.isdigit() and len(octet) <= 3 and int(octet) <= 255
+                for octet in octets):
+            a, b, c, d = [int(octet) for octet in octets]
+            addrs.append((a << 24) | (b << 16) | (c << 8) | d)
+        else:
+            addrs.append(0)
+            bad_rows.append(row)
+    return addrs, bad_rows
+
+
+def _parse_vectorized(data):
+    ''' parse all rows with numpy array operations '''
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    if not buf.size:
+        return numpy.zeros(0, numpy.uint32), numpy.zeros(0, numpy.intp)
+    if buf[-1] != NL:
+        buf = numpy.append(buf, numpy.uint8(NL))
+    is_cr = buf == CR
+    if is_cr.any():
+        is_cr[:-1] &= buf[1:] == NL
+        buf = buf[~is_cr]
+
+    # every dot or newline ends an octet
+    sep = numpy.flatnonzero((buf == DOT) | (buf == NL))
+    sep_is_nl = buf[sep] == NL
+    rows_count = int(numpy.count_nonzero(sep_is_nl))
+    sep_row = numpy.cumsum(sep_is_nl) - sep_is_nl
+    bad = numpy.bincount(sep_row, minlength=rows_count) != 4
+
+    # octet has 1 to 3 digits right before its separator
+    length = numpy.diff(numpy.concatenate(([-1], sep))) - 1
+    value = numpy.zeros(sep.size, dtype=numpy.int32)
+    good = (length >= 1) & (length <= 3)
+    for pos, weight in enumerate((1, 10, 100)):
+        # digits before start of buffer are masked out by used
+        index = numpy.maximum(sep - pos - 1, 0)
+        digit = buf[index].astype(numpy.int32) - ZERO
+        used = length > pos
+        good &= ~used | ((digit >= 0) & (digit <= 9))
+        value += numpy.where(used, digit * weight, 0)
+    good &= value <= 255
+    bad[sep_row[~good]] = True
+
+    # rows left have exactly four octets each
+    octets = value[~bad[sep_row]].astype(numpy.uint32).reshape(-1, 4)
+    addrs = numpy.zeros(rows_count, dtype=numpy.uint32)
+    addrs[~bad] = (
+        (octets[:, 0] << 24) | (octets[:, 1] << 16) |
+        (octets[:, 2] << 8) | octets[:, 3]
+    )
+    return addrs, numpy.flatnonzero(bad)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Counters of Router.route lookups: hits of every prefix, failed lookups
+and latency histogram with power of two buckets in nanoseconds.
+Counters are updated without locks, under concurrent readers they are
+approximate.
+'''
+import time
+
+from avalon_python.modules.ipv4_address import IPv4Address
+
+HISTOGRAM_SIZE = 40
+
+
+class LookupStats(object):
+    '''
+        Collected while enabled by Router.enable_stats(),
+        read with snapshot()
+    '''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.lookups = 0
+        self.failed = 0
+        # bucket i counts latencies below 2 ** i nanoseconds
+        self.latency = [0] * HISTOGRAM_SIZE
+        # (prefix, prefix_len) -> hits
+        self._hits = {}
+
+    def add_latency(self, elapsed):
+        self.lookups += 1
+        self.latency[
+            min(int(elapsed * 1e9).bit_length(), HISTOGRAM_SIZE - 1)
+        ] += 1
+
+    def add_hit(self, elapsed, key):
+        ''' successful lookup of prefix key (prefix, prefix_len) '''
+        self.add_latency(elapsed)
+        self._hits[key] = self._hits.get(key, 0) + 1
+
+    def add_failed(self, elapsed):
+        self.add_latency(elapsed)
+        self.failed += 1
+
+    def prefix_hits(self):
+        ''' dict (prefix, prefix_len) -> hits '''
+        return dict(self._hits)
+
+    def percentile(self, fraction):
+        ''' upper bound of latency bucket in nanoseconds, None if empty '''
+        rank = self.lookups * fraction
+        seen = 0
+        for index, count in enumerate(self.latency):
+            seen += count
+            if count and seen >= rank:
+                return 1 << index
+        return None
+
+    def snapshot(self, top=None):
+        '''
+            json-friendly copy of counters, top limits prefix hits
+            to the hottest ones
+        '''
+        hits = sorted(
+            self.prefix_hits().iteritems(),
+            key=lambda item: (-item[1], item[0])
+        )
+        if top is not None:
+            hits = hits[:top]
+        return {
+            'seconds': time.time() - self.started,
+            'lookups': self.lookups,
+            'failed': self.failed,
+            'prefix_hits': [
+                ['%s/%s' % (IPv4Address(prefix), prefix_len), count]
+                for (prefix, prefix_len), count in hits
+            ],
+            'latency_ns': [
+                [1 << index, count]
+                for index, count in enumerate(self.latency) if count
+            ],
+            'latency_p50_ns': self.percentile(0.5),
+            'latency_p99_ns': self.percentile(0.99),
+        }
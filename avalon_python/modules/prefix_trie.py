@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Binary prefix trie over 32-bit ipv4 addresses used as router FIB.
+Longest prefix match costs at most 32 steps regardless of table size.
+
+Nodes are stored in arrays of NodeArena instead of python objects:
+node is offset of three int32 cells (zero child, one child, value slot)
+plus uint32 owner, so node takes 16 bytes. Stored values are kept
+in list of arena, value slot of node is index in it (-1 - no value).
+
+Trie is copy-on-write: edit() returns new version sharing arena with
+source, both versions copy a shared node before changing it (node belongs
+to version whose owner number it carries). Nodes and values are never
+changed once shared, so readers of one version never see changes made
+through another one. Copies leave garbage in arena, edit() compacts
+new version into fresh arena when garbage outgrows live nodes.
+'''
+from array import array
+
+ADDR_BITS = 32
+ADDR_MAX = 0xFFFFFFFF
+
+NO_NODE = -1
+COMPACT_MIN = 1 << 12
+
+
+def mask_to_prefix_len(mask_decimal):
+    ''' convert netmask to prefix length, netmask must be contiguous '''
+    inverted = ~mask_decimal & ADDR_MAX
+    if inverted & (inverted + 1):
+        raise ValueError('non-contiguous netmask %s' % mask_decimal)
+    return ADDR_BITS - len(bin(inverted)) + 2 if inverted else ADDR_BITS
+
+
+def prefix_len_to_mask(prefix_len):
+    ''' convert prefix length to netmask '''
+    return (ADDR_MAX << (ADDR_BITS - prefix_len)) & ADDR_MAX
+
+
+NODE_SIZE = 3
+# lookup() uses literal 2 for speed
+SLOT = 2
+
+
+class NodeArena(object):
+    '''
+        Trie nodes shared by versions of one trie: child of node
+        is cells[node + bit], its value is values[cells[node + SLOT]],
+        owner is owner[node // NODE_SIZE]
+    '''
+    def __init__(self):
+        self.cells = array('i')
+        self.owner = array('I')
+        self.values = []
+        self.owners = 0
+
+    def __len__(self):
+        return len(self.owner)
+
+    def new_owner(self):
+        self.owners += 1
+        return self.owners
+
+    def add(self, owner, zero=NO_NODE, one=NO_NODE, slot=NO_NODE):
+        ''' append node, returns its offset '''
+        node = len(self.cells)
+        self.cells.extend((zero, one, slot))
+        self.owner.append(owner)
+        return node
+
+    def add_value(self, value):
+        ''' append value, returns its slot '''
+        self.values.append(value)
+        return len(self.values) - 1
+
+
+class PrefixTrie(object):
+    '''
+        Maps (prefix, prefix_len) pairs to values and
+        finds value of the longest prefix covering an address
+    '''
+    def __init__(self):
+        self._arena = NodeArena()
+        self._owner = self._arena.new_owner()
+        self.root = self._arena.add(self._owner)
+        self.size = 0
+        # nodes reachable from root, arena may hold more
+        self.node_count = 1
+        # number of stored prefixes of every length, see len_counts()
+        self._len_counts = [0] * (ADDR_BITS + 1)
+
+    def __len__(self):
+        return self.size
+
+    def edit(self):
+        ''' new version of trie, changes of versions do not affect each other '''
+        trie = PrefixTrie.__new__(PrefixTrie)
+        trie._arena = self._arena
+        trie._owner = self._arena.new_owner()
+        trie.root = self.root
+        trie.size = self.size
+        trie.node_count = self.node_count
+        trie._len_counts = self._len_counts[:]
+        # from now on source shares its nodes too
+        self._owner = self._arena.new_owner()
+        if len(self._arena) > 2 * self.node_count + COMPACT_MIN or \
+                len(self._arena.values) > 2 * self.size + COMPACT_MIN:
+            trie._compact()
+        return trie
+
+    def _compact(self):
+        ''' move nodes and values reachable from root to fresh arena '''
+        old, old_root = self._arena, self.root
+        arena = self._arena = NodeArena()
+        self._owner = arena.new_owner()
+        old_cells = old.cells
+        cells = arena.cells
+
+        # nodes are added before their children, links are patched later
+        self.root = arena.add(self._owner)
+        stack = [(self.root, old_root)]
+        while stack:
+            node, old_node = stack.pop()
+            slot = old_cells[old_node + SLOT]
+            if slot != NO_NODE:
+                cells[node + SLOT] = arena.add_value(old.values[slot])
+            for bit in (0, 1):
+                old_child = old_cells[old_node + bit]
+                if old_child != NO_NODE:
+                    child = arena.add(self._owner)
+                    cells[node + bit] = child
+                    stack.append((child, old_child))
+
+    def _own(self, node):
+        ''' node itself if it belongs to this trie, its copy otherwise '''
+        arena = self._arena
+        if arena.owner[node // NODE_SIZE] != self._owner:
+            cells = arena.cells
+            node = arena.add(
+                self._owner, cells[node], cells[node + 1], cells[node + SLOT]
+            )
+        return node
+
+    def insert(self, prefix, prefix_len, value, replace=True):
+        '''
+            store value for prefix, returns value stored in trie,
+            with replace=False already stored value is kept
+        '''
+        if not replace:
+            stored = self.get(prefix, prefix_len)
+            if stored is not None:
+                return stored
+
+        arena = self._arena
+        cells = arena.cells
+        node = self.root = self._own(self.root)
+        for shift in xrange(ADDR_BITS - 1, ADDR_BITS - 1 - prefix_len, -1):
+            link = node + ((prefix >> shift) & 1)
+            child = cells[link]
+            if child == NO_NODE:
+                child = arena.add(self._owner)
+                self.node_count += 1
+            else:
+                child = self._own(child)
+            cells[link] = child
+            node = child
+
+        if cells[node + SLOT] == NO_NODE:
+            self.size += 1
+            self._len_counts[prefix_len] += 1
+        cells[node + SLOT] = arena.add_value(value)
+        return value
+
+    def delete(self, prefix, prefix_len):
+        ''' remove prefix, returns removed value or None '''
+        value = self.get(prefix, prefix_len)
+        if value is None:
+            return None
+
+        cells = self._arena.cells
+        path = []
+        node = self.root = self._own(self.root)
+        for shift in xrange(ADDR_BITS - 1, ADDR_BITS - 1 - prefix_len, -1):
+            link = node + ((prefix >> shift) & 1)
+            child = cells[link] = self._own(cells[link])
+            path.append(link)
+            node = child
+
+        cells[node + SLOT] = NO_NODE
+        self.size -= 1
+        self._len_counts[prefix_len] -= 1
+
+        # drop nodes left without values and children
+        while path and cells[node] == NO_NODE and \
+                cells[node + 1] == NO_NODE and cells[node + SLOT] == NO_NODE:
+            link = path.pop()
+            cells[link] = NO_NODE
+            self.node_count -= 1
+            node = link - link % NODE_SIZE
+        return value
+
+    def _find(self, prefix, prefix_len):
+        ''' node of prefix or NO_NODE '''
+        cells = self._arena.cells
+        node = self.root
+        for shift in xrange(ADDR_BITS - 1, ADDR_BITS - 1 - prefix_len, -1):
+            node = cells[node + ((prefix >> shift) & 1)]
+            if node == NO_NODE:
+                break
+        return node
+
+    def get(self, prefix, prefix_len):
+        ''' exact match of prefix '''
+        node = self._find(prefix, prefix_len)
+        if node == NO_NODE:
+            return None
+        slot = self._arena.cells[node + SLOT]
+        return self._arena.values[slot] if slot != NO_NODE else None
+
+    def lookup(self, addr):
+        ''' longest prefix match, returns None if nothing covers addr '''
+        arena = self._arena
+        cells = arena.cells
+        node = self.root
+        found = cells[node + SLOT]
+        # NO_NODE is negative, comparisons with constants are cheaper
+        for shift in xrange(ADDR_BITS - 1, -1, -1):
+            node = cells[node + ((addr >> shift) & 1)]
+            if node < 0:
+                break
+            slot = cells[node + 2]
+            if slot >= 0:
+                found = slot
+        return arena.values[found] if found != NO_NODE else None
+
+    def match(self, addr):
+        '''
+            longest prefix match, returns (prefix_len, value)
+            or None if nothing covers addr
+        '''
+        arena = self._arena
+        cells = arena.cells
+        node = self.root
+        found = cells[node + SLOT]
+        found_len = 0
+        for depth in xrange(1, ADDR_BITS + 1):
+            node = cells[node + ((addr >> (ADDR_BITS - depth)) & 1)]
+            if node < 0:
+                break
+            slot = cells[node + 2]
+            if slot >= 0:
+                found = slot
+                found_len = depth
+        if found == NO_NODE:
+            return None
+        return found_len, arena.values[found]
+
+    def items(self, prefix=0, prefix_len=0):
+        '''
+            (prefix, prefix_len, value) in prefix order, by default all,
+            otherwise only prefix itself and longer prefixes inside it
+        '''
+        node = self._find(prefix, prefix_len)
+        if node == NO_NODE:
+            return
+        arena = self._arena
+        cells = arena.cells
+        stack = [(node, prefix & prefix_len_to_mask(prefix_len), prefix_len)]
+        while stack:
+            node, prefix, prefix_len = stack.pop()
+            slot = cells[node + SLOT]
+            if slot != NO_NODE:
+                yield prefix, prefix_len, arena.values[slot]
+            one = cells[node + 1]
+            if one != NO_NODE:
+                stack.append((
+                    one,
+                    prefix | (1 << (ADDR_BITS - 1 - prefix_len)),
+                    prefix_len + 1
+                ))
+            zero = cells[node]
+            if zero != NO_NODE:
+                stack.append((zero, prefix, prefix_len + 1))
+
+    def covering(self, prefix, prefix_len=ADDR_BITS):
+        '''
+            (prefix, prefix_len, value) of prefix itself and shorter
+            prefixes covering it, shortest first
+        '''
+        arena = self._arena
+        cells = arena.cells
+        node = self.root
+        depth = 0
+        while True:
+            slot = cells[node + SLOT]
+            if slot != NO_NODE:
+                yield (
+                    prefix & prefix_len_to_mask(depth), depth,
+                    arena.values[slot]
+                )
+            if depth == prefix_len:
+                return
+            node = cells[node + ((prefix >> (ADDR_BITS - 1 - depth)) & 1)]
+            if node == NO_NODE:
+                return
+            depth += 1
+
+    def len_counts(self):
+        ''' dict prefix length -> number of stored prefixes of this length '''
+        return dict(
+            (prefix_len, count)
+            for prefix_len, count in enumerate(self._len_counts) if count
+        )
+
+    def memory_bytes(self):
+        ''' bytes taken by arena arrays and value list, not by values '''
+        arena = self._arena
+        return (
+            arena.cells.itemsize * len(arena.cells) +
+            arena.owner.itemsize * len(arena.owner) +
+            8 * len(arena.values)
+        )
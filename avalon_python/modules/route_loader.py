@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Streaming reader of route dumps for Router.load_routes.
+Supported formats:
+    plain - one route per line: "dest mask next_hop" or "dest/len next_hop",
+    empty lines and lines starting with # are skipped
+    proc - linux /proc/net/route table (hex values in host byte order)
+Routes are yielded as (prefix, prefix_len, next_hop, iface) with integer
+addresses, next_hop is None for directly connected routes of proc format.
+'''
+import socket
+import struct
+
+from avalon_python.modules.prefix_trie import (
+    mask_to_prefix_len, prefix_len_to_mask
+)
+
+RTF_UP = 0x0001
+
+
+def dotted_to_decimal(addr_dotted):
+    ''' strict dotted notation parser '''
+    try:
+        return struct.unpack('>I', socket.inet_aton(addr_dotted))[0]
+    except socket.error:
+        raise ValueError('illegal IP address %r' % addr_dotted)
+
+
+def proc_hex_to_decimal(addr_hex):
+    ''' /proc/net/route stores addresses as little endian hex '''
+    return struct.unpack('<I', struct.pack('>I', int(addr_hex, 16)))[0]
+
+
+def iter_plain_routes(lines):
+    ''' parse "dest mask next_hop" and "dest/len next_hop" lines '''
+    for lineno, line in enumerate(lines, 1):
+        fields = line.split()
+        if not fields or fields[0].startswith('#'):
+            continue
+        try:
+            if '/' in fields[0]:
+                dest, prefix_len = fields[0].split('/')
+                prefix_len = int(prefix_len)
+                next_hop, = fields[1:]
+            else:
+                dest, mask, next_hop = fields
+                prefix_len = mask_to_prefix_len(dotted_to_decimal(mask))
+            if not 0 <= prefix_len <= 32:
+                raise ValueError('illegal prefix length %s' % prefix_len)
+            prefix = dotted_to_decimal(dest) & prefix_len_to_mask(prefix_len)
+            yield prefix, prefix_len, dotted_to_decimal(next_hop), None
+        except ValueError as e:
+            raise ValueError('line %s: %s' % (lineno, e))
+
+
+def iter_proc_routes(lines):
+    ''' parse /proc/net/route table, routes which are not up are skipped '''
+    lines = iter(lines)
+    header = next(lines, '').split()
+    columns = dict((name, index) for index, name in enumerate(header))
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if not int(fields[columns['Flags']], 16) & RTF_UP:
+            continue
+        mask = proc_hex_to_decimal(fields[columns['Mask']])
+        prefix = proc_hex_to_decimal(fields[columns['Destination']]) & mask
+        gateway = proc_hex_to_decimal(fields[columns['Gateway']])
+        yield (
+            prefix,
+            mask_to_prefix_len(mask),
+            gateway or None,
+            fields[columns['Iface']]
+        )
+
+
+def iter_routes(lines, fmt='auto'):
+    ''' dispatch route dump to parser by format name or by its header '''
+    lines = iter(lines)
+    if fmt == 'auto':
+        first = next(lines, '')
+        fmt = 'proc' if first.startswith('Iface') else 'plain'
+        lines = _chain_first(first, lines)
+
+    if fmt == 'proc':
+        return iter_proc_routes(lines)
+    elif fmt == 'plain':
+        return iter_plain_routes(lines)
+    raise ValueError('unknown route dump format %r' % fmt)
+
+
+def _chain_first(first, lines):
+    yield first
+    for line in lines:
+        yield line
+
+
+def aggregate_routes(routes, installed=()):
+    '''
+        shrink (prefix, prefix_len, next_hop) routes without changing
+        lookup results: sibling prefixes with equal next hop are merged
+        into their parent and prefixes covered by nearest shorter prefix
+        with equal next hop are dropped; installed is a set of
+        (prefix, prefix_len) already in the table, they are kept by install
+        and neither merged into nor looked through
+    '''
+    table = {}
+    for prefix, prefix_len, next_hop in routes:
+        # first installed route wins for equal prefixes
+        if (prefix, prefix_len) not in installed:
+            table.setdefault((prefix, prefix_len), next_hop)
+
+    by_len = [[] for _ in xrange(33)]
+    for prefix, prefix_len in table:
+        by_len[prefix_len].append(prefix)
+
+    # parent route of two siblings is never matched, so it may be replaced
+    for prefix_len in xrange(32, 0, -1):
+        bit = 1 << (32 - prefix_len)
+        for prefix in by_len[prefix_len]:
+            next_hop = table.get((prefix, prefix_len))
+            if next_hop is None or prefix & bit:
+                continue
+            sibling = (prefix | bit, prefix_len)
+            if table.get(sibling) != next_hop:
+                continue
+            parent = (prefix, prefix_len - 1)
+            if parent in installed:
+                continue
+            del table[(prefix, prefix_len)]
+            del table[sibling]
+            if parent not in table:
+                by_len[prefix_len - 1].append(prefix)
+            table[parent] = next_hop
+
+    # drop prefixes shadowed by covering prefix with the same next hop
+    for prefix_len in xrange(33):
+        for prefix in by_len[prefix_len]:
+            next_hop = table.get((prefix, prefix_len))
+            if next_hop is None:
+                continue
+            for parent_len in xrange(prefix_len - 1, -1, -1):
+                parent = (prefix & prefix_len_to_mask(parent_len), parent_len)
+                if parent in installed:
+                    break
+                if parent in table:
+                    if table[parent] == next_hop:
+                        del table[(prefix, prefix_len)]
+                    break
+
+    return sorted(
+        (prefix, prefix_len, next_hop)
+        for (prefix, prefix_len), next_hop in table.iteritems()
+    )
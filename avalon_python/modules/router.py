@@ -26,197 +26,348 @@
 
         Стоимость задания - 70 баллов
 '''
-import struct
-import socket
-
-
-class IPv4Address(object):
+import threading
+from array import array
+from itertools import islice
+from contextlib import contextmanager
+from timeit import default_timer
+
+from avalon_python.modules.prefix_trie import (
+    PrefixTrie, mask_to_prefix_len, prefix_len_to_mask
+)
+from avalon_python.modules.compiled_fib import CompiledFib
+from avalon_python.modules.ecmp import buckets, select
+from avalon_python.modules.flow_cache import FlowCache
+from avalon_python.modules.lookup_stats import LookupStats
+from avalon_python.modules.route_loader import iter_routes, aggregate_routes
+from avalon_python.modules.ipv4_address import IPv4Address
+
+
+class NextHop(object):
     '''
-        This class designated to easy manipulate ipv4 addresses and masks
+        Next hop resolved to outgoing interface,
+        one instance is shared by all FIB entries with the same next hop
     '''
-    default_subnet_masks = (
-        # network A class
-        (
-            0b10000000000000000000000000000000,  # check_value
-            0b00000000000000000000000000000000,  # leading_bit
-            0b11111111000000000000000000000000,  # mask
-            '255.0.0.0'  # mask_dotted
-        ),
-        # network B class
-        (
-            0b11000000000000000000000000000000,
-            0b10000000000000000000000000000000,
-            0b11111111111111110000000000000000,
-            '255.255.0.0'
-        ),
-        # network C class
-        (
-            0b11000000000000000000000000000000,
-            0b11000000000000000000000000000000,
-            0b11111111111111111111111100000000,
-            '255.255.255.0'
-        ),
-    )
-
-    def __init__(self, raw_addr, raw_mask=None):
-        self.addr_decimal, self.addr_dotted = IPv4Address.parse(raw_addr)
-
-        if raw_mask:
-            parsed_mask = IPv4Address.parse_netmask(raw_mask)
-        else:
-            parsed_mask = IPv4Address.determine_mask_by_ip(self.addr_decimal)
+    __slots__ = ('addr', 'iface')
 
-        self.mask_decimal, self.mask_dotted = parsed_mask
-        self.addr_decimal, self.addr_dotted = IPv4Address.parse(raw_addr)
+    def __init__(self, addr, iface):
+        self.addr = addr
+        self.iface = iface
 
-    @staticmethod
-    def determine_mask_by_ip(raw_addr):
-        ''' determine class of network '''
-        for default_subnet in IPv4Address.default_subnet_masks:
-            (
-                check_value,
-                leading_bit,
-                mask_decimal,
-                mask_dotted
-            ) = default_subnet
-            # determine class of ip network
-            if raw_addr & check_value == leading_bit:
-                return (mask_decimal, mask_dotted)
-        return (None, None)
-
-    @staticmethod
-    def parse(raw_addr):
-        ''' try to parse raw_addr format '''
-        if type(raw_addr) == str:
-            return IPv4Address.parse_dotted(raw_addr)
-        elif type(raw_addr) == int:
-            return IPv4Address.parse_decimal(raw_addr)
-        elif type(raw_addr) == IPv4Address:
-            return raw_addr.decimal(), raw_addr.dotted()
-        else:
-            raise ValueError('Can not parse ip address')
-
-    @staticmethod
-    def parse_dotted(addr_dotted):
-        ''' try to parse ip address in dotted notation '''
-        try:
-            addr_decimal, = struct.unpack(
-                '>I',
-                socket.inet_aton(addr_dotted)
-            )
-            return (addr_decimal, addr_dotted)
-        except:
-            raise Exception('illegal IP address string passed as argument')
 
-    @staticmethod
-    def parse_decimal(addr_decimal):
-        ''' try to parse ip address in decimal '''
-        try:
-            addr_dotted = socket.inet_ntoa(struct.pack('>I', addr_decimal))
-            return (addr_decimal, addr_dotted)
-        except:
-            raise Exception('Illegal IP address value passed to method')
-
-    def dotted(self):
-        ''' return ipv4 address in dotted notation '''
-        return self.addr_dotted
-
-    def binary(self):
-        ''' return binary repesentation of ipv4 address '''
-        decimal_octets = self.dotted().split('.')
-        binarify = lambda octet: bin(int(octet))[2:].zfill(8)
-        octets = [binarify(octet) for octet in decimal_octets]
-        return '.'.join(octets)
-
-    def decimal(self):
-        ''' return ipv4 as decimal value '''
-        return self.addr_decimal
+class RouteTransaction(object):
+    '''
+        Batch of route changes, built on private copy of FIB
+        and published to readers by single reference swap on commit
+    '''
+    def __init__(self, router):
+        self.router = router
+        self.fib = router.fib.edit()
+        self.changed = []
+
+    def ip_route(self, dest_addr, dest_mask, next_hop_addr, replace=False,
+                 multipath=False):
+        '''
+            add static route, existing route with equal prefix is kept
+            unless replace is true, with multipath next hop is added to it
+            as equal-cost path, returns True if route is installed
+        '''
+        mask_decimal = IPv4Address.parse_to_decimal(dest_mask)
+        prefix = IPv4Address.parse_to_decimal(dest_addr) & mask_decimal
+        prefix_len = mask_to_prefix_len(mask_decimal)
+        return self.install(
+            prefix, prefix_len, IPv4Address.parse_to_decimal(next_hop_addr),
+            replace, multipath
+        )
 
-    @staticmethod
-    def parse_netmask(mask):
-        ''' try parse netmask '''
-        return IPv4Address.parse(mask)
-
-    def netmask_dotted(self):
-        ''' return netmask in dotted represenation '''
-        return self.mask_dotted
-
-    def netmask_decimal(self):
-        ''' return netmask as decimal value '''
-        return self.mask_decimal
-
-    def netmask(self):
-        ''' return netmask in two represenation decimal and dotted '''
-        return self.netmask_decimal(), self.netmask_dotted()
-
-    def subnet(self):
-        ''' calculate subnet from ipv4 address and mask '''
-        if self.netmask_decimal():
-            return self.__class__(
-                self.netmask_decimal() & self.decimal(),
-                self.netmask_decimal()
+    def install(self, prefix, prefix_len, next_hop_decimal, replace=False,
+                multipath=False):
+        ''' add route for already parsed prefix and next hop '''
+        next_hops = (next_hop_decimal,)
+        group = self.fib.get(prefix, prefix_len)
+        if group is not None:
+            if multipath:
+                paths = self.router.next_hop_groups[group][0]
+                if next_hop_decimal in paths:
+                    return False
+                next_hops = paths + next_hops
+            elif not replace:
+                return False
+        self.fib.insert(prefix, prefix_len, self.router._group(next_hops))
+        self.changed.append((prefix, prefix_len))
+        return True
+
+    def no_ip_route(self, dest_addr, dest_mask, next_hop_addr=None):
+        '''
+            delete static route, with next_hop_addr only path
+            via this next hop is deleted, returns True if route is deleted
+        '''
+        mask_decimal = IPv4Address.parse_to_decimal(dest_mask)
+        prefix = IPv4Address.parse_to_decimal(dest_addr) & mask_decimal
+        prefix_len = mask_to_prefix_len(mask_decimal)
+
+        group = self.fib.get(prefix, prefix_len)
+        if group is None:
+            return False
+        next_hops = ()
+        if next_hop_addr is not None:
+            next_hop_decimal = IPv4Address.parse_to_decimal(next_hop_addr)
+            paths = self.router.next_hop_groups[group][0]
+            if next_hop_decimal not in paths:
+                return False
+            next_hops = tuple(
+                path for path in paths if path != next_hop_decimal
             )
-
-    def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return self.decimal() == other.decimal()
+        if next_hops:
+            self.fib.insert(prefix, prefix_len, self.router._group(next_hops))
         else:
-            raise NotImplementedError
-
-    def __ne__(self, other):
-        result = self.__eq__(other)
-        if result is NotImplemented:
-            return result
-        return not result
+            self.fib.delete(prefix, prefix_len)
+        self.changed.append((prefix, prefix_len))
+        return True
 
-    def __and__(self, other):
-        if isinstance(other, self.__class__):
-            return self.__class__(self.decimal() & other.decimal())
-        else:
-            return NotImplemented
-
-    def __str__(self):
-        return self.dotted()
-
-    def __repr__(self):
-        dotted = ', '.join(
-            filter(bool, [self.dotted(), self.netmask_dotted()])
-        )
-        return "IPv4Address(%s)" % dotted
+    def commit(self):
+        ''' publish new FIB version '''
+        router = self.router
+        router.fib = self.fib
+        if router.flow_cache is not None:
+            router.flow_cache.invalidate_prefixes(self.changed)
 
 
 class Router(object):
-    def __init__(self):
+    '''
+        Readers (route, route_many) never take locks: they use FIB version
+        referenced by self.fib, writers serialize on lock, build new version
+        and publish it by single reference swap. Flow cache is not
+        thread-safe, use Router(cache_size=None) with concurrent readers.
+    '''
+    def __init__(self, cache_size=None):
         self.iface_table = {}
-        self.routes = []
+        self.fib = PrefixTrie()
+        # directly connected networks -> interface, see resolve_next_hop()
+        self.connected = PrefixTrie()
+        self.next_hops = {}
+        # deduplicated next hop sets of routes as (next hop addresses,
+        # slots of NextHop), FIB stores index of group, see _group()
+        self.next_hop_groups = []
+        self._group_index = {}
+        self._iface_by_addr = {}
+        self._compiled_fib = (None, None)
+        self._write_lock = threading.RLock()
+        self._transaction = None
+        # optional destination cache, see cache_stats()
+        self.flow_cache = FlowCache(cache_size) if cache_size else None
+        # lookup counters, see enable_stats()
+        self.lookup_stats = None
+
+    @property
+    def routes(self):
+        '''
+            routing table as list of (dest, mask, next hop) in prefix order,
+            built on demand, see route_columns() for compact form
+        '''
+        return list(self.iter_routes())
+
+    @contextmanager
+    def transaction(self):
+        '''
+            group route changes, readers see all of them or none:
+            with router.transaction() as txn:
+                txn.no_ip_route('10.0.0.0', '255.0.0.0')
+                txn.ip_route('10.0.0.0', '255.0.0.0', '192.168.1.2')
+            nested transactions of the same thread join outer one
+        '''
+        with self._write_lock:
+            if self._transaction is not None:
+                yield self._transaction
+                return
+            self._transaction = RouteTransaction(self)
+            try:
+                yield self._transaction
+                self._transaction.commit()
+            finally:
+                self._transaction = None
 
     def ip_addr(self, interface, address, mask):
         ''' make it a rule: 1 ipv4 address per 1 interface '''
         ipv4_addr = IPv4Address(address, mask)
+        # bad netmask must fail before interface table is changed
+        mask_to_prefix_len(ipv4_addr.netmask_decimal())
+
+        with self.transaction() as txn:
+            old_addr = self.iface_table.get(interface)
+            self.iface_table[interface] = ipv4_addr
+            self._update_connected()
+
+            # add route to directly connected network
+            ipv4_directly_connected_network = ipv4_addr.subnet()
+            txn.ip_route(
+                ipv4_directly_connected_network,
+                ipv4_addr.netmask_decimal(),
+                ipv4_addr
+            )
 
-        # add route to directly connected network
-        ipv4_directly_connected_network = ipv4_addr.subnet()
-        self.ip_route(
-            ipv4_directly_connected_network,
-            ipv4_addr.netmask_decimal(),
-            ipv4_addr
-        )
+            self._reresolve_next_hops(filter(None, [old_addr, ipv4_addr]))
+
+    def _update_connected(self):
+        ''' rebuild interface indices, interface table is small '''
+        self._iface_by_addr = {}
+        self.connected = PrefixTrie()
+        for iface in sorted(self.iface_table):
+            addr = self.iface_table[iface]
+            mask_decimal = addr.netmask_decimal()
+            self._iface_by_addr.setdefault(addr.decimal(), iface)
+            self.connected.insert(
+                addr.decimal() & mask_decimal,
+                mask_to_prefix_len(mask_decimal),
+                iface,
+                replace=False
+            )
 
-        self.iface_table[interface] = ipv4_addr
+    def _reresolve_next_hops(self, iface_addrs):
+        '''
+            resolve again next hops from connected networks
+            of given interface addresses
+        '''
+        networks = [
+            (addr.decimal() & addr.netmask_decimal(), addr.netmask_decimal())
+            for addr in iface_addrs
+        ]
+        changed = set()
+        for next_hop in self.next_hops.values():
+            addr_decimal = next_hop.addr.decimal()
+            for network, mask_decimal in networks:
+                if addr_decimal & mask_decimal == network:
+                    iface = self.resolve_next_hop(addr_decimal)
+                    if iface != next_hop.iface:
+                        next_hop.iface = iface
+                        changed.add(addr_decimal)
+                    break
+
+        if changed:
+            self._compiled_fib = (None, None)
+            # cached results with re-resolved next hop have stale iface
+            if self.flow_cache is not None:
+                self.flow_cache.invalidate_if(
+                    lambda key, value: value[1].decimal() in changed
+                )
+
+    def resolve_next_hop(self, addr):
+        '''
+            determine outgoing interface for next hop: interface
+            with this address or interface of connected network
+        '''
+        addr_decimal = IPv4Address.parse_to_decimal(addr)
+        iface = self._iface_by_addr.get(addr_decimal)
+        if iface is None:
+            iface = self.connected.lookup(addr_decimal)
+        return iface
+
+    def _next_hop(self, next_hop_decimal):
+        ''' shared resolved next hop for address '''
+        next_hop = self.next_hops.get(next_hop_decimal)
+        if next_hop is None:
+            next_hop = NextHop(
+                IPv4Address.intern(next_hop_decimal),
+                self.resolve_next_hop(next_hop_decimal)
+            )
+            self.next_hops[next_hop_decimal] = next_hop
+        return next_hop
+
+    def _group(self, next_hop_decimals):
+        '''
+            index of next hop group for tuple of next hop addresses,
+            groups are only appended, so indices in old FIB versions stay valid
+        '''
+        index = self._group_index.get(next_hop_decimals)
+        if index is None:
+            slots = buckets([
+                self._next_hop(addr) for addr in next_hop_decimals
+            ])
+            self.next_hop_groups.append((next_hop_decimals, slots))
+            index = len(self.next_hop_groups) - 1
+            self._group_index[next_hop_decimals] = index
+        return index
+
+    def ip_route(self, dest_addr, dest_mask, next_hop_addr, replace=False,
+                 multipath=False):
+        '''
+            add static route, first installed route wins for equal
+            prefixes unless replace is true, with multipath true
+            next hop is added to route as equal-cost path (ECMP)
+        '''
+        with self.transaction() as txn:
+            return txn.ip_route(
+                dest_addr, dest_mask, next_hop_addr, replace, multipath
+            )
 
-    def ip_route(self, dest_addr, dest_mask, next_hop_addr):
-        ''' add static route '''
-        self.routes.append((
-            IPv4Address(dest_addr),
-            IPv4Address(dest_mask),
-            IPv4Address(next_hop_addr)
-        ))
+    def no_ip_route(self, dest_addr, dest_mask, next_hop_addr=None):
+        '''
+            delete static route or only its path via next_hop_addr,
+            returns True if route is deleted
+        '''
+        with self.transaction() as txn:
+            return txn.no_ip_route(dest_addr, dest_mask, next_hop_addr)
+
+    def load_interfaces(self, source):
+        '''
+            assign addresses from file name or file object
+            with "interface address mask" lines
+        '''
+        if isinstance(source, basestring):
+            with open(source) as f:
+                return self.load_interfaces(f)
+
+        for line in source:
+            if line.strip():
+                self.ip_addr(*line.split())
+
+    def load_routes(self, source, fmt='auto', aggregate=False):
+        '''
+            bulk import of routes from file name or file object,
+            fmt is 'plain', 'proc' (/proc/net/route) or 'auto',
+            aggregate merges prefixes with equal next hop before install,
+            returns number of installed routes
+        '''
+        if isinstance(source, basestring):
+            with open(source) as f:
+                return self.load_routes(f, fmt, aggregate)
+
+        routes = self._resolve_loaded_routes(iter_routes(source, fmt))
+
+        count = 0
+        # whole dump is published at once
+        with self.transaction() as txn:
+            if aggregate:
+                # routes of table win over dump, aggregation must see them
+                routes = aggregate_routes(routes, set(
+                    (prefix, prefix_len)
+                    for prefix, prefix_len, _ in txn.fib.items()
+                ))
+            for prefix, prefix_len, next_hop in routes:
+                if txn.install(prefix, prefix_len, next_hop):
+                    count += 1
+            # one sweep is cheaper than invalidation per route
+            del txn.changed[:]
+            if self.flow_cache is not None:
+                self.flow_cache.clear()
+        return count
+
+    def _resolve_loaded_routes(self, routes):
+        '''
+            directly connected routes of route dump use address of
+            their interface as next hop, unknown interfaces are skipped
+        '''
+        for prefix, prefix_len, next_hop, iface in routes:
+            if next_hop is None:
+                iface_addr = self.iface_table.get(iface)
+                if iface_addr is None:
+                    continue
+                next_hop = iface_addr.decimal()
+            yield prefix, prefix_len, next_hop
 
     def get_iface_by_addr(self, addr):
         ''' determine interface name by ipv4 address '''
-        for iface, iface_addr in self.iface_table.iteritems():
-            if addr == iface_addr:
-                return iface
+        return self._iface_by_addr.get(IPv4Address.parse_to_decimal(addr))
 
     def list_interfaces(self):
         ''' nice outputs interface list '''
@@ -231,31 +382,217 @@ class Router(object):
                 addr.netmask_dotted()
             )
 
-    def list_routes(self):
-        ''' nice outputs routes '''
+    def list_routes(self, routes=None, offset=0, limit=None):
+        '''
+            nice outputs routes, all by default or any iterable
+            of routes (e.g. routes_longer()), page by page with offset, limit
+        '''
+        if routes is None:
+            routes = self.iter_routes()
+        stop = offset + limit if limit is not None else None
         fmt = '%-15s%-15s%-15s'
         routes_repr = ('destination', 'mask', 'interface')
         print fmt % routes_repr
         print "=" * 45
-        for route in self.routes:
+        for route in islice(routes, offset, stop):
             print fmt % route
 
-    def route(self, addr):
-        ''' find optimal route by longest prefix match '''
-        ipv4_decimal = IPv4Address(addr).decimal()
-        possible_routes = []
-        for dest_addr, dest_mask, next_hop_addr in self.routes:
-            subnet = dest_addr.decimal() & dest_mask.decimal()
-            if ipv4_decimal & subnet == subnet:
-                possible_routes.append((ipv4_decimal, subnet, next_hop_addr))
-
-        # longest prefix match
-        _, _, next_hop_addr = max(
-            possible_routes,
-            key=lambda route: route[1]
+    @staticmethod
+    def parse_prefix(dest_addr, dest_mask=None):
+        '''
+            (prefix, prefix_len) of destination with mask
+            or of 'address/prefix_len' string
+        '''
+        if dest_mask is None:
+            dest_addr, prefix_len = dest_addr.split('/')
+            dest_mask = prefix_len_to_mask(int(prefix_len))
+        mask_decimal = IPv4Address.parse_to_decimal(dest_mask)
+        return (
+            IPv4Address.parse_to_decimal(dest_addr) & mask_decimal,
+            mask_to_prefix_len(mask_decimal)
         )
 
-        return self.get_iface_by_addr(next_hop_addr), next_hop_addr
+    def _route_views(self, items):
+        '''
+            (dest, mask, next hop) of every path
+            of (prefix, prefix_len, group) items
+        '''
+        groups = self.next_hop_groups
+        for prefix, prefix_len, group in items:
+            dest = IPv4Address(prefix)
+            mask = IPv4Address.intern(prefix_len_to_mask(prefix_len))
+            for next_hop in groups[group][0]:
+                yield dest, mask, IPv4Address.intern(next_hop)
+
+    def iter_routes(self):
+        ''' stream of routes of current FIB version in prefix order '''
+        return self._route_views(self.fib.items())
+
+    def iter_prefixes(self, fib=None):
+        '''
+            stream of (prefix, prefix_len, next hop) integers of every path,
+            of current FIB version by default
+        '''
+        if fib is None:
+            fib = self.fib
+        groups = self.next_hop_groups
+        return (
+            (prefix, prefix_len, next_hop)
+            for prefix, prefix_len, group in fib.items()
+            for next_hop in groups[group][0]
+        )
+
+    def route_columns(self):
+        '''
+            routing table in columns: prefixes array('I'),
+            prefix lengths array('B') and indices of next_hop_groups array('I')
+        '''
+        prefixes, prefix_lens, groups = array('I'), array('B'), array('I')
+        for prefix, prefix_len, group in self.fib.items():
+            prefixes.append(prefix)
+            prefix_lens.append(prefix_len)
+            groups.append(group)
+        return prefixes, prefix_lens, groups
+
+    def memory_bytes(self):
+        ''' approximate size of FIB columns and next hop tables in bytes '''
+        return self.fib.memory_bytes() + sum(
+            8 * (len(addrs) + len(slots))
+            for addrs, slots in self.next_hop_groups
+        )
+
+    def show_route(self, dest_addr, dest_mask=None):
+        ''' routes (one per equal-cost path) with exactly this prefix '''
+        prefix, prefix_len = self.parse_prefix(dest_addr, dest_mask)
+        group = self.fib.get(prefix, prefix_len)
+        if group is None:
+            return []
+        return list(self._route_views([(prefix, prefix_len, group)]))
+
+    def routes_longer(self, dest_addr, dest_mask=None):
+        '''
+            stream of routes with this prefix and longer ones
+            inside it in prefix order, only this subtree is walked
+        '''
+        prefix, prefix_len = self.parse_prefix(dest_addr, dest_mask)
+        return self._route_views(self.fib.items(prefix, prefix_len))
+
+    def routes_shorter(self, dest_addr, dest_mask=None):
+        ''' routes with this prefix and shorter ones covering it '''
+        prefix, prefix_len = self.parse_prefix(dest_addr, dest_mask)
+        return self._route_views(self.fib.covering(prefix, prefix_len))
+
+    def routes_summary(self):
+        ''' dict prefix length -> number of prefixes, kept up to date '''
+        return self.fib.len_counts()
+
+    def route(self, addr, src_addr=None, proto=0, src_port=0, dst_port=0):
+        '''
+            find optimal route by longest prefix match, next hop
+            of multipath route is chosen by hash of flow 5-tuple,
+            of destination only if src_addr is not given
+        '''
+        addr_decimal = IPv4Address.parse_to_decimal(addr)
+        # cached result is chosen by destination only
+        use_cache = self.flow_cache is not None and src_addr is None
+        if use_cache:
+            result = self.flow_cache.get(addr_decimal)
+            if result is not None:
+                return result
+
+        group = self.fib.lookup(addr_decimal)
+        if group is None:
+            raise ValueError('no route to host %s' % addr)
+
+        slots = self.next_hop_groups[group][1]
+        if src_addr is None:
+            next_hop = select(slots, addr_decimal)
+        else:
+            next_hop = select(
+                slots, addr_decimal, IPv4Address.parse_to_decimal(src_addr),
+                proto, src_port, dst_port
+            )
+        result = next_hop.iface, next_hop.addr
+        if use_cache:
+            self.flow_cache.put(addr_decimal, result)
+        return result
+
+    def _route_measured(self, addr, src_addr=None, proto=0, src_port=0,
+                        dst_port=0):
+        ''' route() which updates lookup_stats, see enable_stats() '''
+        stats = self.lookup_stats
+        started = default_timer()
+        try:
+            result = type(self).route(
+                self, addr, src_addr, proto, src_port, dst_port
+            )
+        except ValueError:
+            stats.add_failed(default_timer() - started)
+            raise
+        elapsed = default_timer() - started
+        # matched prefix is looked up again out of measured time
+        addr_decimal = IPv4Address.parse_to_decimal(addr)
+        match = self.fib.match(addr_decimal)
+        if match is not None:
+            prefix_len = match[0]
+            stats.add_hit(
+                elapsed,
+                (addr_decimal & prefix_len_to_mask(prefix_len), prefix_len)
+            )
+        else:
+            stats.add_latency(elapsed)
+        return result
+
+    def enable_stats(self):
+        '''
+            start counting route() lookups: hits per prefix, failures and
+            latency; route is replaced by measured version on this instance,
+            so disabled stats cost nothing
+        '''
+        if self.lookup_stats is None:
+            self.lookup_stats = LookupStats()
+            self.route = self._route_measured
+        return self.lookup_stats
+
+    def disable_stats(self):
+        ''' stop counting, returns final counters '''
+        stats = self.lookup_stats
+        if stats is not None:
+            del self.route
+            self.lookup_stats = None
+        return stats
+
+    def stats_snapshot(self, top=None):
+        ''' lookup counters, see LookupStats.snapshot(), None if disabled '''
+        if self.lookup_stats is not None:
+            return self.lookup_stats.snapshot(top)
+
+    def cache_stats(self):
+        ''' flow cache counters, None if router has no cache '''
+        if self.flow_cache is not None:
+            return self.flow_cache.stats()
+
+    def compiled_fib(self):
+        ''' array form of routing table, rebuilt after any change '''
+        fib = self.fib
+        compiled_for, compiled = self._compiled_fib
+        if compiled_for is not fib:
+            compiled = CompiledFib(
+                self.iter_prefixes(fib),
+                sorted(self.iface_table),
+                lambda addr: self.next_hops[addr.decimal()].iface
+            )
+            self._compiled_fib = (fib, compiled)
+        return compiled
+
+    def route_many(self, addresses):
+        '''
+            batch longest prefix match for numpy uint32 array, buffer
+            with dotted address per line or list of dotted addresses,
+            returns arrays of indices
+            into compiled_fib().next_hops and compiled_fib().interfaces
+        '''
+        return self.compiled_fib().lookup_many(addresses)
 
 
 def __main__():
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Benchmark of Router on synthetic full-table workloads.
+Prefix lengths follow distribution of public BGP table (mostly /24),
+destinations are drawn with power-law skew, so few prefixes are hot.
+Every run prints one json object per table size, e.g.:
+
+    python -m avalon_python.modules.router_bench --sizes 10000 100000
+'''
+import argparse
+import json
+import random
+import resource
+import sys
+from timeit import default_timer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from avalon_python.common.misc import percentile
+from avalon_python.modules.router import Router
+from avalon_python.modules.dir24_8 import Dir24Fib
+from avalon_python.modules.prefix_trie import prefix_len_to_mask
+
+# (prefix length, weight) roughly as in public BGP table
+PREFIX_LEN_WEIGHTS = (
+    (8, 1), (12, 3), (13, 6), (14, 12), (15, 20), (16, 130),
+    (17, 70), (18, 120), (19, 260), (20, 410), (21, 500),
+    (22, 1000), (23, 900), (24, 6000),
+)
+
+NEXT_HOP_COUNT = 16
+
+
+def pick_prefix_len(rnd):
+    ''' random prefix length with realistic distribution '''
+    point = rnd.uniform(0, sum(weight for _, weight in PREFIX_LEN_WEIGHTS))
+    for prefix_len, weight in PREFIX_LEN_WEIGHTS:
+        point -= weight
+        if point <= 0:
+            return prefix_len
+    return PREFIX_LEN_WEIGHTS[-1][0]
+
+
+def generate_table(size, seed=0):
+    ''' list of unique (prefix, prefix_len, next_hop) with integer addresses '''
+    rnd = random.Random(seed)
+    next_hops = [
+        0x64400000 | (index << 8) | 2 for index in xrange(NEXT_HOP_COUNT)
+    ]
+    seen = set()
+    table = []
+    while len(table) < size:
+        prefix_len = pick_prefix_len(rnd)
+        prefix = rnd.getrandbits(prefix_len) << (32 - prefix_len)
+        if (prefix, prefix_len) in seen:
+            continue
+        seen.add((prefix, prefix_len))
+        table.append((prefix, prefix_len, rnd.choice(next_hops)))
+    return table
+
+
+def generate_destinations(table, count, skew=3.0, seed=0):
+    '''
+        destinations inside table prefixes, prefix rank is u ** skew
+        scaled to table size, so low ranks are hot
+    '''
+    rnd = random.Random(seed)
+    size = len(table)
+    destinations = []
+    for _ in xrange(count):
+        prefix, prefix_len, _ = table[int(size * rnd.random() ** skew)]
+        host_bits = 32 - prefix_len
+        if host_bits:
+            prefix |= rnd.getrandbits(host_bits)
+        destinations.append(prefix)
+    return destinations
+
+
+def make_router(cache_size=None):
+    ''' router with interfaces for all generated next hops '''
+    router = Router(cache_size=cache_size)
+    for index in xrange(NEXT_HOP_COUNT):
+        router.ip_addr(
+            'eth%s' % index,
+            0x64400000 | (index << 8) | 1,
+            '255.255.255.0'
+        )
+    return router
+
+
+def peak_rss_kb():
+    '''
+        peak resident memory of whole process in kilobytes (linux),
+        run one size per process to compare sizes
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_benchmark(size, lookups=100000, seed=0, cache_size=None, skew=3.0,
+                  dir24=False):
+    '''
+        run all measures for one table size, returns dict of results,
+        dir24 also measures DIR-24-8 FIB after peak memory of Router is taken
+    '''
+    table = generate_table(size, seed)
+    destinations = generate_destinations(table, lookups, skew, seed + 1)
+    router = make_router(cache_size)
+
+    started = default_timer()
+    for prefix, prefix_len, next_hop in table:
+        router.ip_route(prefix, prefix_len_to_mask(prefix_len), next_hop)
+    insert_time = default_timer() - started
+
+    latencies = []
+    timer = default_timer
+    route = router.route
+    started = timer()
+    for addr in destinations:
+        begin = timer()
+        route(addr)
+        latencies.append(timer() - begin)
+    lookup_time = timer() - started
+    latencies.sort()
+
+    result = {
+        'prefixes': size,
+        'lookups': lookups,
+        'seed': seed,
+        'skew': skew,
+        'cache_size': cache_size,
+        'insert_per_sec': size / insert_time,
+        'lookup_per_sec': lookups / lookup_time,
+        'lookup_latency_us': dict(
+            (name, percentile(latencies, fraction) * 1e6)
+            for name, fraction in (
+                ('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999)
+            )
+        ),
+        'fib_bytes_per_route': router.memory_bytes() / float(size),
+        'batch_per_sec': None,
+        'batch_compile_sec': None,
+        'dir24_compile_sec': None,
+        'dir24_lookup_per_sec': None,
+    }
+
+    if numpy is not None:
+        addrs = numpy.array(destinations, dtype=numpy.uint32)
+        started = default_timer()
+        router.compiled_fib()
+        result['batch_compile_sec'] = default_timer() - started
+        started = default_timer()
+        router.route_many(addrs)
+        result['batch_per_sec'] = lookups / (default_timer() - started)
+
+    if router.flow_cache is not None:
+        result['cache'] = router.cache_stats()
+    # tbl24 of DIR-24-8 alone takes 64 MB
+    result['peak_rss_kb'] = peak_rss_kb()
+
+    if dir24:
+        started = default_timer()
+        dir24_fib = Dir24Fib.from_router(router)
+        result['dir24_compile_sec'] = default_timer() - started
+        lookup = dir24_fib.lookup
+        started = default_timer()
+        for addr in destinations:
+            lookup(addr)
+        result['dir24_lookup_per_sec'] = lookups / (default_timer() - started)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Router benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skew', type=float, default=3.0)
+    parser.add_argument('--cache-size', type=int, default=None)
+    parser.add_argument('--dir24', action='store_true',
+                        help='also measure DIR-24-8 FIB (64 MB table)')
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        result = run_benchmark(
+            size, args.lookups, args.seed, args.cache_size, args.skew,
+            args.dir24
+        )
+        print json.dumps(result, sort_keys=True)
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
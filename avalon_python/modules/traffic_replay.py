@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+'''
+Replay of captured traffic through routing table: where would it go.
+Destinations are read in chunks and matched against one FIB version,
+packets and bytes are summed per egress interface and per matched prefix.
+Memory depends on chunk size and routing table size, not on input size.
+
+Input formats:
+    text: "address" or "address bytes" per line, # comments are skipped
+    bin: big endian uint32 destination per record
+    bin-sized: big endian uint32 destination and uint32 bytes per record
+
+Usage:
+    python -m avalon_python.modules.traffic_replay --routes routes.txt \\
+        --interfaces interfaces.txt --fmt bin flows.bin
+'''
+import argparse
+import json
+import sys
+from array import array
+from itertools import islice
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from avalon_python.modules.ecmp import select
+from avalon_python.modules.ipv4_parser import parse_many
+from avalon_python.modules.prefix_trie import ADDR_MAX, prefix_len_to_mask
+from avalon_python.modules.router import Router, IPv4Address
+
+DEFAULT_CHUNK = 1 << 16
+RECORD_SIZES = {'bin': 4, 'bin-sized': 8}
+
+
+def read_full(f, size):
+    ''' read size bytes, less only at the end of file (pipes may return less) '''
+    chunks = []
+    while size:
+        chunk = f.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def iter_text_chunks(f, chunk_size=DEFAULT_CHUNK, default_size=0):
+    '''
+        (addresses, sizes, bad row count) for every chunk of text lines,
+        addresses and sizes are lists of integers
+    '''
+    while True:
+        lines = list(islice(f, chunk_size))
+        if not lines:
+            return
+        fields = [line.split() for line in lines]
+        fields = [
+            row for row in fields if row and not row[0].startswith('#')
+        ]
+        addrs, bad_rows = parse_many([row[0] for row in fields])
+        bad_rows = set(int(row) for row in bad_rows)
+
+        chunk_addrs = []
+        sizes = []
+        for row, (addr, columns) in enumerate(zip(addrs, fields)):
+            if row in bad_rows or len(columns) > 2:
+                bad_rows.add(row)
+                continue
+            if len(columns) == 2:
+                if not columns[1].isdigit():
+                    bad_rows.add(row)
+                    continue
+                sizes.append(int(columns[1]))
+            else:
+                sizes.append(default_size)
+            chunk_addrs.append(int(addr))
+        yield chunk_addrs, sizes, len(bad_rows)
+
+
+def iter_binary_chunks(f, chunk_size=DEFAULT_CHUNK, default_size=0,
+                       sized=False):
+    '''
+        (addresses, sizes, bad row count) for every chunk of records,
+        truncated last record is counted as bad row
+    '''
+    record_size = 8 if sized else 4
+    while True:
+        data = read_full(f, chunk_size * record_size)
+        if not data:
+            return
+        bad = 1 if len(data) % record_size else 0
+        data = data[:len(data) - len(data) % record_size]
+
+        if numpy is not None:
+            values = numpy.frombuffer(data, dtype='>u4').astype(numpy.uint32)
+        else:
+            values = array('I')
+            assert values.itemsize == 4
+            values.fromstring(data)
+            if sys.byteorder == 'little':
+                values.byteswap()
+        if sized:
+            yield values[0::2], values[1::2], bad
+        else:
+            yield values, [default_size] * len(values), bad
+
+
+class TrafficCounters(object):
+    '''
+        packets and bytes per interface (None - next hop is not resolved),
+        per matched prefix (prefix, prefix_len) and without route
+    '''
+    def __init__(self):
+        self.ifaces = {}
+        self.prefixes = {}
+        self.no_route = [0, 0]
+        self.bad_rows = 0
+
+    @staticmethod
+    def _add(counters, key, packets, size):
+        counter = counters.get(key)
+        if counter is None:
+            counter = counters[key] = [0, 0]
+        counter[0] += packets
+        counter[1] += size
+
+    def add_iface(self, iface, packets, size):
+        self._add(self.ifaces, iface, packets, size)
+
+    def add_prefix(self, prefix, prefix_len, packets, size):
+        self._add(self.prefixes, (prefix, prefix_len), packets, size)
+
+    def report(self):
+        ''' counters as json-friendly dict '''
+        return {
+            'interfaces': dict(
+                (iface, {'packets': packets, 'bytes': size})
+                for iface, (packets, size) in self.ifaces.iteritems()
+            ),
+            'prefixes': dict(
+                ('%s/%s' % (IPv4Address(prefix), prefix_len),
+                 {'packets': packets, 'bytes': size})
+                for (prefix, prefix_len), (packets, size)
+                in self.prefixes.iteritems()
+            ),
+            'no_route': {
+                'packets': self.no_route[0], 'bytes': self.no_route[1]
+            },
+            'bad_rows': self.bad_rows,
+        }
+
+
+def iter_chunks(source, fmt='text', chunk_size=DEFAULT_CHUNK, default_size=0):
+    ''' chunks of file object in one of input formats '''
+    if fmt == 'text':
+        return iter_text_chunks(source, chunk_size, default_size)
+    if fmt in RECORD_SIZES:
+        return iter_binary_chunks(
+            source, chunk_size, default_size, sized=fmt == 'bin-sized'
+        )
+    raise ValueError('unknown traffic format %r' % fmt)
+
+
+def replay(router, source, fmt='text', chunk_size=DEFAULT_CHUNK,
+           default_size=0):
+    '''
+        match destinations of file name or file object against current
+        FIB version of router, default_size is bytes of packet without size,
+        returns TrafficCounters
+    '''
+    if isinstance(source, basestring):
+        with open(source, 'rb') as f:
+            return replay(router, f, fmt, chunk_size, default_size)
+
+    counters = TrafficCounters()
+    if numpy is not None:
+        fib = router.compiled_fib()
+        account = lambda addrs, sizes: _account_batch(
+            fib, counters, addrs, sizes
+        )
+    else:
+        fib = router.fib
+        account = lambda addrs, sizes: _account_each(
+            router, fib, counters, addrs, sizes
+        )
+
+    for addrs, sizes, bad_rows in iter_chunks(
+            source, fmt, chunk_size, default_size):
+        counters.bad_rows += bad_rows
+        if len(addrs):
+            account(addrs, sizes)
+    return counters
+
+
+def _account_batch(fib, counters, addrs, sizes):
+    ''' count chunk with batch lookup in CompiledFib '''
+    addrs = numpy.asarray(addrs, dtype=numpy.uint32)
+    sizes = numpy.asarray(sizes, dtype=numpy.int64)
+    next_hop_idx, prefix_len = fib.match_many(addrs)
+
+    routed = next_hop_idx >= 0
+    counters.no_route[0] += int(addrs.size - numpy.count_nonzero(routed))
+    counters.no_route[1] += int(sizes[~routed].sum())
+    if not routed.any():
+        return
+    addrs = addrs[routed]
+    sizes = sizes[routed]
+    next_hop_idx = next_hop_idx[routed]
+    prefix_len = prefix_len[routed].astype(numpy.uint64)
+
+    # unresolved interface -1 goes to slot 0
+    slots = fib.next_hop_iface[next_hop_idx] + 1
+    _account_keys(
+        slots, sizes,
+        lambda slot: fib.interfaces[slot - 1] if slot else None,
+        counters.add_iface
+    )
+
+    # key is prefix followed by 6 bits of prefix length
+    masks = (numpy.uint64(ADDR_MAX) << (numpy.uint64(32) - prefix_len)) \
+        & numpy.uint64(ADDR_MAX)
+    keys = ((addrs.astype(numpy.uint64) & masks) << numpy.uint64(6)) \
+        | prefix_len
+    _account_keys(
+        keys, sizes,
+        lambda key: (int(key) >> 6, int(key) & 0x3F),
+        lambda key, packets, size: counters.add_prefix(
+            key[0], key[1], packets, size
+        )
+    )
+
+
+def _account_keys(keys, sizes, decode, add):
+    ''' sum packets and bytes of equal keys '''
+    unique, inverse = numpy.unique(keys, return_inverse=True)
+    packets = numpy.bincount(inverse, minlength=unique.size)
+    size = numpy.bincount(inverse, weights=sizes, minlength=unique.size)
+    for key, key_packets, key_size in zip(unique, packets, size):
+        add(decode(key), int(key_packets), int(key_size))
+
+
+def _account_each(router, fib, counters, addrs, sizes):
+    ''' count chunk with lookups in PrefixTrie, used without numpy '''
+    groups = router.next_hop_groups
+    by_prefix = {}
+    by_next_hop = {}
+    for addr, size in zip(addrs, sizes):
+        match = fib.match(addr)
+        if match is None:
+            counters.no_route[0] += 1
+            counters.no_route[1] += size
+            continue
+        prefix_len, group = match
+        next_hop = select(groups[group][1], addr)
+        prefix = (addr & prefix_len_to_mask(prefix_len), prefix_len)
+        for counts, key in ((by_prefix, prefix), (by_next_hop, next_hop)):
+            counter = counts.get(key)
+            if counter is None:
+                counter = counts[key] = [0, 0]
+            counter[0] += 1
+            counter[1] += size
+
+    for next_hop, (packets, size) in by_next_hop.iteritems():
+        counters.add_iface(next_hop.iface, packets, size)
+    for (prefix, prefix_len), (packets, size) in by_prefix.iteritems():
+        counters.add_prefix(prefix, prefix_len, packets, size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Traffic replay')
+    parser.add_argument('traffic', help='file with destinations, - is stdin')
+    parser.add_argument('--routes', required=True,
+                        help='route dump, see Router.load_routes')
+    parser.add_argument('--interfaces', default=None,
+                        help='file with "name address mask" lines')
+    parser.add_argument('--fmt', default='text',
+                        choices=['text'] + sorted(RECORD_SIZES))
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK)
+    parser.add_argument('--default-size', type=int, default=0,
+                        help='bytes of packet without size')
+    args = parser.parse_args(argv)
+
+    router = Router()
+    if args.interfaces:
+        router.load_interfaces(args.interfaces)
+    router.load_routes(args.routes)
+
+    source = sys.stdin if args.traffic == '-' else args.traffic
+    counters = replay(
+        router, source, args.fmt, args.chunk_size, args.default_size
+    )
+    print json.dumps(counters.report(), sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
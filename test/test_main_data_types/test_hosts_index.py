@@ -0,0 +1,274 @@
+#-*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from avalon_python.main_data_types import hosts_index
+from avalon_python.main_data_types.hosts_index import (
+    HostsIndex, append_lines, format_tombstone
+)
+from avalon_python.main_data_types.resolver import (
+    parse_hosts_file, get_index, add_resolv_record, remove_resolv_record
+)
+
+HOSTS = '''127.0.0.1\tlocalhost
+# comment
+
+10.0.0.1\tdb1
+10.0.0.2\tdb2
+'''
+
+
+class TestHostsIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'hosts')
+        self.write(HOSTS)
+        self.index = HostsIndex(self.filename)
+
+    def tearDown(self):
+        self.index.unwatch()
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, data, mode='wb'):
+        with open(self.filename, mode) as f:
+            f.write(data)
+
+    def test_add_many(self):
+        ''' add_many должен пропускать дубликаты и дописывать группами '''
+        records = [
+            ('10.0.0.1', 'db1'), ('10.0.0.3', 'db3'), ('10.0.0.3', 'db3'),
+            ('10.0.0.2', 'web2'), ('10.0.0.4', 'db4'), ('10.0.0.5', 'db5'),
+        ]
+        with mock.patch.object(
+                hosts_index, 'append_lines', wraps=append_lines) as append:
+            counts = self.index.add_many(records, batch_size=2)
+        self.assertEqual(
+            counts, {'added': 3, 'duplicates': 2, 'conflicts': 1}
+        )
+        # две группы: по числу batch_size записей и остаток
+        self.assertEqual(append.call_count, 2)
+        self.assertEqual(append.call_args[0][2], True)
+        self.assertEqual(self.index.get('10.0.0.2'), 'db2')
+        self.assertEqual(len(self.index), 6)
+
+        counts = self.index.add_many([('10.0.0.2', 'web2')], replace=True)
+        self.assertEqual(counts['added'], 1)
+        self.assertEqual(self.index.get('10.0.0.2'), 'web2')
+
+    def test_import_lines(self):
+        ''' import_lines должен считать строки, не являющиеся записями '''
+        lines = [
+            '# header\n', '\n', '10.0.0.3 db3\n', 'db4\n',
+            '10.0.0.300 db5\n', '-\t10.0.0.1\n', '10.0.0.1 db1\n',
+        ]
+        self.assertEqual(self.index.import_lines(lines), {
+            'added': 1, 'duplicates': 1, 'conflicts': 0, 'bad': 3,
+        })
+        self.assertEqual(self.index.get('10.0.0.3'), 'db3')
+
+    def test_load(self):
+        ''' HostsIndex должен загружать записи в порядке файла '''
+        self.assertEqual(self.index.items(), [
+            ('127.0.0.1', 'localhost'), ('10.0.0.1', 'db1'),
+            ('10.0.0.2', 'db2'),
+        ])
+        self.assertEqual(self.index.reloads, 1)
+
+    def test_same_as_parse_hosts_file(self):
+        ''' HostsIndex должен давать те же записи, что parse_hosts_file '''
+        self.write('1.1.1.1 a\n2.2.2.2 b\n1.1.1.1 c\n')
+        self.assertEqual(
+            self.index.items(), parse_hosts_file(self.filename).items()
+        )
+
+    def test_unchanged(self):
+        ''' HostsIndex не должен читать неизменившийся файл '''
+        self.index.items()
+        self.index.items()
+        self.assertEqual((self.index.reloads, self.index.updates), (1, 0))
+
+    def test_append(self):
+        ''' HostsIndex должен дочитывать только дописанные строки '''
+        self.index.items()
+        self.write('10.0.0.3\tdb3\n', 'ab')
+        self.assertEqual(self.index.get('10.0.0.3'), 'db3')
+        self.assertEqual((self.index.reloads, self.index.updates), (1, 1))
+
+    def test_partial_line(self):
+        ''' HostsIndex должен перечитывать недописанную последнюю строку '''
+        self.write('10.0.0.3\tdb', 'ab')
+        self.assertEqual(self.index.get('10.0.0.3'), 'db')
+        self.write('3\n10.0.0.4\tdb4\n', 'ab')
+        self.assertEqual(self.index.get('10.0.0.3'), 'db3')
+        self.assertEqual(self.index.get('10.0.0.4'), 'db4')
+        self.assertEqual(len(self.index), 5)
+
+    def test_rewrite(self):
+        ''' HostsIndex должен перечитывать перезаписанный файл целиком '''
+        self.index.items()
+        # файл стал длиннее, но начало изменилось
+        self.write(HOSTS.replace('db', 'dc') + '10.0.0.3\tdc3\n')
+        self.assertEqual(
+            [name for ip, name in self.index.items()],
+            ['localhost', 'dc1', 'dc2', 'dc3']
+        )
+        self.assertEqual(self.index.reloads, 2)
+
+    def test_head_tail(self):
+        ''' head и tail должны совпадать с началом и концом items '''
+        self.write('1.1.1.1\ta\n2.2.2.2\tb\n1.1.1.1\tc\n')
+        self.assertEqual(self.index.head(1), [('1.1.1.1', 'c')])
+        self.assertEqual(self.index.tail(1), [('2.2.2.2', 'b')])
+        # удаленный и снова добавленный ip переходит в конец
+        append_lines(self.filename, format_tombstone('1.1.1.1') +
+                     '3.3.3.3\td\n1.1.1.1\tc\n')
+        expected = parse_hosts_file(self.filename).items()
+        self.assertEqual(self.index.items(), expected)
+        self.assertEqual(self.index.head(2), expected[:2])
+        self.assertEqual(self.index.tail(2), expected[-2:])
+        self.assertEqual(self.index.tail(10), expected)
+        self.assertEqual(self.index.head(0), [])
+        self.assertEqual(self.index.tail(0), [])
+        self.index.compact()
+        self.assertEqual(self.index.tail(2), expected[-2:])
+        # последняя запись без перевода строки
+        self.write('4.4.4.4\te', 'ab')
+        self.assertEqual(self.index.tail(1), [('4.4.4.4', 'e')])
+
+    def test_find(self):
+        ''' find должен находить добавленные и не находить удаленные имена '''
+        self.assertEqual(sorted(self.index.find('db')), [
+            ('10.0.0.1', 'db1'), ('10.0.0.2', 'db2'),
+        ])
+        self.write('10.0.0.3\tdb3\n10.0.0.1\tweb1\n', 'ab')
+        self.assertEqual(sorted(self.index.find('db')), [
+            ('10.0.0.2', 'db2'), ('10.0.0.3', 'db3'),
+        ])
+        self.write(HOSTS)
+        self.assertEqual(list(self.index.find('db3')), [])
+
+    def test_match_domains(self):
+        ''' match_domains должен учитывать добавленные и удаленные имена '''
+        self.write('10.0.0.3\tdb3.prod\n10.0.0.4\tweb.prod\n', 'ab')
+        self.assertEqual(sorted(self.index.match_domains('*.prod')), [
+            ('10.0.0.3', 'db3.prod'), ('10.0.0.4', 'web.prod'),
+        ])
+        append_lines(self.filename, format_tombstone('10.0.0.4'))
+        self.assertEqual(list(self.index.match_domains('w*.prod')), [])
+
+    def test_in_network(self):
+        ''' in_network и in_range должны отдавать записи по порядку адресов '''
+        self.write('10.0.0.10\tdb10\n9.0.0.1\tnine\nhost\tname\n', 'ab')
+        self.assertEqual(self.index.in_network('10.0.0.0/28'), [
+            ('10.0.0.1', 'db1'), ('10.0.0.2', 'db2'), ('10.0.0.10', 'db10'),
+        ])
+        self.assertEqual(self.index.in_range('9.0.0.1', '10.0.0.1'), [
+            ('9.0.0.1', 'nine'), ('10.0.0.1', 'db1'),
+        ])
+        append_lines(self.filename, format_tombstone('10.0.0.1'))
+        self.assertEqual(
+            [ip for ip, name in self.index.items_by_ip()],
+            ['9.0.0.1', '10.0.0.2', '10.0.0.10', '127.0.0.1', 'host']
+        )
+        self.assertRaises(ValueError, self.index.in_range, 'a', '10.0.0.1')
+
+    def test_missing_file(self):
+        ''' HostsIndex должен быть пустым без файла '''
+        os.remove(self.filename)
+        self.assertEqual(self.index.items(), [])
+
+    def test_resolver_commands(self):
+        ''' add и remove резолвера должны быть видны в индексе '''
+        index = get_index(self.filename)
+        self.assertEqual(len(index), 3)
+        add_resolv_record('10.0.0.3', 'db3', self.filename)
+        self.assertEqual(index.get('10.0.0.3'), 'db3')
+        remove_resolv_record('10.0.0.1', self.filename)
+        self.assertEqual(index.get('10.0.0.1'), None)
+        self.assertEqual(len(index), 3)
+
+    def test_tombstones(self):
+        ''' надгробие должно удалять ip из индекса и parse_hosts_file '''
+        self.index.items()
+        append_lines(self.filename, format_tombstone('10.0.0.1'))
+        append_lines(self.filename, format_tombstone('10.9.9.9'))
+        expected = [('127.0.0.1', 'localhost'), ('10.0.0.2', 'db2')]
+        self.assertEqual(self.index.items(), expected)
+        self.assertEqual(parse_hosts_file(self.filename).items(), expected)
+        self.assertEqual(list(self.index.find('db1')), [])
+        self.assertEqual(self.index.reloads, 1)
+        self.assertEqual(self.index.garbage(), 3)
+
+    def test_remove_appends(self):
+        ''' remove_resolv_record должен только дописывать надгробие '''
+        remove_resolv_record('10.0.0.1', self.filename)
+        remove_resolv_record('10.0.0.1', self.filename)
+        with open(self.filename) as f:
+            self.assertEqual(f.read(), HOSTS + '-\t10.0.0.1\n')
+
+    def test_compact(self):
+        ''' compact должен оставлять в файле одни живые записи '''
+        append_lines(self.filename, '10.0.0.2\tdb3\n' + format_tombstone(
+            '127.0.0.1'
+        ))
+        self.index.compact()
+        with open(self.filename) as f:
+            self.assertEqual(f.read(), '10.0.0.1\tdb1\n10.0.0.2\tdb3\n')
+        self.assertEqual(self.index.garbage(), 0)
+        # индекс продолжает дочитывать новый файл
+        append_lines(self.filename, '10.0.0.4\tdb4\n')
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual((self.index.reloads, self.index.updates), (1, 1))
+        self.assertEqual(self.index.items(), HostsIndex(self.filename).items())
+        self.assertEqual(os.listdir(self.tmp_dir), ['hosts'])
+
+    def test_compact_append_race(self):
+        ''' compact не должен терять запись, дописанную сразу после rename '''
+        atomic_write = hosts_index.atomic_write
+
+        def write_and_append(filename, chunks):
+            st = atomic_write(filename, chunks)
+            append_lines(filename, '10.0.0.4\tdb4\n')
+            return st
+
+        with mock.patch.object(hosts_index, 'atomic_write',
+                               write_and_append):
+            self.index.compact()
+        self.assertEqual(self.index.get('10.0.0.4'), 'db4')
+        append_lines(self.filename, '10.0.0.5\tdb5\n')
+        self.assertEqual(self.index.items(), HostsIndex(self.filename).items())
+
+    def test_maybe_compact(self):
+        ''' remove_resolv_record должен сжимать файл после порога '''
+        index = get_index(self.filename)
+        with mock.patch.object(hosts_index, 'COMPACT_MIN', 1):
+            remove_resolv_record('10.0.0.1', self.filename)
+            self.assertEqual(index._compactor, None)
+            remove_resolv_record('10.0.0.2', self.filename)
+            index._compactor.join()
+        with open(self.filename) as f:
+            self.assertEqual(f.read(), '127.0.0.1\tlocalhost\n')
+        self.assertEqual(index.items(), [('127.0.0.1', 'localhost')])
+
+    @unittest.skipIf(hosts_index.pyinotify is None,
+                     'pyinotify is not installed')
+    def test_watch(self):
+        ''' HostsIndex под watch должен замечать изменения по inotify '''
+        self.assertTrue(self.index.watch())
+        self.assertEqual(len(self.index), 3)
+        self.write('10.0.0.3\tdb3\n', 'ab')
+        deadline = time.time() + 5
+        while self.index.get('10.0.0.3') is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.index.get('10.0.0.3'), 'db3')
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestHostsIndex))
+    return suite
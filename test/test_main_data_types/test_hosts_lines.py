@@ -0,0 +1,58 @@
+#-*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from avalon_python.main_data_types.hosts_index import (
+    append_lines, format_record
+)
+from avalon_python.main_data_types.hosts_lines import LineIndex
+
+
+def make_lines(count):
+    return [format_record('10.0.%d.%d' % (i // 256, i % 256), 'h%d' % i)
+            for i in xrange(count)]
+
+
+class TestHostsLines(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'hosts')
+        self.lines = make_lines(1000)
+        with open(self.filename, 'wb') as f:
+            f.write('# hosts\n' + ''.join(self.lines))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def records(self, start, stop):
+        return [tuple(line.split()) for line in self.lines[start:stop]]
+
+    def test_line_index(self):
+        ''' LineIndex должен читать строки из середины файла '''
+        index = LineIndex(self.filename, step=16)
+        self.assertEqual(index.read_lines(1, 2), self.lines[0:2])
+        self.assertEqual(index.read_records(500, 3), self.records(499, 502))
+        self.assertEqual(len(index.offsets), 63)
+        self.assertEqual(index.read_lines(1000, 5), self.lines[999:])
+        self.assertEqual(index.read_lines(1001, 5), [])
+
+    def test_line_index_update(self):
+        ''' LineIndex должен дочитывать дописанный файл и читать замененный '''
+        index = LineIndex(self.filename, step=16)
+        index.update()
+        append_lines(self.filename, format_record('10.9.9.9', 'new') + 'x')
+        self.assertEqual(index.read_records(1001, 5), [('10.9.9.9', 'new')])
+        self.assertEqual(index.lines, 1002)
+
+        with open(self.filename, 'wb') as f:
+            f.write(''.join(self.lines[500:]))
+        self.assertEqual(index.read_records(0, 1), self.records(500, 501))
+        self.assertEqual(index.lines, 500)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestHostsLines))
+    return suite
@@ -0,0 +1,83 @@
+#-*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from avalon_python.main_data_types.hosts_index import (
+    append_lines, format_record
+)
+from avalon_python.main_data_types.hosts_service import (
+    HostsService, HostsClient, measure_load, make_queries
+)
+
+HOSTS = '''127.0.0.1\tlocalhost
+10.0.0.1\tdb1
+10.0.0.2\tdb2
+'''
+
+
+class TestHostsService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'hosts')
+        with open(self.filename, 'wb') as f:
+            f.write(HOSTS)
+        self.service = HostsService(self.filename, port=0)
+        self.service.start()
+
+    def tearDown(self):
+        self.service.shutdown()
+        shutil.rmtree(self.tmp_dir)
+
+    def check_client(self, proto):
+        client = HostsClient(self.service.address, proto)
+        try:
+            self.assertEqual(client.resolve('db1'), '10.0.0.1')
+            self.assertEqual(client.resolve('10.0.0.2'), 'db2')
+            self.assertEqual(client.resolve('web'), None)
+            self.assertEqual(
+                client.resolve_many(['localhost', 'db9', '10.0.0.1']),
+                ['127.0.0.1', None, 'db1']
+            )
+            # сервис видит дописанные записи
+            append_lines(self.filename, format_record('10.0.0.3', 'web'))
+            self.assertEqual(client.resolve('web'), '10.0.0.3')
+        finally:
+            client.close()
+
+    def test_udp(self):
+        ''' сервис должен отвечать на прямые и обратные запросы по UDP '''
+        self.check_client('udp')
+
+    def test_tcp(self):
+        ''' сервис должен отвечать на запросы подряд в TCP соединении '''
+        self.check_client('tcp')
+
+    def test_bad_tcp_request(self):
+        ''' сервис должен закрывать соединение на неверном запросе '''
+        client = HostsClient(self.service.address, 'tcp')
+        try:
+            self.assertRaises(EOFError, client.resolve, 'db1 db2')
+        finally:
+            client.close()
+
+    def test_measure_load(self):
+        ''' measure_load должен считать ответы и задержки всех клиентов '''
+        queries = make_queries(self.filename, 200) + ['missing']
+        for proto in ('udp', 'tcp'):
+            result = measure_load(self.service.address, queries, 4, proto)
+            self.assertEqual(result['queries'], 201)
+            self.assertEqual(result['found'], 200)
+            self.assertEqual(result['missing'], 1)
+            self.assertEqual(result['timeouts'], 0)
+            self.assertTrue(result['queries_per_sec'] > 0)
+            self.assertTrue(
+                result['latency_us']['p50'] <= result['latency_us']['max']
+            )
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestHostsService))
+    return suite
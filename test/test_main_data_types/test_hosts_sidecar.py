@@ -0,0 +1,127 @@
+#-*- encoding: utf-8 -*-
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from avalon_python.main_data_types import hosts_sidecar
+from avalon_python.main_data_types.hosts_index import (
+    HostsIndex, append_lines, format_record, format_tombstone
+)
+from avalon_python.main_data_types.hosts_sidecar import (
+    HostsSidecar, StaleSidecar, open_sidecar, sidecar_name
+)
+from avalon_python.main_data_types.resolver import resolv_request
+
+HOSTS = '''127.0.0.1\tlocalhost
+# comment
+10.0.0.1\tdb1
+10.0.0.2\tdb2
+10.0.0.3\tdb
+-\t10.0.0.3
+10.0.0.4\tdb2
+'''
+
+
+class TestHostsSidecar(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, 'hosts')
+        with open(self.filename, 'wb') as f:
+            f.write(HOSTS)
+        self.sidecar = open_sidecar(self.filename)
+
+    def tearDown(self):
+        self.sidecar.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_resolve(self):
+        ''' resolve должен находить имя по ip и ip по имени '''
+        self.assertEqual(self.sidecar.resolve('10.0.0.1'), 'db1')
+        self.assertEqual(self.sidecar.resolve('localhost'), '127.0.0.1')
+        self.assertEqual(self.sidecar.resolve('db2'), '10.0.0.2')
+        self.assertEqual(self.sidecar.resolve('10.0.0.3'), None)
+        self.assertEqual(self.sidecar.resolve('db'), None)
+        self.assertEqual(self.sidecar.resolve('10.0.0.9'), None)
+        self.assertEqual(self.sidecar.resolve('web'), None)
+
+    def test_appended(self):
+        ''' resolve должен учитывать строки, дописанные после построения '''
+        append_lines(
+            self.filename,
+            format_tombstone('10.0.0.2') + format_record('10.0.0.5', 'db') +
+            format_record('10.0.0.1', 'web1')
+        )
+        self.assertEqual(self.sidecar.resolve('db2'), '10.0.0.4')
+        self.assertEqual(self.sidecar.resolve('10.0.0.2'), None)
+        self.assertEqual(self.sidecar.resolve('db'), '10.0.0.5')
+        self.assertEqual(self.sidecar.resolve('db1'), None)
+        self.assertEqual(self.sidecar.resolve('10.0.0.1'), 'web1')
+
+    def test_unterminated_line(self):
+        ''' resolve должен видеть последнюю запись без перевода строки '''
+        with open(self.filename, 'wb') as f:
+            f.write('1.1.1.1\ta\n2.2.2.2\tb')
+        self.assertEqual(resolv_request('2.2.2.2', self.filename), 'b')
+        self.assertEqual(resolv_request('b', self.filename), '2.2.2.2')
+        append_lines(self.filename, 'x\n' + '1.1.1.1\tc')
+        self.assertEqual(resolv_request('b', self.filename), None)
+        self.assertEqual(resolv_request('bx', self.filename), '2.2.2.2')
+        self.assertEqual(resolv_request('1.1.1.1', self.filename), 'c')
+        self.assertEqual(resolv_request('a', self.filename), None)
+
+    def test_stale(self):
+        ''' индекс должен устаревать при перезаписи файла hosts '''
+        HostsIndex(self.filename).compact()
+        self.assertRaises(StaleSidecar, self.sidecar.resolve, 'db1')
+        self.assertRaises(StaleSidecar, HostsSidecar, self.filename)
+        sidecar = open_sidecar(self.filename)
+        self.assertEqual(sidecar.resolve('db1'), '10.0.0.1')
+        sidecar.close()
+
+    def test_bad_index(self):
+        ''' открытие испорченного индекса должно перестраивать его '''
+        with open(sidecar_name(self.filename), 'wb') as f:
+            f.write('HIDX')
+        self.assertRaises(StaleSidecar, HostsSidecar, self.filename)
+        sidecar = open_sidecar(self.filename)
+        self.assertEqual(sidecar.resolve('db1'), '10.0.0.1')
+        sidecar.close()
+
+    def test_rebuild_after_growth(self):
+        ''' resolv_request должен перестраивать индекс после роста файла '''
+        self.assertEqual(resolv_request('db1', self.filename), '10.0.0.1')
+        with mock.patch.object(hosts_sidecar, 'REBUILD_TAIL', 0):
+            append_lines(self.filename, ''.join(
+                format_record('10.1.0.%d' % i, 'h%d' % i) for i in xrange(50)
+            ))
+            self.assertEqual(resolv_request('h7', self.filename), '10.1.0.7')
+        self.assertEqual(HostsSidecar(self.filename).ip_count, 54)
+
+    def test_random(self):
+        ''' resolve должен совпадать с индексом в памяти '''
+        rnd = random.Random(1)
+        lines = []
+        for _ in xrange(500):
+            ip = '10.0.%d.%d' % (rnd.randint(0, 3), rnd.randint(0, 50))
+            if rnd.random() < 0.2:
+                lines.append(format_tombstone(ip))
+            else:
+                lines.append(format_record(ip, 'h%d' % rnd.randint(0, 300)))
+        with open(self.filename, 'wb') as f:
+            f.write(''.join(lines))
+        sidecar = open_sidecar(self.filename)
+        records = HostsIndex(self.filename).items()
+        for ip, name in records:
+            self.assertEqual(sidecar.resolve(ip), name)
+            self.assertEqual(dict(records)[sidecar.resolve(name)], name)
+        sidecar.close()
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestHostsSidecar))
+    return suite
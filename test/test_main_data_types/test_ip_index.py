@@ -0,0 +1,88 @@
+#-*- encoding: utf-8 -*-
+import random
+import unittest
+
+from avalon_python.main_data_types.ip_index import (
+    IPIndex, ip_to_int, int_to_ip, padded_ip, parse_network
+)
+
+
+class TestIPIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = IPIndex()
+        for ip in ('10.0.0.2', '10.0.1.1', '9.255.255.255', '10.0.0.1',
+                   'localhost', '192.168.0.1'):
+            self.index.add(ip)
+
+    def test_ip_to_int(self):
+        ''' ip_to_int должен принимать только канонические ipv4 адреса '''
+        self.assertEqual(ip_to_int('10.0.0.1'), 0x0A000001)
+        for ip in ('10.0.0', '10.0.0.256', 'db1', '1.2.3.x', '', '10.0.0.01'):
+            self.assertEqual(ip_to_int(ip), None)
+
+    def test_format(self):
+        ''' int_to_ip и padded_ip должны форматировать адрес '''
+        self.assertEqual(int_to_ip(0x0A000001), '10.0.0.1')
+        self.assertEqual(padded_ip(0x0A000001), '010.000.000.001')
+
+    def test_parse_network(self):
+        ''' parse_network должен отдавать границы сети '''
+        self.assertEqual(
+            parse_network('10.0.0.7/24'), (0x0A000000, 0x0A0000FF)
+        )
+        self.assertEqual(parse_network('1.2.3.4/0'), (0, 0xFFFFFFFF))
+        self.assertEqual(parse_network('1.2.3.4/32'), (0x01020304,) * 2)
+        for network in ('1.2.3.4', '1.2.3.4/33', 'a/8'):
+            self.assertRaises(ValueError, parse_network, network)
+
+    def test_queries(self):
+        ''' network и between должны отдавать адреса по порядку '''
+        self.assertEqual(
+            self.index.network('10.0.0.0/16'),
+            ['10.0.0.1', '10.0.0.2', '10.0.1.1']
+        )
+        self.assertEqual(
+            self.index.between(ip_to_int('9.0.0.0'), ip_to_int('10.0.0.1')),
+            ['9.255.255.255', '10.0.0.1']
+        )
+        self.assertEqual(self.index.network('11.0.0.0/8'), [])
+        self.assertEqual(len(self.index.ordered()), 5)
+
+    def test_remove(self):
+        ''' remove должен удалять и слитые, и еще не слитые адреса '''
+        self.index.ordered()
+        self.index.add('10.0.0.3')
+        self.index.remove('10.0.0.3')
+        self.index.remove('10.0.0.1')
+        self.index.remove('localhost')
+        self.assertEqual(
+            self.index.network('10.0.0.0/24'), ['10.0.0.2']
+        )
+        self.assertEqual(self.index.value('10.0.0.1'), None)
+
+    def test_random(self):
+        ''' запросы должны совпадать с перебором при вставке по одному '''
+        rnd = random.Random(1)
+        index = IPIndex()
+        ips = set()
+        for step in xrange(2000):
+            ip = int_to_ip(rnd.getrandbits(12) << 20)
+            if rnd.random() < 0.3:
+                index.remove(ip)
+                ips.discard(ip)
+            else:
+                index.add(ip)
+                ips.add(ip)
+            if step % 50 == 0:
+                self.assertEqual(
+                    index.network('128.0.0.0/1'),
+                    sorted((ip for ip in ips if ip_to_int(ip) >> 31),
+                           key=ip_to_int)
+                )
+        self.assertEqual(index.ordered(), sorted(ips, key=ip_to_int))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestIPIndex))
+    return suite
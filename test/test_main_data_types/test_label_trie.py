@@ -0,0 +1,67 @@
+#-*- encoding: utf-8 -*-
+import unittest
+
+from avalon_python.main_data_types.label_trie import LabelTrie
+
+NAMES = [
+    'db1.prod.example', 'db2.prod.example', 'web.prod.example',
+    'x.db1.prod.example', 'prod.example', 'db1.stage.example',
+    'Db3.PROD.example',
+]
+
+
+class TestLabelTrie(unittest.TestCase):
+    def setUp(self):
+        self.trie = LabelTrie()
+        for key, name in enumerate(NAMES):
+            self.trie.add(key, name)
+
+    def query(self, pattern):
+        return sorted(name for key, name in self.trie.query(pattern))
+
+    def test_subdomains(self):
+        ''' *.zone должен находить все имена внутри зоны, но не саму зону '''
+        self.assertEqual(self.query('*.prod.example'), [
+            'Db3.PROD.example', 'db1.prod.example', 'db2.prod.example',
+            'web.prod.example', 'x.db1.prod.example',
+        ])
+        self.assertEqual(self.query('*.db1.prod.example'),
+                         ['x.db1.prod.example'])
+        self.assertEqual(self.query('*.test'), [])
+        self.assertEqual(len(self.query('*')), len(NAMES))
+
+    def test_label_prefix(self):
+        ''' prefix*.zone должен находить имена зоны по началу первой метки '''
+        self.assertEqual(self.query('db*.prod.example'), [
+            'Db3.PROD.example', 'db1.prod.example', 'db2.prod.example',
+        ])
+        self.assertEqual(self.query('*.example'), sorted(NAMES))
+        self.assertEqual(self.query('w*.prod.example'), ['web.prod.example'])
+        self.assertEqual(self.query('prod*.example'), ['prod.example'])
+
+    def test_exact(self):
+        ''' шаблон без * должен находить имя целиком '''
+        self.assertEqual(self.query('PROD.example'), ['prod.example'])
+        self.assertEqual(self.query('example'), [])
+
+    def test_add_remove(self):
+        ''' add должен заменять имя ключа, remove - удалять пустые узлы '''
+        self.trie.add(0, 'db1.test')
+        self.assertEqual(self.query('db*.prod.example'), [
+            'Db3.PROD.example', 'db2.prod.example',
+        ])
+        self.assertEqual(self.query('*.test'), ['db1.test'])
+        self.trie.remove(0)
+        self.trie.remove(0)
+        self.assertEqual(self.query('*.test'), [])
+        self.assertFalse('test' in self.trie._root.children)
+        for key in xrange(1, len(NAMES)):
+            self.trie.remove(key)
+        self.assertEqual(self.trie._root.children, {})
+        self.assertEqual(len(self.trie), 0)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestLabelTrie))
+    return suite
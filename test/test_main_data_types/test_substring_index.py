@@ -0,0 +1,68 @@
+#-*- encoding: utf-8 -*-
+import random
+import unittest
+
+from avalon_python.main_data_types.substring_index import TrigramIndex
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex()
+        texts = ['db1.prod', 'db2.prod', 'web.stage', 'a']
+        for key, text in enumerate(texts):
+            self.index.add(key, text)
+
+    def search(self, phrase):
+        return sorted(self.index.search(phrase))
+
+    def test_search(self):
+        ''' search должен находить тексты с подстрокой '''
+        self.assertEqual(
+            self.search('.prod'), [(0, 'db1.prod'), (1, 'db2.prod')]
+        )
+        self.assertEqual(self.search('db2'), [(1, 'db2.prod')])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_short_phrase(self):
+        ''' search должен находить фразы короче триграммы '''
+        self.assertEqual(self.search('a'), [(2, 'web.stage'), (3, 'a')])
+
+    def test_candidates_are_verified(self):
+        ''' search не должен отдавать кандидатов без подстроки '''
+        # триграммы 'abcab' есть в 'abcxbcab', подстроки нет
+        self.index.add(4, 'abcxbcab')
+        self.assertTrue(4 in set(self.index.candidates('abcab')))
+        self.assertEqual(self.search('abcab'), [])
+
+    def test_add_remove(self):
+        ''' add должен заменять текст ключа, remove - удалять ключ '''
+        self.index.add(0, 'db9.test')
+        self.assertEqual(self.search('.prod'), [(1, 'db2.prod')])
+        self.index.remove(1)
+        self.index.remove(1)
+        self.assertEqual(self.search('.prod'), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_random(self):
+        ''' search должен совпадать с перебором '''
+        rnd = random.Random(1)
+        texts = dict(
+            (key, ''.join(
+                rnd.choice('abc.') for _ in xrange(rnd.randint(0, 8))
+            ))
+            for key in xrange(200)
+        )
+        index = TrigramIndex()
+        for key, text in texts.iteritems():
+            index.add(key, text)
+        for phrase in ['a', 'ab', 'abc', 'a.b', 'cab.', 'bbbb', '']:
+            self.assertEqual(
+                sorted(index.search(phrase)),
+                sorted((k, t) for k, t in texts.iteritems() if phrase in t)
+            )
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestTrigramIndex))
+    return suite
@@ -0,0 +1,91 @@
+#-*- encoding: utf-8 -*-
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from avalon_python.modules import dir24_8
+from avalon_python.modules.dir24_8 import Dir24Fib, MappedArray
+from avalon_python.modules.router import Router
+from test_router import ROUTES as ROUTER_ROUTES, make_router
+
+
+ROUTES = ROUTER_ROUTES + [
+    ('172.16.5.0', '255.255.255.0', '10.0.0.7'),
+    ('172.16.5.128', '255.255.255.128', '10.0.0.4'),
+    ('172.16.5.200', '255.255.255.255', '10.0.0.5'),
+    ('172.16.6.0', '255.255.255.252', '10.0.0.6'),
+]
+
+
+def random_addresses(count, seed=0):
+    rnd = random.Random(seed)
+    addrs = [rnd.getrandbits(32) for _ in xrange(count)]
+    # adresses around long prefixes
+    addrs += [0xAC100500 | octet for octet in xrange(256)]
+    addrs += [0xAC100600 | octet for octet in xrange(8)]
+    return addrs
+
+
+class TestDir24Fib(unittest.TestCase):
+    def setUp(self):
+        self.router = make_router(ROUTES)
+        self.fib = Dir24Fib.from_router(self.router)
+
+    def assertSameRoutes(self, fib):
+        for addr in random_addresses(500):
+            self.assertEqual(fib.route(addr), self.router.route(addr))
+
+    def test_route(self):
+        ''' Dir24Fib должен давать тот же результат что и Router.route '''
+        self.assertSameRoutes(self.fib)
+
+    def test_no_route(self):
+        ''' Dir24Fib должен падать при отсутствии маршрута '''
+        router = Router()
+        router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+        fib = Dir24Fib.from_router(router)
+        self.assertEqual(fib.lookup(0x08080808), -1)
+        self.assertRaises(ValueError, fib.route, 0x08080808)
+
+    def test_save_load(self):
+        ''' загруженный снимок должен давать тот же результат '''
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'fib.d248')
+            self.fib.save(path)
+            self.assertSameRoutes(Dir24Fib.load(path))
+
+            numpy = dir24_8.numpy
+            dir24_8.numpy = None
+            try:
+                fib = Dir24Fib.load(path)
+            finally:
+                dir24_8.numpy = numpy
+            self.assertTrue(isinstance(fib.tbl24, MappedArray))
+            self.assertSameRoutes(fib)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_load_wrong_file(self):
+        ''' load должен падать на файле другого формата '''
+        tmp_file = tempfile.NamedTemporaryFile()
+        tmp_file.write('x' * 64)
+        tmp_file.flush()
+        self.assertRaises(ValueError, Dir24Fib.load, tmp_file.name)
+
+    @unittest.skipIf(dir24_8.numpy is None, 'numpy is not installed')
+    def test_lookup_many(self):
+        ''' lookup_many должен совпадать с поштучным поиском '''
+        addrs = random_addresses(500, seed=1)
+        next_hop_idx, _ = self.fib.lookup_many(addrs)
+        self.assertEqual(
+            list(next_hop_idx), [self.fib.lookup(addr) for addr in addrs]
+        )
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestDir24Fib))
+    return suite
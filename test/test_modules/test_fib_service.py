@@ -0,0 +1,98 @@
+#-*- encoding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from avalon_python.modules.compiled_fib import CompiledFib, numpy
+from avalon_python.modules.fib_service import (
+    publish, FibServer, FibClient
+)
+from avalon_python.modules.router import Router
+from test_router import make_router
+
+ADDRESSES = [
+    '172.16.5.10', '172.16.5.11', '172.16.5.12', '172.16.6.10', '192.168.1.20',
+    '8.8.8.8', '11.0.0.1'
+]
+
+
+ROUTES = [
+    ('172.16.0.0', '255.255.0.0', '10.0.0.2'),
+    ('172.16.5.0', '255.255.255.0', '192.168.1.3'),
+    ('172.16.5.0', '255.255.255.0', '10.0.0.3'),
+    ('8.0.0.0', '255.0.0.0', '192.168.1.254'),
+]
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestFibService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fib_path = os.path.join(self.tmp_dir, 'router.fib')
+        self.router = make_router(ROUTES)
+        publish(self.router, self.fib_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_attach(self):
+        ''' подключенная таблица должна давать тот же результат '''
+        fib = CompiledFib.attach(self.fib_path)
+        expected = self.router.route_many(ADDRESSES)
+        result = fib.lookup_many(ADDRESSES)
+        self.assertEqual(list(result[0]), list(expected[0]))
+        self.assertEqual(list(result[1]), list(expected[1]))
+        self.assertEqual(fib.interfaces, ['fa0/0', 'fa0/1'])
+        self.assertEqual(fib.next_hops, self.router.compiled_fib().next_hops)
+
+    def test_attach_read_only(self):
+        ''' подключенная таблица не должна копироваться в память процесса '''
+        fib = CompiledFib.attach(self.fib_path)
+        _, prefixes, _ = fib.levels[0]
+        self.assertFalse(prefixes.flags.writeable)
+        self.assertFalse(prefixes.flags.owndata)
+
+    def test_attach_wrong_file(self):
+        ''' attach должен падать на файле другого формата '''
+        with open(self.fib_path, 'wb') as f:
+            f.write('x' * 64)
+        self.assertRaises(ValueError, CompiledFib.attach, self.fib_path)
+
+    def test_empty_table(self):
+        ''' attach должен работать с пустой таблицей '''
+        publish(Router(), self.fib_path)
+        fib = CompiledFib.attach(self.fib_path)
+        self.assertEqual(list(fib.lookup_many(['1.1.1.1'])[0]), [-1])
+
+    def test_socket_query(self):
+        ''' сервер должен отвечать на пакетные запросы '''
+        socket_path = os.path.join(self.tmp_dir, 'fib.sock')
+        server = FibServer(socket_path, CompiledFib.attach(self.fib_path))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            client = FibClient(socket_path)
+            next_hops, interfaces = client.tables()
+            next_hop_idx, iface_idx = client.route_many(ADDRESSES)
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        for addr, nh, iface in zip(ADDRESSES, next_hop_idx, iface_idx):
+            expected_iface, expected_next_hop = self.router.route(addr) \
+                if addr != '11.0.0.1' else (None, None)
+            if expected_next_hop is None:
+                self.assertEqual(nh, -1)
+                continue
+            self.assertEqual(next_hops[nh], expected_next_hop.dotted())
+            self.assertEqual(interfaces[iface], expected_iface)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestFibService))
+    return suite
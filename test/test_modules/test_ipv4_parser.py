@@ -0,0 +1,113 @@
+#-*- encoding: utf-8 -*-
+import mmap
+import random
+import socket
+import struct
+import tempfile
+import unittest
+
+from avalon_python.modules import ipv4_parser
+from avalon_python.modules.ipv4_parser import parse_many
+from avalon_python.modules.router import IPv4Address
+
+ROWS = [
+    '192.168.1.10',
+    '10.0.0.1\r',
+    '255.255.255.255',
+    '010.001.002.003',
+    '256.1.1.1',
+    '1.2.3',
+    '1.2.3.4.5',
+    '1..2.3',
+    '1.2.3.4 5',
+    'a.b.c.d',
+    '',
+    '1.2.3.0001',
+    '0.0.0.0',
+    ' 1.2.3.4',
+    '1.2.3.',
+]
+EXPECTED = [0xC0A8010A, 0x0A000001, 0xFFFFFFFF, 0x0A010203, 0, 0, 0, 0, 0,
+            0, 0, 0, 0, 0, 0]
+BAD_ROWS = [4, 5, 6, 7, 8, 9, 10, 11, 13, 14]
+
+
+class TestParseMany(unittest.TestCase):
+    def check(self, data):
+        addrs, bad_rows = parse_many(data)
+        self.assertEqual(list(addrs), EXPECTED)
+        self.assertEqual(list(bad_rows), BAD_ROWS)
+
+    def test_buffer(self):
+        ''' parse_many должен разбирать буфер с адресом в строке '''
+        self.check('\n'.join(ROWS) + '\n')
+        self.check(bytearray('\n'.join(ROWS)))
+
+    def test_sequence(self):
+        ''' parse_many должен разбирать последовательность строк '''
+        self.check(ROWS)
+        self.check(iter(ROWS))
+
+    def test_without_numpy(self):
+        ''' построчный разбор должен совпадать с векторным '''
+        numpy = ipv4_parser.numpy
+        ipv4_parser.numpy = None
+        try:
+            self.check(ROWS)
+            self.test_short_rows()
+        finally:
+            ipv4_parser.numpy = numpy
+
+    def test_random(self):
+        ''' parse_many должен совпадать с inet_aton '''
+        rnd = random.Random(3)
+        values = [rnd.getrandbits(32) for _ in xrange(1000)]
+        rows = [socket.inet_ntoa(struct.pack('>I', v)) for v in values]
+        addrs, bad_rows = parse_many(rows)
+        self.assertEqual(list(addrs), values)
+        self.assertEqual(len(bad_rows), 0)
+
+    def test_mmap(self):
+        ''' parse_many должен разбирать отображенный в память файл '''
+        with tempfile.TemporaryFile() as f:
+            f.write('\n'.join(ROWS))
+            f.flush()
+            self.check(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def test_empty(self):
+        ''' parse_many должен разбирать пустой буфер '''
+        addrs, bad_rows = parse_many('')
+        self.assertEqual((len(addrs), len(bad_rows)), (0, 0))
+
+    def test_short_rows(self):
+        ''' parse_many должен отмечать плохими короткие и пустые строки '''
+        for data, addrs, bad_rows in (
+                ('\n', [0], [0]),
+                ('.', [0], [0]),
+                (['', ''], [0, 0], [0, 1]),
+                (['1.2.3.4', ''], [0x01020304, 0], [1])):
+            result = parse_many(data)
+            self.assertEqual(map(list, result), [addrs, bad_rows])
+
+    def test_strict(self):
+        ''' parse_many(strict=True) должен сообщать строку с ошибкой '''
+        try:
+            parse_many(ROWS, strict=True)
+        except ValueError as e:
+            self.assertTrue('row 4' in str(e) and '256.1.1.1' in str(e))
+        else:
+            self.fail('ValueError is not raised')
+
+    def test_ipv4_address_many(self):
+        ''' IPv4Address.many должен создавать адреса из буфера '''
+        addrs = IPv4Address.many('10.0.0.1\n192.168.1.1\n')
+        self.assertEqual(
+            [addr.dotted() for addr in addrs], ['10.0.0.1', '192.168.1.1']
+        )
+        self.assertRaises(ValueError, IPv4Address.many, ['1.2.3.4', 'x'])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestParseMany))
+    return suite
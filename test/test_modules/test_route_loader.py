@@ -0,0 +1,151 @@
+#-*- encoding: utf-8 -*-
+import unittest
+import random
+from StringIO import StringIO
+
+from avalon_python.modules.router import Router, IPv4Address
+from avalon_python.modules.prefix_trie import PrefixTrie, prefix_len_to_mask
+from avalon_python.modules.route_loader import (
+    iter_routes, aggregate_routes
+)
+
+
+PLAIN_DUMP = '''# dest mask next_hop
+10.1.0.0 255.255.0.0 192.168.1.2
+
+10.2.0.0/16 192.168.1.3
+'''
+
+PROC_DUMP = '''Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT
+eth0\t00000000\t0101A8C0\t0003\t0\t0\t0\t00000000\t0\t0\t0
+eth0\t0001A8C0\t00000000\t0001\t0\t0\t0\t00FFFFFF\t0\t0\t0
+eth1\t0000000A\t00000000\t0000\t0\t0\t0\t000000FF\t0\t0\t0
+'''
+
+
+def lookup_all(routes, addrs):
+    trie = PrefixTrie()
+    for prefix, prefix_len, next_hop in routes:
+        trie.insert(prefix, prefix_len, next_hop, replace=False)
+    return [trie.lookup(addr) for addr in addrs]
+
+
+class TestRouteLoader(unittest.TestCase):
+    def test_plain(self):
+        ''' iter_routes должен разбирать обе формы записи маршрута '''
+        routes = list(iter_routes(StringIO(PLAIN_DUMP)))
+        self.assertEqual(routes, [
+            (0x0A010000, 16, 0xC0A80102, None),
+            (0x0A020000, 16, 0xC0A80103, None),
+        ])
+
+    def test_plain_error(self):
+        ''' iter_routes должен сообщать номер ошибочной строки '''
+        routes = iter_routes(StringIO('10.0.0.0 255.0.0.0\n'))
+        self.assertRaises(ValueError, list, routes)
+
+    def test_proc(self):
+        ''' iter_routes должен разбирать формат /proc/net/route '''
+        routes = list(iter_routes(StringIO(PROC_DUMP)))
+        self.assertEqual(routes, [
+            (0, 0, 0xC0A80101, 'eth0'),
+            (0xC0A80100, 24, None, 'eth0'),
+        ])
+
+    def test_aggregate_siblings(self):
+        ''' aggregate_routes должен объединять соседние префиксы '''
+        routes = [
+            (0x0A000000, 24, 1),
+            (0x0A000100, 24, 1),
+            (0x0A000000, 23, 2),
+            (0x0A000000, 8, 1),
+        ]
+        self.assertEqual(aggregate_routes(routes), [(0x0A000000, 8, 1)])
+
+    def test_aggregate_keeps_lookups(self):
+        ''' aggregate_routes не должен менять результат поиска '''
+        rnd = random.Random(7)
+        routes = []
+        for _ in xrange(500):
+            prefix_len = rnd.randint(8, 24)
+            prefix = rnd.randint(0, 0xFFFF) << 16 & prefix_len_to_mask(prefix_len)
+            routes.append((prefix, prefix_len, rnd.randint(1, 3)))
+        aggregated = aggregate_routes(routes)
+        self.assertTrue(len(aggregated) < len(routes))
+
+        addrs = [rnd.randint(0, 0xFFFFFFFF) for _ in xrange(2000)]
+        addrs += [prefix | 1 for prefix, _, _ in routes]
+        self.assertEqual(lookup_all(routes, addrs), lookup_all(aggregated, addrs))
+
+    def test_aggregate_installed(self):
+        ''' aggregate_routes не должен смотреть сквозь уже установленные
+        префиксы '''
+        routes = [
+            (0x14000000, 8, 1), (0x14000000, 16, 1),
+            (0x0A000000, 24, 1), (0x0A000100, 24, 1),
+            (0x0B000000, 8, 1),
+        ]
+        installed = set([(0x14000000, 12), (0x0A000000, 23), (0x0B000000, 8)])
+        self.assertEqual(aggregate_routes(routes, installed), [
+            (0x0A000000, 24, 1), (0x0A000100, 24, 1),
+            (0x14000000, 8, 1), (0x14000000, 16, 1),
+        ])
+
+
+class TestLoadRoutes(unittest.TestCase):
+    def test_load_plain(self):
+        ''' load_routes должен устанавливать маршруты из дампа '''
+        router = Router()
+        router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+        self.assertEqual(router.load_routes(StringIO(PLAIN_DUMP)), 2)
+        self.assertEqual(router.route('10.2.3.4')[1], IPv4Address('192.168.1.3'))
+
+    def test_load_count(self):
+        ''' load_routes должен считать только установленные маршруты '''
+        router = Router()
+        router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+        router.ip_addr('fa0/1', '10.0.0.1', '255.0.0.0')
+        dump = StringIO(
+            '1.0.0.0/8 192.168.1.2\n1.0.0.0/8 192.168.1.3\n'
+            '10.0.0.0/8 192.168.1.4\n'
+        )
+        self.assertEqual(router.load_routes(dump), 1)
+        self.assertEqual(router.route('1.2.3.4')[1], IPv4Address('192.168.1.2'))
+
+    def test_load_proc(self):
+        ''' load_routes должен использовать адрес интерфейса
+        для подключенных сетей '''
+        router = Router()
+        router.ip_addr('eth0', '192.168.1.10', '255.255.255.0')
+        # подключенная сеть 192.168.1.0/24 уже в таблице, eth1 неизвестен
+        self.assertEqual(router.load_routes(StringIO(PROC_DUMP)), 1)
+        self.assertEqual(router.route('8.8.8.8')[1], IPv4Address('192.168.1.1'))
+
+    def test_load_aggregate(self):
+        ''' load_routes должен уметь агрегировать маршруты '''
+        router = Router(cache_size=4)
+        router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+        router.ip_route('0.0.0.0', '0.0.0.0', '192.168.1.254')
+        router.route('10.0.1.1')
+        dump = StringIO('10.0.0.0/24 192.168.1.2\n10.0.1.0/24 192.168.1.2\n')
+        self.assertEqual(router.load_routes(dump, aggregate=True), 1)
+        self.assertEqual(router.route('10.0.1.1')[1], IPv4Address('192.168.1.2'))
+
+    def test_load_aggregate_over_table(self):
+        ''' load_routes с агрегацией должен учитывать маршруты таблицы '''
+        dump = '20.0.0.0/8 192.168.1.3\n20.0.0.0/16 192.168.1.3\n'
+        results = []
+        for aggregate in (False, True):
+            router = Router()
+            router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+            router.ip_route('20.0.0.0', '255.240.0.0', '192.168.1.2')
+            router.load_routes(StringIO(dump), aggregate=aggregate)
+            results.append(router.route('20.0.0.5')[1])
+        self.assertEqual(results, [IPv4Address('192.168.1.3')] * 2)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestRouteLoader))
+    suite.addTest(unittest.makeSuite(TestLoadRoutes))
+    return suite
@@ -0,0 +1,686 @@
+#-*- encoding: utf-8 -*-
+import threading
+import unittest
+from StringIO import StringIO
+
+import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from avalon_python.modules.router import Router, IPv4Address
+from avalon_python.modules.flow_cache import FlowCache
+from avalon_python.modules.prefix_trie import (
+    PrefixTrie, mask_to_prefix_len, prefix_len_to_mask
+)
+
+
+ROUTES = [
+    ('0.0.0.0', '0.0.0.0', '192.168.1.254'),
+    ('172.16.0.0', '255.255.0.0', '10.0.0.2'),
+    ('172.16.5.0', '255.255.255.0', '10.0.0.3'),
+]
+
+
+def make_router(routes=ROUTES, **kwargs):
+    '''
+    маршрутизатор с fa0/0 192.168.1.1/24, fa0/1 10.0.0.1/8 и маршрутами
+    (dest, mask, next hop), маршруты с одним префиксом - равноценные пути
+    '''
+    router = Router(**kwargs)
+    router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+    router.ip_addr('fa0/1', '10.0.0.1', '255.0.0.0')
+    for dest, mask, next_hop in routes:
+        router.ip_route(dest, mask, next_hop, multipath=True)
+    return router
+
+
+class TestPrefixTrie(unittest.TestCase):
+    def test_mask_to_prefix_len(self):
+        ''' mask_to_prefix_len должен переводить маску в длину префикса '''
+        for prefix_len in range(33):
+            mask = prefix_len_to_mask(prefix_len)
+            self.assertEqual(mask_to_prefix_len(mask), prefix_len)
+
+    def test_non_contiguous_mask(self):
+        ''' mask_to_prefix_len должен падать на разрывной маске '''
+        self.assertRaises(ValueError, mask_to_prefix_len, 0xFF00FF00)
+
+    def test_longest_prefix_match(self):
+        ''' lookup должен возвращать значение самого длинного префикса '''
+        trie = PrefixTrie()
+        trie.insert(0x0A000000, 8, 'short')
+        trie.insert(0x0A010000, 16, 'long')
+        self.assertEqual(trie.lookup(0x0A010203), 'long')
+        self.assertEqual(trie.lookup(0x0A020203), 'short')
+        self.assertEqual(trie.lookup(0x0B000000), None)
+        self.assertEqual(len(trie), 2)
+
+    def test_host_route(self):
+        ''' lookup должен работать с маршрутами /32 '''
+        trie = PrefixTrie()
+        trie.insert(0xFFFFFFFF, 32, 'host')
+        self.assertEqual(trie.lookup(0xFFFFFFFF), 'host')
+        self.assertEqual(trie.get(0xFFFFFFFF, 32), 'host')
+
+    def test_insert_keep(self):
+        ''' insert с replace=False не должен перезаписывать значение '''
+        trie = PrefixTrie()
+        trie.insert(0, 0, 'first')
+        self.assertEqual(trie.insert(0, 0, 'second', replace=False), 'first')
+        self.assertEqual(trie.lookup(0x01020304), 'first')
+
+    def test_delete(self):
+        ''' delete должен удалять префикс и пустые узлы '''
+        trie = PrefixTrie()
+        trie.insert(0x0A000000, 8, 'short')
+        trie.insert(0x0A010000, 16, 'long')
+        self.assertEqual(trie.delete(0x0A010000, 16), 'long')
+        self.assertEqual(trie.delete(0x0A010000, 16), None)
+        self.assertEqual(trie.lookup(0x0A010203), 'short')
+        self.assertEqual(len(trie), 1)
+        trie.delete(0x0A000000, 8)
+        self.assertEqual(trie.node_count, 1)
+
+    def test_items(self):
+        ''' items должен перечислять префиксы по порядку '''
+        trie = PrefixTrie()
+        trie.insert(0x0B000000, 8, 'b')
+        trie.insert(0x0A010000, 16, 'a2')
+        trie.insert(0x0A000000, 8, 'a1')
+        trie.insert(0, 0, 'default')
+        self.assertEqual(list(trie.items()), [
+            (0, 0, 'default'),
+            (0x0A000000, 8, 'a1'),
+            (0x0A010000, 16, 'a2'),
+            (0x0B000000, 8, 'b'),
+        ])
+
+    def test_items_subtree(self):
+        ''' items с префиксом должен обходить только его поддерево '''
+        trie = PrefixTrie()
+        trie.insert(0, 0, 'default')
+        trie.insert(0x0A000000, 8, 'a1')
+        trie.insert(0x0A010000, 16, 'a2')
+        trie.insert(0x0B000000, 8, 'b')
+        self.assertEqual(list(trie.items(0x0A000000, 8)), [
+            (0x0A000000, 8, 'a1'),
+            (0x0A010000, 16, 'a2'),
+        ])
+        self.assertEqual(list(trie.items(0x0A010203, 16)), [
+            (0x0A010000, 16, 'a2'),
+        ])
+        self.assertEqual(list(trie.items(0x0C000000, 8)), [])
+
+    def test_covering(self):
+        ''' covering должен возвращать покрывающие префиксы от короткого '''
+        trie = PrefixTrie()
+        trie.insert(0, 0, 'default')
+        trie.insert(0x0A000000, 8, 'a1')
+        trie.insert(0x0A010000, 16, 'a2')
+        self.assertEqual(list(trie.covering(0x0A010200, 24)), [
+            (0, 0, 'default'),
+            (0x0A000000, 8, 'a1'),
+            (0x0A010000, 16, 'a2'),
+        ])
+        self.assertEqual(list(trie.covering(0x0A010000, 8)), [
+            (0, 0, 'default'),
+            (0x0A000000, 8, 'a1'),
+        ])
+
+    def test_len_counts(self):
+        ''' len_counts должен считать префиксы каждой длины по версиям '''
+        trie = PrefixTrie()
+        trie.insert(0x0A000000, 8, 'a')
+        trie.insert(0x0B000000, 8, 'b')
+        trie.insert(0x0A010000, 16, 'c')
+        new = trie.edit()
+        new.delete(0x0B000000, 8)
+        new.insert(0x0B000000, 8, 'b', replace=False)
+        new.delete(0x0A010000, 16)
+        self.assertEqual(trie.len_counts(), {8: 2, 16: 1})
+        self.assertEqual(new.len_counts(), {8: 2})
+
+    def test_compact(self):
+        ''' edit должен уплотнять узлы без изменения старой версии '''
+        trie = PrefixTrie()
+        for index in range(64):
+            trie.insert(0x0A000000 | (index << 8), 24, index)
+        versions = [trie]
+        with mock.patch('avalon_python.modules.prefix_trie.COMPACT_MIN', 0):
+            for index in range(32):
+                trie = trie.edit()
+                trie.delete(0x0A000000 | (index << 8), 24)
+                versions.append(trie)
+        self.assertTrue(len(trie._arena) <= 2 * trie.node_count + 32)
+        self.assertEqual(trie.lookup(0x0A000001), None)
+        self.assertEqual(trie.lookup(0x0A003F01), 63)
+        self.assertEqual(versions[0].lookup(0x0A000001), 0)
+        self.assertEqual(len(versions[0]), 64)
+        self.assertEqual(len(trie), 32)
+        self.assertEqual(
+            [value for _, _, value in trie.items()], range(32, 64)
+        )
+
+    def test_edit(self):
+        ''' изменения новой версии не должны быть видны в старой '''
+        trie = PrefixTrie()
+        trie.insert(0x0A000000, 8, 'old')
+        new = trie.edit()
+        new.insert(0x0A000000, 8, 'new')
+        new.insert(0x0A010000, 16, 'long')
+        trie.insert(0x0B000000, 8, 'other')
+        self.assertEqual(trie.lookup(0x0A010203), 'old')
+        self.assertEqual(new.lookup(0x0A010203), 'long')
+        self.assertEqual(new.lookup(0x0B000001), None)
+        new.delete(0x0A010000, 16)
+        self.assertEqual(len(new), 1)
+        self.assertEqual(len(trie), 2)
+
+
+class TestIPv4Address(unittest.TestCase):
+    def test_parse(self):
+        ''' IPv4Address должен разбирать точечную и десятичную запись '''
+        addr = IPv4Address('192.168.1.10', '255.255.255.0')
+        self.assertEqual(addr.decimal(), 0xC0A8010A)
+        self.assertEqual(addr.dotted(), '192.168.1.10')
+        self.assertEqual(addr.netmask(), (0xFFFFFF00, '255.255.255.0'))
+        self.assertEqual(IPv4Address(0xC0A8010A).dotted(), '192.168.1.10')
+
+    def test_classful_mask(self):
+        ''' IPv4Address должен определять маску по классу сети '''
+        self.assertEqual(IPv4Address('10.1.1.1').netmask_dotted(), '255.0.0.0')
+
+    def test_binary(self):
+        ''' binary должен возвращать двоичное представление по октетам '''
+        self.assertEqual(
+            IPv4Address('192.168.1.10').binary(),
+            '11000000.10101000.00000001.00001010'
+        )
+
+    def test_illegal_value(self):
+        ''' IPv4Address должен падать на некорректном адресе '''
+        self.assertRaises(Exception, IPv4Address, 1 << 32)
+        self.assertRaises(Exception, IPv4Address, '300.1.1.1.1')
+
+    def test_slots(self):
+        ''' IPv4Address не должен создавать __dict__ для экземпляра '''
+        self.assertFalse(hasattr(IPv4Address('10.0.0.1'), '__dict__'))
+
+    def test_intern(self):
+        ''' intern должен возвращать один и тот же экземпляр '''
+        first = IPv4Address.intern('255.255.255.0')
+        second = IPv4Address.intern(0xFFFFFF00)
+        self.assertTrue(first is second)
+        self.assertEqual(first.netmask(), IPv4Address('255.255.255.0').netmask())
+        self.assertFalse(
+            IPv4Address.intern('10.0.0.1', '255.0.0.0') is
+            IPv4Address.intern('10.0.0.1', '255.255.0.0')
+        )
+
+
+class TestRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = make_router()
+
+    def test_route_longest_prefix(self):
+        ''' route должен выбирать маршрут с самым длинным префиксом '''
+        iface, next_hop = self.router.route('172.16.5.10')
+        self.assertEqual(next_hop, IPv4Address('10.0.0.3'))
+
+        iface, next_hop = self.router.route('172.16.6.10')
+        self.assertEqual(next_hop, IPv4Address('10.0.0.2'))
+
+    def test_route_connected(self):
+        ''' route должен возвращать интерфейс для подключенной сети '''
+        iface, next_hop = self.router.route('192.168.1.20')
+        self.assertEqual(iface, 'fa0/0')
+        self.assertEqual(next_hop, IPv4Address('192.168.1.1'))
+
+    def test_route_gateway_on_connected(self):
+        ''' route должен определять интерфейс шлюза по подключенной сети '''
+        iface, next_hop = self.router.route('172.16.5.10')
+        self.assertEqual(iface, 'fa0/1')
+        self.assertEqual(self.router.route('8.8.8.8')[0], 'fa0/0')
+
+    def test_reresolve_on_ip_addr(self):
+        ''' ip_addr должен заново определять интерфейсы шлюзов '''
+        self.router.ip_addr('fa0/1', '172.30.0.1', '255.255.0.0')
+        self.assertEqual(self.router.route('172.16.5.10')[0], None)
+        self.router.ip_addr('fa0/2', '10.0.0.10', '255.255.255.0')
+        self.assertEqual(self.router.route('172.16.5.10')[0], 'fa0/2')
+
+    def test_ip_addr_bad_mask(self):
+        ''' ip_addr с неверной маской не должен менять интерфейсы '''
+        self.assertRaises(
+            ValueError,
+            self.router.ip_addr, 'eth1', '10.1.0.1', '255.0.255.0'
+        )
+        self.assertNotIn('eth1', self.router.iface_table)
+        self.router.ip_addr('eth2', '10.2.0.1', '255.255.0.0')
+        self.assertEqual(self.router.route('10.2.0.5')[0], 'eth2')
+
+    def test_load_interfaces(self):
+        ''' load_interfaces должен назначать адреса из файла '''
+        self.router.load_interfaces(StringIO(
+            'eth2 10.2.0.1 255.255.0.0\n\neth3 10.3.0.1 255.255.0.0\n'
+        ))
+        self.assertEqual(self.router.route('10.3.0.5')[0], 'eth3')
+        self.assertEqual(self.router.get_iface_by_addr('10.2.0.1'), 'eth2')
+
+    def test_no_ip_route(self):
+        ''' no_ip_route должен удалять маршрут '''
+        self.assertTrue(self.router.no_ip_route('172.16.5.0', '255.255.255.0'))
+        self.assertFalse(self.router.no_ip_route('172.16.5.0', '255.255.255.0'))
+        _, next_hop = self.router.route('172.16.5.10')
+        self.assertEqual(next_hop, IPv4Address('10.0.0.2'))
+        self.assertFalse(self.router.no_ip_route(
+            '172.16.0.0', '255.255.0.0', '10.0.0.9'
+        ))
+
+    def test_replace(self):
+        ''' ip_route должен заменять маршрут только с replace=True '''
+        self.assertFalse(
+            self.router.ip_route('172.16.5.0', '255.255.255.0', '10.0.0.7')
+        )
+        self.assertEqual(self.router.route('172.16.5.1')[1],
+                         IPv4Address('10.0.0.3'))
+        self.router.ip_route('172.16.5.0', '255.255.255.0', '10.0.0.7',
+                             replace=True)
+        self.assertEqual(self.router.route('172.16.5.1')[1],
+                         IPv4Address('10.0.0.7'))
+        self.assertEqual(len(self.router.routes), 5)
+
+    def test_transaction(self):
+        ''' изменения транзакции публикуются вместе при выходе '''
+        snapshot = self.router.fib
+        with self.router.transaction() as txn:
+            txn.no_ip_route('172.16.5.0', '255.255.255.0')
+            txn.ip_route('172.16.6.0', '255.255.255.0', '10.0.0.8')
+            self.assertTrue(self.router.fib is snapshot)
+        self.assertFalse(self.router.fib is snapshot)
+        self.assertEqual(self.router.route('172.16.6.1')[1],
+                         IPv4Address('10.0.0.8'))
+        # old version stays intact for readers which hold it
+        group = snapshot.lookup(0xAC100501)
+        self.assertEqual(self.router.next_hop_groups[group][0],
+                         (IPv4Address('10.0.0.3').decimal(),))
+
+    def test_transaction_rollback(self):
+        ''' транзакция не публикуется при исключении '''
+        snapshot = self.router.fib
+        try:
+            with self.router.transaction() as txn:
+                txn.ip_route('172.16.6.0', '255.255.255.0', '10.0.0.8')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertTrue(self.router.fib is snapshot)
+
+    def test_concurrent_readers(self):
+        ''' читатели не должны видеть частично примененную транзакцию '''
+        first, second = 0xAC100501, 0xAC100601
+        errors = []
+        done = threading.Event()
+
+        def reader():
+            while not done.is_set():
+                fib = self.router.fib
+                hops = (fib.lookup(first), fib.lookup(second))
+                if hops[0] != hops[1]:
+                    errors.append(hops)
+
+        with self.router.transaction() as txn:
+            for dest in ('172.16.5.0', '172.16.6.0'):
+                txn.ip_route(dest, '255.255.255.0', '10.0.0.10', replace=True)
+
+        threads = [threading.Thread(target=reader) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for index in range(200):
+            next_hop = '10.0.0.%s' % (10 + index % 2)
+            with self.router.transaction() as txn:
+                for dest in ('172.16.5.0', '172.16.6.0'):
+                    txn.ip_route(dest, '255.255.255.0', next_hop, replace=True)
+        done.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_route_default(self):
+        ''' route должен использовать маршрут по умолчанию '''
+        iface, next_hop = self.router.route('8.8.8.8')
+        self.assertEqual(next_hop, IPv4Address('192.168.1.254'))
+
+    def test_show_route(self):
+        ''' show_route должен находить только точный префикс '''
+        [(dest, mask, next_hop)] = self.router.show_route('172.16.0.0/16')
+        self.assertEqual(next_hop, IPv4Address('10.0.0.2'))
+        self.assertEqual(
+            self.router.show_route('172.16.0.0', '255.255.0.0')[0][2],
+            next_hop
+        )
+        self.assertEqual(self.router.show_route('172.16.0.0/12'), [])
+
+    def test_routes_longer(self):
+        ''' routes_longer должен возвращать префиксы внутри сети '''
+        routes = self.router.routes_longer('172.0.0.0/8')
+        self.router.no_ip_route('172.16.5.0', '255.255.255.0')
+        # поток читает версию таблицы на момент вызова
+        self.assertEqual([str(route[0]) for route in routes], [
+            '172.16.0.0', '172.16.5.0'
+        ])
+        self.assertEqual(
+            [str(route[0]) for route in self.router.routes_longer(
+                '172.16.0.0', '255.255.0.0'
+            )],
+            ['172.16.0.0']
+        )
+
+    def test_routes_shorter(self):
+        ''' routes_shorter должен возвращать покрывающие префиксы '''
+        self.assertEqual(
+            [str(route[0]) for route in self.router.routes_shorter(
+                '172.16.5.128/25'
+            )],
+            ['0.0.0.0', '172.16.0.0', '172.16.5.0']
+        )
+
+    def test_route_columns(self):
+        ''' route_columns должен отдавать таблицу в колонках '''
+        prefixes, prefix_lens, groups = self.router.route_columns()
+        self.assertEqual(list(prefix_lens), [0, 8, 16, 24, 24])
+        self.assertEqual(prefixes[2], IPv4Address('172.16.0.0').decimal())
+        self.assertEqual(
+            self.router.next_hop_groups[groups[2]][0],
+            (IPv4Address('10.0.0.2').decimal(),)
+        )
+        self.assertEqual(
+            [route[0].decimal() for route in self.router.routes],
+            list(prefixes)
+        )
+
+    def test_routes_summary(self):
+        ''' routes_summary должен считать маршруты по длине префикса '''
+        self.assertEqual(
+            self.router.routes_summary(), {0: 1, 8: 1, 16: 1, 24: 2}
+        )
+        self.router.no_ip_route('172.16.5.0', '255.255.255.0')
+        self.assertEqual(
+            self.router.routes_summary(), {0: 1, 8: 1, 16: 1, 24: 1}
+        )
+
+    def test_no_route(self):
+        ''' route должен падать при отсутствии маршрута '''
+        router = Router()
+        router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+        self.assertRaises(ValueError, router.route, '8.8.8.8')
+
+
+class TestEcmp(unittest.TestCase):
+    def setUp(self):
+        self.router = make_router()
+        for next_hop in ('10.0.0.3', '192.168.1.3', '10.0.0.4'):
+            self.router.ip_route(
+                '172.16.5.0', '255.255.255.0', next_hop, multipath=True
+            )
+        self.next_hops = set(
+            IPv4Address(addr)
+            for addr in ('10.0.0.3', '192.168.1.3', '10.0.0.4')
+        )
+
+    def test_paths(self):
+        ''' ip_route с multipath должен добавлять пути без повторов '''
+        self.assertEqual(len(self.router.show_route('172.16.5.0/24')), 3)
+        self.assertFalse(self.router.ip_route(
+            '172.16.5.0', '255.255.255.0', '10.0.0.4', multipath=True
+        ))
+        self.assertEqual(self.router.routes_summary()[24], 2)
+
+    def test_spread(self):
+        ''' route должен распределять адресатов по всем путям '''
+        used = {}
+        for host in xrange(256):
+            iface, next_hop = self.router.route('172.16.5.%s' % host)
+            used[next_hop] = used.get(next_hop, 0) + 1
+        self.assertEqual(set(used), self.next_hops)
+        self.assertTrue(min(used.values()) > 40)
+
+    def test_deterministic(self):
+        ''' один поток всегда должен идти через один следующий переход '''
+        flows = [
+            ('172.16.5.7', '10.1.1.%s' % host, 6, 1024 + host, 80)
+            for host in xrange(64)
+        ]
+        first = [self.router.route(*flow) for flow in flows]
+        self.assertEqual([self.router.route(*flow) for flow in flows], first)
+        self.assertEqual(set(result[1] for result in first), self.next_hops)
+
+    def test_no_ip_route_path(self):
+        ''' no_ip_route со следующим переходом должен удалять один путь '''
+        self.assertTrue(self.router.no_ip_route(
+            '172.16.5.0', '255.255.255.0', '192.168.1.3'
+        ))
+        hops = set(
+            self.router.route('172.16.5.%s' % host)[1]
+            for host in xrange(256)
+        )
+        self.assertEqual(
+            hops, set([IPv4Address('10.0.0.3'), IPv4Address('10.0.0.4')])
+        )
+        self.assertTrue(self.router.no_ip_route('172.16.5.0', '255.255.255.0'))
+        self.assertEqual(self.router.show_route('172.16.5.0/24'), [])
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_route_many(self):
+        ''' route_many должен выбирать те же пути что и route '''
+        addrs = ['172.16.5.%s' % host for host in xrange(256)]
+        next_hop_idx, iface_idx = self.router.route_many(addrs)
+        fib = self.router.compiled_fib()
+        self.assertEqual(
+            [fib.next_hops[index] for index in next_hop_idx],
+            [self.router.route(addr)[1] for addr in addrs]
+        )
+
+
+class TestLookupStats(unittest.TestCase):
+    def setUp(self):
+        self.router = make_router(cache_size=16)
+
+    def test_disabled(self):
+        ''' без enable_stats route не должен подменяться '''
+        self.assertFalse('route' in vars(self.router))
+        self.assertEqual(self.router.stats_snapshot(), None)
+
+    def test_counters(self):
+        ''' stats_snapshot должен считать попадания, ошибки и задержки '''
+        self.router.enable_stats()
+        for _ in range(3):
+            self.router.route('172.16.5.1')
+        self.router.route('172.16.7.1')
+        self.router.route('8.8.8.8')
+        router = Router()
+        router.enable_stats()
+        self.assertRaises(ValueError, router.route, '8.8.8.8')
+        self.assertEqual(router.stats_snapshot()['failed'], 1)
+
+        snapshot = self.router.stats_snapshot(top=2)
+        self.assertEqual(snapshot['lookups'], 5)
+        self.assertEqual(snapshot['failed'], 0)
+        self.assertEqual(snapshot['prefix_hits'], [
+            ['172.16.5.0/24', 3], ['0.0.0.0/0', 1]
+        ])
+        self.assertEqual(len(self.router.stats_snapshot()['prefix_hits']), 3)
+        self.assertEqual(
+            sum(count for _, count in snapshot['latency_ns']), 5
+        )
+        self.assertTrue(snapshot['latency_p50_ns'] > 0)
+
+    def test_disable(self):
+        ''' disable_stats должен возвращать обычный route '''
+        self.router.enable_stats()
+        self.router.route('172.16.5.1')
+        stats = self.router.disable_stats()
+        self.router.route('172.16.5.1')
+        self.assertEqual(stats.lookups, 1)
+        self.assertFalse('route' in vars(self.router))
+        self.assertEqual(self.router.lookup_stats, None)
+
+
+class TestFlowCache(unittest.TestCase):
+    def test_counters(self):
+        ''' FlowCache должен считать попадания, промахи и вытеснения '''
+        cache = FlowCache(2)
+        self.assertEqual(cache.get(1), None)
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        self.assertEqual(cache.get(1), 'a')
+        cache.put(3, 'c')
+        stats = cache.stats()
+        self.assertEqual(
+            (stats['hits'], stats['misses'], stats['evictions']), (1, 1, 1)
+        )
+        self.assertEqual(len(cache), 2)
+
+    def test_clock_keeps_referenced(self):
+        ''' FlowCache должен вытеснять запись без бита обращения '''
+        cache = FlowCache(2)
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        cache.get(2)
+        cache.put(3, 'c')
+        self.assertEqual(cache.get(2), 'b')
+        self.assertEqual(cache.get(1), None)
+
+    def test_invalidate_prefix(self):
+        ''' invalidate_prefix должен удалять только покрытые адреса '''
+        cache = FlowCache(4)
+        cache.put(0x0A000001, 'a')
+        cache.put(0x0B000001, 'b')
+        cache.invalidate_prefix(0x0A000000, 8)
+        self.assertEqual(cache.get(0x0A000001), None)
+        self.assertEqual(cache.get(0x0B000001), 'b')
+        cache.put(0x0C000001, 'c')
+        self.assertEqual(len(cache), 2)
+
+    def test_invalidate_prefixes(self):
+        ''' invalidate_prefixes должен удалять адреса всех префиксов '''
+        cache = FlowCache(8)
+        for key in (0x0A000001, 0x0B000001, 0x0B010001, 0x0C000001):
+            cache.put(key, key)
+        cache.invalidate_prefixes([(0x0A000000, 8), (0x0B010000, 16)])
+        self.assertEqual(
+            sorted(cache._slots), [0x0B000001, 0x0C000001]
+        )
+
+
+class TestRouterFlowCache(unittest.TestCase):
+    def setUp(self):
+        self.router = make_router(cache_size=16)
+
+    def test_cache_hit(self):
+        ''' повторный route должен обслуживаться из кэша '''
+        first = self.router.route('172.16.5.10')
+        second = self.router.route('172.16.5.10')
+        self.assertEqual(first, second)
+        stats = self.router.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_invalidate_on_route(self):
+        ''' ip_route должен сбрасывать кэш для покрытых адресов '''
+        self.router.route('172.16.6.10')
+        self.router.route('8.8.8.8')
+        self.router.ip_route('172.16.6.0', '255.255.255.0', '10.0.0.4')
+        _, next_hop = self.router.route('172.16.6.10')
+        self.assertEqual(next_hop, IPv4Address('10.0.0.4'))
+        self.assertEqual(self.router.cache_stats()['invalidations'], 1)
+
+    def test_invalidate_once_per_commit(self):
+        ''' транзакция должна проходить кэш один раз на все маршруты '''
+        for octet in xrange(10):
+            self.router.route('172.16.%d.1' % octet)
+        cache = self.router.flow_cache
+        with mock.patch.object(cache, 'invalidate_if',
+                               wraps=cache.invalidate_if) as invalidate_if:
+            with self.router.transaction() as txn:
+                for octet in xrange(5):
+                    txn.ip_route('172.16.%d.0' % octet, '255.255.255.0',
+                                 '10.0.0.9')
+        self.assertEqual(invalidate_if.call_count, 1)
+        self.assertEqual(len(cache), 5)
+
+    def test_invalidate_on_ip_addr(self):
+        ''' ip_addr должен сбрасывать кэш для затронутых интерфейсов '''
+        self.router.ip_route('1.1.1.0', '255.255.255.0', '172.20.0.1')
+        self.assertEqual(self.router.route('1.1.1.1')[0], None)
+        self.router.ip_addr('serial0/0', '172.20.0.2', '255.255.0.0')
+        self.assertEqual(self.router.route('1.1.1.1')[0], 'serial0/0')
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class TestRouteMany(unittest.TestCase):
+    def setUp(self):
+        self.router = make_router()
+        self.addresses = [
+            '172.16.5.10', '172.16.6.10', '192.168.1.20', '8.8.8.8', '10.1.1.1'
+        ]
+
+    def test_route_many_matches_route(self):
+        ''' route_many должен давать тот же результат что и route '''
+        next_hop_idx, iface_idx = self.router.route_many(self.addresses)
+        fib = self.router.compiled_fib()
+        for addr, nh, iface in zip(self.addresses, next_hop_idx, iface_idx):
+            expected_iface, expected_next_hop = self.router.route(addr)
+            self.assertEqual(fib.next_hops[nh], expected_next_hop)
+            if expected_iface is None:
+                self.assertEqual(iface, -1)
+            else:
+                self.assertEqual(fib.interfaces[iface], expected_iface)
+
+    def test_route_many_uint32(self):
+        ''' route_many должен принимать массив uint32 '''
+        addrs = numpy.array(
+            [IPv4Address(addr).decimal() for addr in self.addresses],
+            dtype=numpy.uint32
+        )
+        expected = self.router.route_many(self.addresses)
+        result = self.router.route_many(addrs)
+        self.assertEqual(list(result[0]), list(expected[0]))
+
+    def test_route_many_buffer(self):
+        ''' route_many должен принимать буфер с адресом в строке '''
+        expected = self.router.route_many(self.addresses)
+        result = self.router.route_many('\n'.join(self.addresses))
+        self.assertEqual(list(result[0]), list(expected[0]))
+        self.assertRaises(ValueError, self.router.route_many, ['1.2.3.400'])
+
+    def test_route_many_no_route(self):
+        ''' route_many должен возвращать -1 при отсутствии маршрута '''
+        router = Router()
+        router.ip_addr('fa0/0', '192.168.1.1', '255.255.255.0')
+        next_hop_idx, iface_idx = router.route_many(['8.8.8.8', '192.168.1.7'])
+        self.assertEqual(list(next_hop_idx), [-1, 0])
+        self.assertEqual(list(iface_idx), [-1, 0])
+
+    def test_recompile_after_change(self):
+        ''' route_many должен учитывать маршруты добавленные после компиляции '''
+        self.router.route_many(['1.1.1.1'])
+        self.router.ip_route('1.1.1.0', '255.255.255.0', '10.0.0.9')
+        next_hop_idx, _ = self.router.route_many(['1.1.1.1'])
+        next_hop = self.router.compiled_fib().next_hops[next_hop_idx[0]]
+        self.assertEqual(next_hop, IPv4Address('10.0.0.9'))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestPrefixTrie))
+    suite.addTest(unittest.makeSuite(TestIPv4Address))
+    suite.addTest(unittest.makeSuite(TestRouter))
+    suite.addTest(unittest.makeSuite(TestEcmp))
+    suite.addTest(unittest.makeSuite(TestLookupStats))
+    suite.addTest(unittest.makeSuite(TestFlowCache))
+    suite.addTest(unittest.makeSuite(TestRouterFlowCache))
+    suite.addTest(unittest.makeSuite(TestRouteMany))
+    return suite
@@ -0,0 +1,50 @@
+#-*- encoding: utf-8 -*-
+import unittest
+
+from avalon_python.modules.prefix_trie import prefix_len_to_mask
+from avalon_python.modules.router_bench import (
+    generate_table, generate_destinations, run_benchmark
+)
+
+
+class TestRouterBench(unittest.TestCase):
+    def test_generate_table(self):
+        ''' generate_table должен порождать уникальные префиксы '''
+        table = generate_table(1000, seed=1)
+        self.assertEqual(len(table), 1000)
+        self.assertEqual(len(set((p, l) for p, l, _ in table)), 1000)
+        for prefix, prefix_len, _ in table:
+            self.assertEqual(prefix & prefix_len_to_mask(prefix_len), prefix)
+        self.assertEqual(table, generate_table(1000, seed=1))
+
+    def test_destinations_inside_table(self):
+        ''' generate_destinations должен попадать в префиксы таблицы '''
+        table = generate_table(100, seed=1)
+        prefixes = set((p, l) for p, l, _ in table)
+        for addr in generate_destinations(table, 200, seed=2):
+            self.assertTrue(any(
+                (addr & prefix_len_to_mask(l), l) in prefixes
+                for l in xrange(33)
+            ))
+
+    def test_run_benchmark(self):
+        ''' run_benchmark должен возвращать все метрики '''
+        result = run_benchmark(200, lookups=500, cache_size=64)
+        for key in ('insert_per_sec', 'lookup_per_sec', 'peak_rss_kb'):
+            self.assertTrue(result[key] > 0)
+        self.assertEqual(
+            sorted(result['lookup_latency_us']), ['p50', 'p90', 'p99', 'p999']
+        )
+        self.assertEqual(result['cache']['hits'] + result['cache']['misses'], 500)
+        self.assertEqual(result['dir24_lookup_per_sec'], None)
+
+    def test_run_benchmark_dir24(self):
+        ''' run_benchmark(dir24=True) должен измерять DIR-24-8 '''
+        result = run_benchmark(200, lookups=500, dir24=True)
+        self.assertTrue(result['dir24_lookup_per_sec'] > 0)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestRouterBench))
+    return suite
@@ -0,0 +1,100 @@
+#-*- encoding: utf-8 -*-
+import struct
+import unittest
+from StringIO import StringIO
+
+import mock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from avalon_python.modules.traffic_replay import replay
+from test_router import make_router
+
+TEXT_TRAFFIC = '''# destination bytes
+172.16.5.1 100
+172.16.7.1 200
+192.168.1.10 60
+8.8.8.8
+300.1.1.1 10
+172.16.5.2 40
+'''
+
+
+ROUTES = [
+    ('172.16.0.0', '255.255.0.0', '10.0.0.2'),
+    ('172.16.5.0', '255.255.255.0', '192.168.1.2'),
+]
+
+
+class TestTrafficReplay(unittest.TestCase):
+    def setUp(self):
+        self.router = make_router(ROUTES)
+
+    def check_report(self, report):
+        self.assertEqual(report['interfaces'], {
+            'fa0/0': {'packets': 3, 'bytes': 200},
+            'fa0/1': {'packets': 1, 'bytes': 200},
+        })
+        self.assertEqual(report['prefixes'], {
+            '172.16.5.0/24': {'packets': 2, 'bytes': 140},
+            '172.16.0.0/16': {'packets': 1, 'bytes': 200},
+            '192.168.1.0/24': {'packets': 1, 'bytes': 60},
+        })
+        self.assertEqual(report['no_route'], {'packets': 1, 'bytes': 0})
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_text(self):
+        ''' replay должен считать пакеты и байты по интерфейсам и префиксам '''
+        counters = replay(self.router, StringIO(TEXT_TRAFFIC), chunk_size=2)
+        self.check_report(counters.report())
+        self.assertEqual(counters.bad_rows, 1)
+
+    def test_text_without_numpy(self):
+        ''' replay без numpy должен давать тот же результат '''
+        with mock.patch('avalon_python.modules.traffic_replay.numpy', None):
+            counters = replay(
+                self.router, StringIO(TEXT_TRAFFIC), chunk_size=2
+            )
+        self.check_report(counters.report())
+        self.assertEqual(counters.bad_rows, 1)
+
+    def test_binary_sized(self):
+        ''' replay должен читать двоичные записи адреса и размера '''
+        records = [
+            (0xAC100501, 100), (0xAC100701, 200), (0xC0A8010A, 60),
+            (0x08080808, 0), (0xAC100502, 40),
+        ]
+        data = ''.join(struct.pack('>II', *record) for record in records)
+        # обрезанная последняя запись
+        data += '\x01\x02'
+        counters = replay(
+            self.router, StringIO(data), 'bin-sized', chunk_size=2
+        )
+        self.check_report(counters.report())
+        self.assertEqual(counters.bad_rows, 1)
+
+    def test_binary_default_size(self):
+        ''' replay должен учитывать default_size для записей без размера '''
+        data = struct.pack('>III', 0xAC100501, 0xAC100502, 0x08080808)
+        report = replay(
+            self.router, StringIO(data), 'bin', default_size=64
+        ).report()
+        self.assertEqual(
+            report['interfaces'], {'fa0/0': {'packets': 2, 'bytes': 128}}
+        )
+        self.assertEqual(report['no_route'], {'packets': 1, 'bytes': 64})
+
+    def test_unknown_format(self):
+        ''' replay должен падать на неизвестном формате '''
+        self.assertRaises(
+            ValueError, replay, self.router, StringIO(''), 'pcap'
+        )
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestTrafficReplay))
+    return suite